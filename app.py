@@ -1,6 +1,15 @@
 from flask import Flask
 from config import Config
-from models import db
+from models import db, ensure_schema
+from cache import cache
+from scheduler import scheduler
+from resilience import resilience
+from context_cache import context_cache
+from profiling import profiler
+from maintenance import maintenance
+from assets import assets
+from compression import compressor
+from workspaces import workspaces
 from routes import main
 import os
 
@@ -12,13 +21,22 @@ def create_app(config_class=Config):
     
     # Initialize extensions
     db.init_app(app)
+    workspaces.init_app(app)
+    compressor.init_app(app)  # registered first so it runs after every other after_request hook
+    cache.init_app(app)
+    scheduler.init_app(app)
+    resilience.init_app(app)
+    context_cache.init_app(app)
+    profiler.init_app(app)
+    maintenance.init_app(app)
+    assets.init_app(app)
     
     # Register blueprints
     app.register_blueprint(main)
     
-    # Create database tables
+    # Create or upgrade database tables (no-op when the schema version is current)
     with app.app_context():
-        db.create_all()
+        ensure_schema()
     
     return app
 
@@ -41,6 +59,7 @@ if __name__ == '__main__':
         
     print("=" * 60)
     print("Open your browser and go to: http://127.0.0.1:5000")
+    print("Development server only - use `python serve.py` in production")
     print("=" * 60)
     print()
     
@@ -0,0 +1,221 @@
+"""
+ASGI entry point for NoteMaster AI
+
+    WEB_CONCURRENCY=2 uvicorn asgi:application --port 8000
+
+The LLM-bound endpoints (JSON POST /api/summarize and POST
+/api/notes/<id>/chat) run as coroutines with async Gemini calls, so a
+request waiting on the model costs a coroutine instead of an OS thread.
+Their database work runs on a small dedicated thread pool. Every other
+request (pages, file uploads, the rest of the API) is passed through to
+the regular Flask app.
+"""
+
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+from models import Note
+from scheduler import LLMBusyError
+from routes import (notes_length_error, describe_gemini_error, llm_busy_payload, save_note, autotag_note,
+                    load_chat_history, save_chat_turn, text_field, body_too_large_error)
+from utils import generate_note_summary_async, generate_chat_response_async, PromptTooLargeError
+from workspaces import workspaces, activate, split_workspace_path
+
+CHAT_PATH = re.compile(r'^/api/notes/(\d+)/chat$')
+
+
+class NoteMasterASGI:
+    """Routes LLM-bound requests to async handlers and the rest to Flask"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.db_pool = ThreadPoolExecutor(
+            max_workers=flask_app.config['ASYNC_DB_THREADS'],
+            thread_name_prefix='notemaster-db'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'POST':
+            workspace, path = self._workspace(scope)
+
+            if workspace is not False:
+                if path == '/api/summarize' and self._is_json(scope):
+                    return await self.summarize(workspace, receive, send)
+
+                match = CHAT_PATH.match(path)
+                if match:
+                    return await self.chat(workspace, int(match.group(1)), receive, send)
+
+        await self.wsgi(scope, receive, send)
+
+    def _workspace(self, scope):
+        """(workspace, path) as Flask would resolve them; workspace is False when invalid or unknown, for Flask to reject"""
+        if not workspaces.enabled:
+            return None, scope['path']
+        prefix, path = split_workspace_path(scope['path'])
+        header = workspaces.header.lower().encode()
+        value = next((v.decode('latin-1') for name, v in scope['headers'] if name == header), None)
+        workspace = workspaces.requested_workspace(prefix, value)
+        if workspace is not None and not (workspaces.valid_name(workspace) and workspaces.exists(workspace)):
+            return False, path
+        return workspace, path
+
+    @contextmanager
+    def _app_context(self, workspace):
+        with self.flask_app.app_context(), activate(workspace):
+            yield
+
+    @staticmethod
+    def _is_json(scope):
+        for name, value in scope['headers']:
+            if name == b'content-type':
+                return value.split(b';')[0].strip() == b'application/json'
+        return False
+
+    async def _read_body(self, receive):
+        """The request body, or None once it passes MAX_CONTENT_LENGTH"""
+        limit = self.flask_app.config['MAX_CONTENT_LENGTH']
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > limit:
+                return None
+            if not message.get('more_body'):
+                return body
+
+    def _parse_json(self, body):
+        try:
+            return self.flask_app.json.loads(body) if body else None
+        except ValueError:
+            return None
+
+    async def _respond_too_large(self, send):
+        with self.flask_app.app_context():
+            message = body_too_large_error()
+        await self._respond(send, {'error': message}, 413)
+
+    async def _respond(self, send, payload, status=200, headers=()):
+        body = self.flask_app.json.dumps(payload).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                *headers,
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _run_db(self, workspace, func, *args):
+        """Run blocking ORM work on the DB pool inside its own app context"""
+        def call():
+            with self._app_context(workspace):
+                return func(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(self.db_pool, call)
+
+    async def _respond_busy(self, send, error):
+        payload, status = llm_busy_payload(error)
+        await self._respond(send, payload, status, [(b'retry-after', str(error.retry_after).encode())])
+
+    async def summarize(self, workspace, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return await self._respond_too_large(send)
+
+        notes_text = text_field(self._parse_json(body), 'notes')
+        if notes_text is None:
+            return await self._respond(send, {
+                'error': 'No notes provided. Please enter some text to summarize.'
+            }, 400)
+
+        with self._app_context(workspace):
+            length_error = notes_length_error(notes_text)
+            if length_error:
+                return await self._respond(send, {'error': length_error}, 400)
+
+            usage = {}
+            try:
+                summary, sections = await generate_note_summary_async(notes_text, usage)
+            except LLMBusyError as e:
+                return await self._respond_busy(send, e)
+            except Exception as e:
+                message, status = describe_gemini_error(e)
+                return await self._respond(send, {'error': message}, status)
+
+        def save():
+            note = save_note(notes_text, summary, usage, sections)
+            return note.id, note.title, note.summary_html, autotag_note(note)
+
+        try:
+            note_id, title, summary_html, suggested_tags = await self._run_db(workspace, save)
+        except Exception as e:
+            self.flask_app.logger.error(f"Error in summarize endpoint: {e}")
+            return await self._respond(send, {'error': f'An unexpected error occurred: {str(e)}'}, 500)
+
+        await self._respond(send, {
+            'summary': summary,
+            'summary_html': summary_html,
+            'note_id': note_id,
+            'title': title,
+            'suggested_tags': suggested_tags
+        })
+
+    async def chat(self, workspace, note_id, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return await self._respond_too_large(send)
+
+        user_question = text_field(self._parse_json(body), 'question')
+        if user_question is None:
+            return await self._respond(send, {'error': 'No question provided'}, 400)
+        if not user_question:
+            return await self._respond(send, {'error': 'Question cannot be empty'}, 400)
+
+        def load_context():
+            note = Note.query.get(note_id)
+            if note is None:
+                return None
+            return note.original_content, note.summary, load_chat_history(note_id)
+
+        try:
+            context = await self._run_db(workspace, load_context)
+            if context is None:
+                return await self._respond(send, {'error': 'Note not found'}, 404)
+
+            usage = {}
+            with self._app_context(workspace):
+                try:
+                    ai_response = await generate_chat_response_async(*context, user_question, usage, note_id=note_id)
+                except LLMBusyError as e:
+                    return await self._respond_busy(send, e)
+                except PromptTooLargeError as e:
+                    return await self._respond(send, {'error': str(e)}, e.status)
+                except Exception as e:
+                    return await self._respond(send, {'error': f'Error generating response: {str(e)}'}, 500)
+
+            def save():
+                user_msg, ai_msg = save_chat_turn(note_id, user_question, ai_response, usage)
+                return user_msg.to_dict(), ai_msg.to_dict()
+
+            user_msg, ai_msg = await self._run_db(workspace, save)
+        except Exception as e:
+            self.flask_app.logger.error(f"Error in chat: {e}")
+            return await self._respond(send, {'error': str(e)}, 500)
+
+        await self._respond(send, {
+            'response': ai_response,
+            'user_message': user_msg,
+            'ai_message': ai_msg
+        })
+
+
+application = NoteMasterASGI(create_app())
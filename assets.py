@@ -0,0 +1,81 @@
+"""
+Serving for the assets produced by build_assets.py.
+
+Hashed files under static/dist are served from /assets/ with
+`Cache-Control: immutable` (a changed file gets a new name), picking the
+precompressed .br or .gz variant the client accepts. Until the build has
+run, asset_url() falls back to the plain static files and the template
+falls back to the CDN scripts.
+"""
+
+import json
+import mimetypes
+import os
+
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+bp = Blueprint('assets', __name__, url_prefix='/assets')
+
+
+class AssetManifest:
+    """Maps logical asset names to their content-hashed build outputs"""
+
+    def __init__(self, app=None):
+        self.entries = {}
+        self.hashed = set()
+        self.dist = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.dist = os.path.join(app.static_folder, 'dist')
+        self.entries = {}
+        manifest_path = os.path.join(self.dist, 'manifest.json')
+        if app.config.get('ASSETS_USE_BUILD', True) and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.entries = json.load(f)
+        self.hashed = set(self.entries.values())
+
+        with open(os.path.join(app.root_path, 'frontend', 'theme.json')) as f:
+            tailwind_config = json.load(f)
+
+        app.register_blueprint(bp)
+        app.extensions['asset_manifest'] = self
+
+        @app.context_processor
+        def asset_helpers():
+            return {
+                'asset_url': self.url,
+                'assets_built': bool(self.entries),
+                'tailwind_config': tailwind_config
+            }
+
+    def url(self, name):
+        if name in self.entries:
+            return url_for('assets.asset', filename=self.entries[name])
+        return url_for('static', filename=name)
+
+
+@bp.route('/<path:filename>')
+def asset(filename):
+    manifest = current_app.extensions['asset_manifest']
+    if filename not in manifest.hashed:
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.exists(os.path.join(manifest.dist, filename + suffix)):
+            response = send_from_directory(manifest.dist, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(manifest.dist, filename, mimetype=mimetype)
+
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+assets = AssetManifest()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Async Serving Benchmark for NoteMaster AI
+Fires N simultaneous chat requests at a note while the LLM is replaced by
+the local stub (LLM_BACKEND=stub), once against gunicorn (serve.py, thread
+per request) and once against uvicorn (asgi.py, coroutine per request).
+
+    python async_benchmark.py --concurrency 500 --latency 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+
+async def post_json(host, port, path, payload):
+    """Minimal HTTP/1.1 POST so the benchmark needs no client library"""
+    body = json.dumps(payload).encode()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def fire(port, concurrency):
+    async def one():
+        started = time.perf_counter()
+        try:
+            status = await post_json('127.0.0.1', port, '/api/notes/1/chat', {'question': 'What is this about?'})
+        except Exception:
+            status = None
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(lat for status, lat in results if status == 200)
+    errors = sum(1 for status, _ in results if status != 200)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+    return elapsed, len(latencies), errors, pct(0.5), pct(0.95)
+
+
+def wait_for(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/tags", timeout=1).read()
+            return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def seed_database(env):
+    subprocess.run([sys.executable, '-c', (
+        "from app import create_app\n"
+        "from models import db, Note\n"
+        "app = create_app()\n"
+        "with app.app_context():\n"
+        "    db.session.add(Note(title='Bench', original_content='lorem ipsum ' * 500, summary='• point'))\n"
+        "    db.session.commit()\n"
+    )], env=env, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare thread vs coroutine serving of chat requests')
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=1.0, help='stub LLM latency in seconds')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='notemaster-async-')
+    base_env = dict(os.environ, LLM_BACKEND='stub', LLM_STUB_LATENCY=str(args.latency))
+
+    servers = [
+        ('gunicorn', 5061, [sys.executable, 'serve.py', '--bind', '127.0.0.1:5061',
+                            '--workers', str(args.workers), '--threads', str(args.threads)]),
+        ('uvicorn', 5062, [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', '5062',
+                           '--workers', str(args.workers), '--log-level', 'warning']),
+    ]
+
+    print("=" * 70)
+    print("⚡ NoteMaster AI - Async Serving Benchmark")
+    print("=" * 70)
+    print(f"\n{args.concurrency} concurrent chats, stub LLM latency {args.latency}s, "
+          f"{args.workers} workers\n")
+
+    for label, port, command in servers:
+        # Fresh database per server so neither inherits the other's chat history
+        env = dict(base_env, DATABASE_URL=f"sqlite:///{os.path.join(workdir, label + '.db')}")
+        seed_database(env)
+        process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for(port):
+                print(f"  {label:<9} failed to start")
+                continue
+            elapsed, ok, errors, p50, p95 = asyncio.run(fire(port, args.concurrency))
+            print(f"  {label:<9} wall {elapsed:>6.2f}s   {ok / elapsed:>7.1f} chats/s   "
+                  f"p50 {p50:>6.2f}s   p95 {p95:>6.2f}s   errors {errors}")
+        finally:
+            process.terminate()
+            process.wait()
+
+    print("\n" + "=" * 70)
+
+
+if __name__ == '__main__':
+    main()
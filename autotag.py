@@ -0,0 +1,276 @@
+"""
+Local auto-tagging from TF-IDF keywords.
+
+Every saved note is indexed: its terms update the corpus document
+frequencies (TermStat) and its top TF-IDF terms are stored on
+Note.keywords. A tag is suggested for a note when the note's keyword
+vector is close to the tag's profile (the centroid of its notes' keyword
+vectors) or contains the tag's own name. No LLM calls are involved.
+"""
+
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import inspect, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db, Note, Tag, TermStat, note_tags
+from workspaces import activate, current_workspace
+
+DOCS_KEY = '__docs__'  # TermStat row holding the number of indexed notes
+TOP_TERMS = 40
+PROFILE_TTL = 60  # seconds a process keeps its tag profiles
+
+STOPWORDS = frozenset("""
+about above after again against all also among and any are because been before being below between both
+but can could did does doing down during each few for from further had has have having her here hers him
+his how into its itself just more most much must not now off once only other our ours out over own same
+she should some such than that the their theirs them then there these they this those through too under
+until upon very was were what when where which while who whom why will with would you your yours strong
+""".split())
+
+_TOKEN = re.compile(r"[a-z][a-z0-9\-]{2,63}")
+_TAG = re.compile(r'<[^>]+>')
+
+_profiles = {}  # workspace: {'built', 'vectors'}
+_profiles_lock = threading.Lock()
+
+
+def tokenize(text):
+    return [word for word in _TOKEN.findall(_TAG.sub(' ', text.lower())) if word not in STOPWORDS]
+
+
+def _note_terms(note):
+    return Counter(tokenize(f'{note.title}\n{note.original_content}\n{note.summary}'))
+
+
+def _document_frequencies(terms):
+    """Document frequency for each term plus the corpus size, in one query"""
+    rows = db.session.execute(
+        select(TermStat.term, TermStat.doc_count).where(TermStat.term.in_(list(terms) + [DOCS_KEY]))
+    ).all()
+    frequencies = dict(rows)
+    return frequencies, frequencies.pop(DOCS_KEY, 0)
+
+
+def _adjust_frequencies(terms, delta):
+    """Add delta to the document frequency of every term (and of the corpus size)"""
+    terms = set(terms) | {DOCS_KEY}
+    if delta > 0 and db.session.get_bind().dialect.name == 'sqlite':
+        # An upsert, so two notes that bring in the same new term at once both count it
+        insert = sqlite_insert(TermStat.__table__).values([{'term': term, 'doc_count': delta} for term in terms])
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['term'],
+            set_={'doc_count': TermStat.__table__.c.doc_count + insert.excluded.doc_count}
+        ))
+        return
+
+    existing = set(db.session.scalars(select(TermStat.term).where(TermStat.term.in_(terms))))
+
+    if existing:
+        db.session.execute(
+            TermStat.__table__.update()
+            .where(TermStat.term.in_(existing))
+            .values(doc_count=TermStat.doc_count + delta)
+        )
+    if delta > 0 and terms - existing:
+        db.session.execute(
+            TermStat.__table__.insert(),
+            [{'term': term, 'doc_count': delta} for term in terms - existing]
+        )
+
+
+def keyword_vector(counts, frequencies, total_docs):
+    """Unit-length TF-IDF vector of the TOP_TERMS highest-weighted terms"""
+    weights = {
+        term: (1 + math.log(count)) * (math.log((total_docs + 1) / (frequencies.get(term, 0) + 1)) + 1)
+        for term, count in counts.items()
+    }
+    top = sorted(weights.items(), key=lambda item: item[1], reverse=True)[:TOP_TERMS]
+    norm = math.sqrt(sum(weight * weight for _, weight in top)) or 1.0
+    return {term: round(weight / norm, 5) for term, weight in top}
+
+
+def _store_keywords(note, keywords):
+    """Set Note.keywords without bumping updated_at
+
+    Keywords are derived data: indexing a note on a read or in the backfill
+    is not an edit, and must not reorder notes or invalidate digests. Notes
+    with pending edits are saved normally and get a new updated_at anyway.
+    """
+    state = inspect(note)
+    if not state.persistent or state.modified:
+        note.keywords = keywords
+        return
+    db.session.execute(
+        update(Note).where(Note.id == note.id).values(keywords=keywords, updated_at=Note.updated_at)
+    )
+    set_committed_value(note, 'keywords', keywords)
+
+
+def index_note(note):
+    """Count a new note's terms into the corpus and store its keyword vector"""
+    counts = _note_terms(note)
+    _adjust_frequencies(counts, 1)
+    frequencies, total_docs = _document_frequencies(counts)
+    _store_keywords(note, json.dumps(keyword_vector(counts, frequencies, total_docs)))
+    return counts
+
+
+def unindex_note(note):
+    """Remove a note's terms from the corpus statistics (before delete or re-index)"""
+    if note.keywords is not None:
+        _adjust_frequencies(_note_terms(note), -1)
+        _store_keywords(note, None)
+
+
+def tag_profiles(max_age=PROFILE_TTL):
+    """Per-tag centroid of member keyword vectors, rebuilt at most every max_age seconds"""
+    workspace = current_workspace()
+    with _profiles_lock:
+        cached = _profiles.get(workspace)
+        if cached and time.monotonic() - cached['built'] < max_age:
+            return cached['vectors']
+
+    sums, members = {}, Counter()
+    rows = db.session.execute(
+        select(note_tags.c.tag_id, Note.keywords)
+        .join(Note, Note.id == note_tags.c.note_id)
+        .where(Note.keywords.is_not(None))
+    )
+    for tag_id, keywords in rows:
+        members[tag_id] += 1
+        vector = sums.setdefault(tag_id, Counter())
+        vector.update(json.loads(keywords))
+
+    vectors = {}
+    for tag_id, vector in sums.items():
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        vectors[tag_id] = {term: weight / norm for term, weight in vector.items()}
+
+    with _profiles_lock:
+        _profiles[workspace] = {'vectors': vectors, 'built': time.monotonic()}
+    return vectors
+
+
+def invalidate_profiles():
+    with _profiles_lock:
+        _profiles.pop(current_workspace(), None)
+
+
+def suggest_tags(note, tags=None, profiles=None, limit=3, min_score=0.25):
+    """Existing tags that fit the note, best first, as (tag, score) pairs"""
+    if note.keywords is None:
+        return []
+    vector = json.loads(note.keywords)
+    tags = tags if tags is not None else Tag.query.all()
+    profiles = profiles if profiles is not None else tag_profiles()
+    current = {tag.id for tag in note.tags}
+
+    scored = []
+    for tag in tags:
+        if tag.id in current:
+            continue
+        profile = profiles.get(tag.id, {})
+        similarity = sum(weight * profile.get(term, 0.0) for term, weight in vector.items())
+        name_terms = tokenize(tag.name)
+        name_match = sum(1 for term in name_terms if term in vector) / len(name_terms) if name_terms else 0.0
+        score = max(similarity, 0.5 * name_match) if profile else 0.5 * name_match
+        if score >= min_score:
+            scored.append((tag, round(score, 3)))
+
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit]
+
+
+def apply_tags(pairs):
+    """Attach (note_id, tag_id) pairs with one set-based insert, skipping existing links"""
+    if not pairs:
+        return 0
+    existing = set(db.session.execute(
+        select(note_tags.c.note_id, note_tags.c.tag_id)
+        .where(note_tags.c.note_id.in_({note_id for note_id, _ in pairs}))
+    ).all())
+    new = [{'note_id': n, 'tag_id': t} for n, t in set(pairs) - existing]
+    if new:
+        db.session.execute(note_tags.insert(), new)
+    return len(new)
+
+
+class BackfillJob:
+    """Indexes every note and suggests (or applies) tags in batches on a background thread"""
+
+    def __init__(self):
+        self.state = {'status': 'idle'}
+        self._lock = threading.Lock()
+
+    def start(self, app, apply=False, batch_size=200):
+        with self._lock:
+            if self.state.get('status') == 'running':
+                return False
+            self.state = {'status': 'running', 'apply': apply, 'indexed': 0, 'scanned': 0,
+                          'suggested': 0, 'applied': 0, 'started_at': time.time()}
+        threading.Thread(target=self._run, args=(app, current_workspace(), apply, batch_size), daemon=True).start()
+        return True
+
+    def _batches(self, query, batch_size):
+        last_id = 0
+        while True:
+            batch = query.filter(Note.id > last_id).order_by(Note.id).limit(batch_size).all()
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield batch
+
+    def _run(self, app, workspace, apply, batch_size):
+        from cache import mark_for_invalidation, cache
+
+        try:
+            with app.app_context(), activate(workspace):
+                # Pass 1: bring corpus statistics up to date
+                for batch in self._batches(Note.query.filter(Note.keywords.is_(None)), batch_size):
+                    for note in batch:
+                        index_note(note)
+                    db.session.commit()
+                    self.state['indexed'] += len(batch)
+
+                # Pass 2: score every note against fresh tag profiles
+                invalidate_profiles()
+                tags = Tag.query.all()
+                profiles = tag_profiles()
+                suggestions = {}
+                for batch in self._batches(Note.query, batch_size):
+                    pairs = []
+                    for note in batch:
+                        picks = suggest_tags(note, tags, profiles)
+                        if picks:
+                            suggestions[note.id] = [tag.id for tag, _ in picks]
+                            pairs.extend((note.id, tag.id) for tag, _ in picks)
+                    self.state['scanned'] += len(batch)
+                    self.state['suggested'] += len(pairs)
+                    if apply and pairs:
+                        self.state['applied'] += apply_tags(pairs)
+                        mark_for_invalidation(db.session, [cache.tags_key()] +
+                                              [cache.note_key(note_id) for note_id, _ in pairs])
+                        db.session.commit()
+                    db.session.expunge_all()
+
+                if apply:
+                    invalidate_profiles()
+                else:
+                    self.state['suggestions'] = suggestions
+                self.state['status'] = 'finished'
+        except Exception as e:
+            app.logger.error(f"Auto-tag backfill failed: {e}")
+            self.state['status'] = 'failed'
+            self.state['error'] = str(e)
+        finally:
+            self.state['finished_at'] = time.time()
+
+
+backfill_job = BackfillJob()
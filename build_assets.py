@@ -0,0 +1,209 @@
+"""
+Build the front-end assets so the page needs no third-party hosts
+
+    npm install --prefix frontend
+    python build_assets.py
+
+Produces, under static/dist/:
+- app.<hash>.css: Tailwind compiled ahead of time from the classes the
+  templates and script.js actually use, plus @font-face rules for the
+  vendored fonts
+- icons.<hash>.js: only the Lucide icons the page references, with a
+  small createIcons() that replaces the lucide runtime
+- js/script.<hash>.js and the font files, renamed by content hash
+- a .gz (and, when the brotli package is installed, .br) copy of every text asset
+- manifest.json mapping logical names to hashed ones, read by assets.py
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FRONTEND = os.path.join(ROOT, 'frontend')
+NODE_MODULES = os.path.join(FRONTEND, 'node_modules')
+DIST = os.path.join(ROOT, 'static', 'dist')
+ICON_SOURCES = [os.path.join(ROOT, 'templates', 'index.html'), os.path.join(ROOT, 'static', 'js', 'script.js')]
+
+FONTS = {
+    # family: (fontsource package, file prefix, weights)
+    'Inter': ('@fontsource/inter', 'inter', [300, 400, 500, 600, 700]),
+    'Space Grotesk': ('@fontsource/space-grotesk', 'space-grotesk', [500, 600, 700]),
+}
+
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg')
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def write_hashed(manifest, logical_name, data):
+    """Write data as <stem>.<hash><ext> under DIST and record it in the manifest"""
+    stem, ext = os.path.splitext(logical_name)
+    hashed_name = f'{stem}.{content_hash(data)}{ext}'
+    path = os.path.join(DIST, hashed_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    manifest[logical_name] = hashed_name
+    return hashed_name
+
+
+def tailwind_command():
+    binary = os.getenv('TAILWIND_BIN') or shutil.which('tailwindcss')
+    if binary:
+        return [binary]
+    local = os.path.join(NODE_MODULES, '.bin', 'tailwindcss')
+    if os.path.exists(local):
+        return [local]
+    sys.exit('tailwindcss not found: run `npm install --prefix frontend` or set TAILWIND_BIN')
+
+
+def build_css():
+    """Compile and minify only the Tailwind classes in use"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'app.css')
+        subprocess.run(tailwind_command() + [
+            '--config', os.path.join(FRONTEND, 'tailwind.config.js'),
+            '--input', os.path.join(FRONTEND, 'input.css'),
+            '--output', output,
+            '--minify',
+        ], check=True)
+        with open(output, 'rb') as f:
+            return f.read()
+
+
+def build_fonts(manifest):
+    """Copy the latin woff2 files and return @font-face rules pointing at their hashed names"""
+    rules = []
+    for family, (package, prefix, weights) in FONTS.items():
+        for weight in weights:
+            filename = f'{prefix}-latin-{weight}-normal.woff2'
+            source = os.path.join(NODE_MODULES, package, 'files', filename)
+            with open(source, 'rb') as f:
+                hashed = write_hashed(manifest, f'fonts/{filename}', f.read())
+            rules.append(
+                f"@font-face{{font-family:'{family}';font-style:normal;font-weight:{weight};"
+                f"font-display:swap;src:url(/assets/{hashed}) format('woff2')}}"
+            )
+    return '\n'.join(rules).encode('utf-8')
+
+
+def used_icons():
+    names = set()
+    for path in ICON_SOURCES:
+        with open(path, encoding='utf-8') as f:
+            names.update(re.findall(r'data-lucide="([a-z0-9-]+)"', f.read()))
+    return sorted(names)
+
+
+def build_icons():
+    """Inline the SVGs of the used icons behind a lucide-compatible createIcons()"""
+    icon_dir = os.path.join(NODE_MODULES, 'lucide-static', 'icons')
+    if not os.path.isdir(icon_dir):
+        sys.exit('lucide-static not found: run `npm install --prefix frontend`')
+    icons = {}
+    for name in used_icons():
+        path = os.path.join(icon_dir, f'{name}.svg')
+        if not os.path.exists(path):
+            # The browser leaves an unknown icon's placeholder empty; don't fail the build over it
+            print(f'warning: no Lucide icon named "{name}"; skipped', file=sys.stderr)
+            continue
+        with open(path, encoding='utf-8') as f:
+            svg = f.read()
+        # Keep the inner markup; the <svg> wrapper is rebuilt in the browser
+        inner = re.search(r'<svg[^>]*>(.*)</svg>', svg, re.S).group(1)
+        icons[name] = re.sub(r'\s*\n\s*', '', inner)
+
+    script = """(function () {
+var ICONS = %s;
+function createIcons() {
+  document.querySelectorAll('[data-lucide]:not(svg)').forEach(function (el) {
+    var name = el.getAttribute('data-lucide');
+    if (!ICONS[name]) return;
+    var svg = document.createElementNS('http://www.w3.org/2000/svg', 'svg');
+    svg.setAttribute('xmlns', 'http://www.w3.org/2000/svg');
+    svg.setAttribute('width', '24');
+    svg.setAttribute('height', '24');
+    svg.setAttribute('viewBox', '0 0 24 24');
+    svg.setAttribute('fill', 'none');
+    svg.setAttribute('stroke', 'currentColor');
+    svg.setAttribute('stroke-width', '2');
+    svg.setAttribute('stroke-linecap', 'round');
+    svg.setAttribute('stroke-linejoin', 'round');
+    svg.setAttribute('class', ('lucide lucide-' + name + ' ' + (el.getAttribute('class') || '')).trim());
+    svg.innerHTML = ICONS[name];
+    el.replaceWith(svg);
+  });
+}
+window.lucide = {createIcons: createIcons};
+})();
+""" % json.dumps(icons, separators=(',', ':'))
+    return script.encode('utf-8'), len(icons)
+
+
+def precompress(root):
+    """Write .gz (and .br when available) next to every text asset"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+    return brotli is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build self-hosted, content-hashed front-end assets')
+    parser.add_argument('--keep', action='store_true', help='keep assets from previous builds in static/dist')
+    args = parser.parse_args()
+
+    if not args.keep and os.path.isdir(DIST):
+        shutil.rmtree(DIST)
+    os.makedirs(DIST, exist_ok=True)
+
+    manifest = {}
+    font_css = build_fonts(manifest)
+    write_hashed(manifest, 'app.css', font_css + b'\n' + build_css())
+    icons, icon_count = build_icons()
+    write_hashed(manifest, 'icons.js', icons)
+    with open(os.path.join(ROOT, 'static', 'js', 'script.js'), 'rb') as f:
+        write_hashed(manifest, 'js/script.js', f.read())
+
+    with_brotli = precompress(DIST)
+    with open(os.path.join(DIST, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    print("=" * 60)
+    print(f" Built {len(manifest)} assets into static/dist ({icon_count} icons)")
+    for logical, hashed in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(DIST, hashed))
+        gz = os.path.join(DIST, hashed + '.gz')
+        compressed = f'{os.path.getsize(gz):>9,} B gzip' if os.path.exists(gz) else ''
+        print(f"  {logical:<44} {size:>9,} B {compressed}")
+    if not with_brotli:
+        print(" brotli is not installed; only .gz variants were written (pip install brotli)")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from workspaces import workspace_key
+
+
+class LocalBackend:
+    """In-process LRU store bounded by the total size of cached payloads"""
+
+    # Invalidation records kept for generation checks; older ones are folded into a floor
+    MAX_GENERATIONS = 10000
+
+    def __init__(self, max_bytes, ttl=0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()  # key: (payload, expires_at or None)
+        self._clock = 0
+        self._invalidated = OrderedDict()  # key: clock at its last invalidation
+        self._prefix_invalidated = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def generation(self, key):
+        with self._lock:
+            return self._clock
+
+    def _stale(self, key, generation):
+        """Whether key was invalidated after `generation` was read; caller holds self._lock"""
+        return (generation < self._floor or generation < self._prefix_invalidated
+                or generation < self._invalidated.get(key, 0))
+
+    def set(self, key, value, generation=None):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and self._stale(key, generation):
+                return
+            self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl if self.ttl else None)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _remove(self, key):
+        """Drop an entry; caller holds self._lock"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def _bump(self, key):
+        """Record an invalidation; caller holds self._lock"""
+        self._clock += 1
+        self._invalidated.pop(key, None)
+        self._invalidated[key] = self._clock
+        if len(self._invalidated) > self.MAX_GENERATIONS:
+            _, self._floor = self._invalidated.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+                self._bump(key)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._remove(key)
+            self._clock += 1
+            self._prefix_invalidated = self._clock
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self._clock += 1
+            self._prefix_invalidated = self._clock
+
+
+class RedisBackend:
+    """Shared store so every WSGI worker sees the same entries and invalidations"""
+
+    # Store a payload only if neither its key nor any prefix was invalidated since the build began
+    _SET_IF_CURRENT = """
+if (redis.call('get', KEYS[2]) or '') == ARGV[3] and (redis.call('get', KEYS[3]) or '') == ARGV[4] then
+    if tonumber(ARGV[2]) > 0 then
+        redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    else
+        redis.call('set', KEYS[1], ARGV[1])
+    end
+end
+"""
+    GENERATION_TTL = 86400  # seconds an invalidation counter outlives its last bump
+
+    def __init__(self, url, max_bytes, ttl=0, namespace='notemaster:cache:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.namespace = namespace
+        self._prefix_generation = namespace + 'generation*'
+        self._set_if_current = self.client.register_script(self._SET_IF_CURRENT)
+        # Redis enforces the bound itself (maxmemory + allkeys-lru); this only
+        # keeps single oversized payloads out of the shared store.
+
+    def _generation_key(self, key):
+        return f'{self.namespace}generation:{key}'
+
+    def get(self, key):
+        return self.client.get(self.namespace + key)
+
+    def generation(self, key):
+        return tuple((value or b'').decode() for value in
+                     self.client.mget(self._generation_key(key), self._prefix_generation))
+
+    def set(self, key, value, generation=None):
+        if len(value) > self.max_bytes:
+            return
+        if generation is None:
+            self.client.set(self.namespace + key, value, ex=self.ttl or None)
+            return
+        self._set_if_current(
+            keys=[self.namespace + key, self._generation_key(key), self._prefix_generation],
+            args=[value, self.ttl, *generation]
+        )
+
+    def delete(self, *keys):
+        if keys:
+            pipe = self.client.pipeline()
+            pipe.delete(*[self.namespace + key for key in keys])
+            for key in keys:
+                pipe.incr(self._generation_key(key))
+                pipe.expire(self._generation_key(key), self.GENERATION_TTL)
+            pipe.execute()
+
+    def delete_prefix(self, prefix):
+        generations = self.namespace + 'generation'
+        keys = [key for key in self.client.scan_iter(match=self.namespace + prefix + '*')
+                if not key.decode().startswith(generations)]
+        pipe = self.client.pipeline()
+        if keys:
+            pipe.delete(*keys)
+        pipe.incr(self._prefix_generation)
+        pipe.expire(self._prefix_generation, self.GENERATION_TTL)
+        pipe.execute()
+
+    def clear(self):
+        self.delete_prefix('')
+
+
+class ResponseCache:
+    """Read-through cache of serialized API payloads, invalidated on commit"""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        max_bytes = app.config.get('CACHE_MAX_BYTES', 8 * 1024 * 1024)
+        ttl = app.config.get('CACHE_TTL', 300)
+        redis_url = app.config.get('CACHE_REDIS_URL')
+
+        if not app.config.get('CACHE_ENABLED', True):
+            self.backend = None
+        elif redis_url:
+            self.backend = RedisBackend(redis_url, max_bytes, ttl)
+        else:
+            self.backend = LocalBackend(max_bytes, ttl)
+
+        app.extensions['response_cache'] = self
+
+    @staticmethod
+    def note_key(note_id):
+        return workspace_key(f'note:{note_id}')
+
+    @staticmethod
+    def tags_key():
+        return workspace_key('tags')
+
+    def get_or_build(self, key, build):
+        """Return the cached payload for key, building and storing it on a miss
+
+        The key's generation is read before building; if a commit invalidates
+        the key while the payload is built, the payload is returned but not
+        stored, so it cannot outlive the invalidation.
+        """
+        if self.backend is None:
+            return build()
+
+        payload = self.backend.get(key)
+        with self._stats_lock:
+            if payload is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if payload is None:
+            generation = self.backend.generation(key)
+            payload = build()
+            self.backend.set(key, payload, generation)
+        return payload
+
+    def invalidate(self, keys=(), all_notes=False):
+        if self.backend is None:
+            return
+        if all_notes:
+            self.backend.delete_prefix(workspace_key('note:'))
+        if keys:
+            self.backend.delete(*keys)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'enabled': self.backend is not None,
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+        if isinstance(self.backend, LocalBackend):
+            stats['size_bytes'] = self.backend.size
+            stats['max_bytes'] = self.backend.max_bytes
+        return stats
+
+
+cache = ResponseCache()
+
+_PENDING_KEY = 'response_cache_pending'
+
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, {'keys': set(), 'all_notes': False})
+
+
+def mark_for_invalidation(session, keys=(), all_notes=False):
+    """Queue invalidations for writes the ORM cannot see (Core inserts/deletes)"""
+    pending = _pending(session)
+    pending['keys'].update(keys)
+    pending['all_notes'] = pending['all_notes'] or all_notes
+
+
+def _tag_columns_changed(tag):
+    state = inspect(tag)
+    return any(state.attrs[attr.key].history.has_changes() for attr in state.mapper.column_attrs)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_invalidations(session, flush_context):
+    """Record which cached payloads the flushed rows touch"""
+    from models import Note, Tag, ChatMessage
+
+    pending = _pending(session)
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Note):
+            # Covers note_tags changes too: they flush as a change on Note.tags
+            pending['keys'].add(ResponseCache.note_key(obj.id))
+            if obj not in session.dirty or inspect(obj).attrs.tags.history.has_changes():
+                # Membership changed, so the tag facet counts did too
+                pending['keys'].add(ResponseCache.tags_key())
+        elif isinstance(obj, Tag):
+            if obj in session.dirty and not _tag_columns_changed(obj):
+                # Only the Tag.notes backref moved; the Note side covers it
+                continue
+            pending['keys'].add(ResponseCache.tags_key())
+            if obj not in session.new:
+                # Tag name/colour is embedded in every note payload that carries it
+                pending['all_notes'] = True
+        elif isinstance(obj, ChatMessage):
+            pending['keys'].add(ResponseCache.note_key(obj.note_id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        cache.invalidate(pending['keys'], all_notes=pending['all_notes'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,135 @@
+"""
+Gzip/Brotli compression of API responses.
+
+Responses of a compressible type above COMPRESS_MIN_SIZE are compressed
+with the best encoding the client accepts (Brotli when the brotli package
+is installed, otherwise gzip). Streamed responses, such as NDJSON, are
+compressed chunk by chunk and flushed after every chunk so each record
+still reaches the client as soon as it is produced. Responses that are
+already encoded (the precompressed /assets/ files) pass through untouched.
+"""
+
+import gzip
+import threading
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class _StreamCompressor:
+    """Incremental gzip or Brotli encoder with a flush per chunk"""
+
+    def __init__(self, encoding, level, brotli_quality):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, chunk):
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class ResponseCompressor:
+    """after_request hook that negotiates Accept-Encoding and compresses the body"""
+
+    def __init__(self, app=None):
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('COMPRESS_ENABLED', True):
+            return
+
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+        self.level = app.config.get('COMPRESS_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 4)
+        self.mimetypes = set(app.config.get('COMPRESS_MIMETYPES', ('application/json', 'application/x-ndjson')))
+
+        app.after_request(self.compress)
+        app.extensions['response_compressor'] = self
+
+    def _encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, response):
+        if (response.mimetype not in self.mimetypes
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.direct_passthrough):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            if encoding == 'br':
+                data = brotli.compress(body, quality=self.brotli_quality)
+            else:
+                data = gzip.compress(body, self.level, mtime=0)
+            response.set_data(data)
+            with self._stats_lock:
+                self.bytes_in += len(body)
+                self.bytes_out += len(data)
+
+        response.headers['Content-Encoding'] = encoding
+        if response.headers.get('ETag'):
+            # Same entity, different bytes: a strong validator no longer holds
+            response.set_etag(response.get_etag()[0], weak=True)
+        with self._stats_lock:
+            self.compressed += 1
+        return response
+
+    def _stream(self, chunks, encoding):
+        compressor = _StreamCompressor(encoding, self.level, self.brotli_quality)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.finish()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def stats(self):
+        return {
+            'compressed_responses': self.compressed,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None
+        }
+
+
+compressor = ResponseCompressor()
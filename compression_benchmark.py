@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compression Benchmark for NoteMaster AI
+Builds note-list JSON payloads of several sizes through the app and
+reports, per encoding, the compressed size, the time to compress, and the
+resulting time to deliver over a few link speeds (compress + transfer).
+
+    python compression_benchmark.py
+    python compression_benchmark.py --sizes 2000 50000 --links 5 50
+"""
+
+import argparse
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+
+WORDS = ('cell membrane protein enzyme photosynthesis mitochondria respiration glucose energy '
+         'chloroplast nucleus ribosome transcription translation gene allele mutation evolution '
+         'selection population ecosystem cycle carbon nitrogen water osmosis diffusion gradient').split()
+
+
+def note_payloads(sizes):
+    """JSON bodies of /api/notes with roughly the requested sizes, from a scratch app"""
+    from config import Config
+    from app import create_app
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        TESTING = True
+
+    app = create_app(BenchConfig)
+    random.seed(7)
+    payloads = {}
+    with app.app_context():
+        for size in sizes:
+            notes, body = [], b'[]'
+            while len(body) < size:
+                text = ' '.join(random.choices(WORDS, k=120)).capitalize() + '.'
+                notes.append({
+                    'id': len(notes) + 1,
+                    'title': text[:50],
+                    'original_content': text,
+                    'summary': '<h3>Key Points</h3>\n' + '\n'.join(f'• {text[i:i + 80]}' for i in range(0, 400, 80)),
+                    'created_at': '2024-01-01T12:00:00', 'updated_at': '2024-01-01T12:00:00',
+                    'tags': [{'id': 1, 'name': 'Biology', 'color': '#667eea'}]
+                })
+                body = app.json.dumps({'notes': notes}).encode('utf-8')
+            payloads[size] = body
+    return payloads
+
+
+def encoders():
+    options = [('identity', lambda data: data)]
+    options += [(f'gzip-{level}', lambda data, level=level: gzip.compress(data, level, mtime=0)) for level in (1, 6, 9)]
+    try:
+        import brotli
+    except ImportError:
+        print("brotli is not installed; Brotli rows are skipped (pip install brotli)\n")
+    else:
+        options += [(f'br-{quality}', lambda data, quality=quality: brotli.compress(data, quality=quality))
+                    for quality in (4, 11)]
+    return options
+
+
+def timed(encode, data, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = encode(data)
+    return result, (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the bandwidth/latency trade-off of response compression')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 20000, 100000, 500000, 2000000],
+                        help='payload sizes in bytes')
+    parser.add_argument('--links', type=float, nargs='+', default=[2, 20, 200], help='link speeds in Mbit/s')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    payloads = note_payloads(args.sizes)
+    options = encoders()
+
+    header = f"{'payload':>10} {'encoding':<10} {'bytes':>10} {'ratio':>6} {'cpu ms':>8}"
+    header += ''.join(f" {f'@{link:g}Mbps ms':>13}" for link in args.links)
+    print(header)
+    print('-' * len(header))
+    for size, data in payloads.items():
+        repeat = max(1, 2_000_000 // len(data))
+        for name, encode in options:
+            encoded, seconds = timed(encode, data, min(repeat, 50))
+            row = f"{len(data):>10,} {name:<10} {len(encoded):>10,} {len(encoded) / len(data):>6.3f} {seconds * 1000:>8.2f}"
+            for link in args.links:
+                deliver = seconds + len(encoded) * 8 / (link * 1_000_000)
+                row += f" {deliver * 1000:>13.2f}"
+            print(row)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -13,14 +13,128 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///notemaster.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Workspaces (workspaces.py): one SQLite file per workspace, picked by header or /w/<name>/ prefix
+    WORKSPACES_ENABLED = os.getenv('WORKSPACES_ENABLED', 'false').lower() == 'true'
+    WORKSPACE_DIR = os.getenv('WORKSPACE_DIR')  # default: instance/workspaces
+    WORKSPACE_HEADER = os.getenv('WORKSPACE_HEADER', 'X-Workspace')
+    WORKSPACE_MAX_ENGINES = int(os.getenv('WORKSPACE_MAX_ENGINES', 32))  # open databases per process (LRU)
+    
     # Gemini AI
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
     GEMINI_MODEL = 'gemini-2.5-flash'    
+    # Size-based routing: "max_input_tokens:model,..." tried in order before GEMINI_MODEL,
+    # e.g. "4000:gemini-2.5-flash-lite" sends short prompts to a faster model
+    LLM_MODEL_ROUTES = [
+        (int(limit), model.strip())
+        for limit, model in (rule.split(':', 1) for rule in os.getenv('LLM_MODEL_ROUTES', '').split(',') if rule.strip())
+    ]
+    LLM_MAX_INPUT_TOKENS = int(os.getenv('LLM_MAX_INPUT_TOKENS', 1000000))  # GEMINI_MODEL's budget; larger prompts are rejected
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')  # 'stub' uses the local llm_stub model
+    LLM_STUB_LATENCY = float(os.getenv('LLM_STUB_LATENCY', 0.5))  # seconds per stub call
+    LLM_STUB_ERROR_RATE = float(os.getenv('LLM_STUB_ERROR_RATE', 0))
+    LLM_STUB_SLOW_RATE = float(os.getenv('LLM_STUB_SLOW_RATE', 0))  # share of calls 10x slower
+    LLM_STUB_PREFILL_PER_1K = float(os.getenv('LLM_STUB_PREFILL_PER_1K', 0))  # extra seconds per 1k uncached prompt words
+    
+    # LLM scheduler. The rates are the account's quota; each of the LLM_QUOTA_WORKERS
+    # processes serving the app admits its 1/N share (serve.py sets it to --workers,
+    # uvicorn and gunicorn users set WEB_CONCURRENCY)
+    LLM_SCHEDULER_ENABLED = os.getenv('LLM_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', 60))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', 250000))
+    LLM_QUOTA_WORKERS = int(os.getenv('LLM_QUOTA_WORKERS', os.getenv('WEB_CONCURRENCY', 1)))
+    LLM_QUEUE_MAX_DEPTH = int(os.getenv('LLM_QUEUE_MAX_DEPTH', 50))
+    LLM_QUEUE_MAX_WAIT = float(os.getenv('LLM_QUEUE_MAX_WAIT', 20))  # seconds
+    
+    # Hedged LLM calls and circuit breaker
+    LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'true').lower() == 'true'
+    LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', 2.0))  # never hedge sooner than this
+    LLM_HEDGE_BUDGET = float(os.getenv('LLM_HEDGE_BUDGET', 0.1))  # max hedges per call, per endpoint
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20))
+    LLM_HEDGE_THREADS = int(os.getenv('LLM_HEDGE_THREADS', 32))  # concurrent hedges; primaries are not capped
+    LLM_BREAKER_WINDOW = int(os.getenv('LLM_BREAKER_WINDOW', 20))
+    LLM_BREAKER_ERROR_RATE = float(os.getenv('LLM_BREAKER_ERROR_RATE', 0.5))
+    LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', 5))
+    LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', 30))  # seconds
+    
+    # Context caching of each note's chat prompt prefix (context_cache.py)
+    CONTEXT_CACHE_ENABLED = os.getenv('CONTEXT_CACHE_ENABLED', 'true').lower() == 'true'
+    CONTEXT_CACHE_TTL = int(os.getenv('CONTEXT_CACHE_TTL', 600))  # seconds; extended while a note is in use
+    CONTEXT_CACHE_MIN_TOKENS = int(os.getenv('CONTEXT_CACHE_MIN_TOKENS', 1024))  # provider minimum; shorter notes are sent whole
+    CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv('CONTEXT_CACHE_MAX_ENTRIES', 200))  # handles per process
+    
+    # Response cache (note detail and tag list payloads)
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 8 * 1024 * 1024))
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')  # shared across workers when set
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 300))  # seconds; bounds staleness of per-worker caches (0 = no expiry)
+    
+    # Production server (serve.py)
+    SERVER_BIND = os.getenv('SERVER_BIND', '0.0.0.0:8000')
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))
+    SERVER_KEEPALIVE = int(os.getenv('SERVER_KEEPALIVE', 5))
+    SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 120))  # Gemini calls can take a while
+    SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
+    SERVER_PRELOAD = os.getenv('SERVER_PRELOAD', 'true').lower() == 'true'  # faster forks, but HUP keeps the old code (see serve.py)
+    SERVER_MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 1000))
+    SERVER_PIDFILE = os.getenv('SERVER_PIDFILE')  # master pid, for HUP/USR2 reloads
+    
+    # ASGI server (asgi.py)
+    ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 16))
+    
+    # Local auto-tagging (autotag.py)
+    AUTOTAG_ENABLED = os.getenv('AUTOTAG_ENABLED', 'true').lower() == 'true'
+    AUTOTAG_APPLY = os.getenv('AUTOTAG_APPLY', 'false').lower() == 'true'  # attach suggestions to new notes
+    AUTOTAG_MIN_SCORE = float(os.getenv('AUTOTAG_MIN_SCORE', 0.25))
+    AUTOTAG_MAX_SUGGESTIONS = int(os.getenv('AUTOTAG_MAX_SUGGESTIONS', 3))
+    AUTOTAG_BATCH_SIZE = int(os.getenv('AUTOTAG_BATCH_SIZE', 200))
+    
+    # Request profiling (profiling.py); no hooks are installed when disabled
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_MODE = os.getenv('PROFILING_MODE', 'sample')  # 'sample' or 'cprofile'
+    PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))  # share of requests profiled without X-Profile
+    PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', 0.005))  # seconds between stack samples
+    PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', 50))
+    PROFILING_ADMIN_TOKEN = os.getenv('PROFILING_ADMIN_TOKEN')  # required for /admin/profiles and X-Profile; both are off while unset
+    
+    # Cross-note chat (retrieval.py)
+    CHAT_RETRIEVAL_PASSAGES = int(os.getenv('CHAT_RETRIEVAL_PASSAGES', 20))  # candidates ranked per question
+    CHAT_CONTEXT_MAX_CHARS = int(os.getenv('CHAT_CONTEXT_MAX_CHARS', 12000))  # excerpt budget per prompt
+    
+    # Tag digests (digest.py)
+    DIGEST_PARALLELISM = int(os.getenv('DIGEST_PARALLELISM', 4))  # batch summaries merged concurrently
+    
+    # Database maintenance (maintenance.py)
+    MAINTENANCE_INTERVAL_HOURS = float(os.getenv('MAINTENANCE_INTERVAL_HOURS', 0))  # 0 = only via the CLI
+    MAINTENANCE_BACKUP_DIR = os.getenv('MAINTENANCE_BACKUP_DIR')  # defaults to instance/backups
+    MAINTENANCE_BACKUP_KEEP = int(os.getenv('MAINTENANCE_BACKUP_KEEP', 7))
+    MAINTENANCE_BACKUP_PAGES = int(os.getenv('MAINTENANCE_BACKUP_PAGES', 256))  # pages copied per backup step
+    MAINTENANCE_VACUUM_PAGES = int(os.getenv('MAINTENANCE_VACUUM_PAGES', 0))  # 0 = all free pages
+    CHAT_RETENTION_DAYS = int(os.getenv('CHAT_RETENTION_DAYS', 0))  # 0 = keep chat history forever
+    
+    # Response compression (compression.py); Brotli is used when the brotli package is installed
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # bytes; smaller bodies are sent as-is
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))  # gzip 1-9
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))  # brotli 0-11
+    COMPRESS_MIMETYPES = ['application/json', 'application/x-ndjson', 'text/html', 'text/plain']
+    
+    # Front-end assets (build_assets.py); set false to force the CDN scripts
+    ASSETS_USE_BUILD = os.getenv('ASSETS_USE_BUILD', 'true').lower() == 'true'
     
     # File Upload
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'pdf', 'txt'}
     
+    # Resumable uploads (uploads.py); each chunk is one request, so UPLOAD_CHUNK_SIZE stays under MAX_CONTENT_LENGTH
+    UPLOAD_DIR = os.getenv('UPLOAD_DIR')  # default: instance/uploads
+    UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 200 * 1024 * 1024))  # bytes per file
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024))  # size suggested to clients
+    UPLOAD_EXPIRY_HOURS = float(os.getenv('UPLOAD_EXPIRY_HOURS', 24))  # unfinished uploads are removed after this
+    UPLOAD_MAX_PER_CLIENT = int(os.getenv('UPLOAD_MAX_PER_CLIENT', 5))  # unfinished uploads per client address
+    UPLOAD_SPOOL_MAX_BYTES = int(os.getenv('UPLOAD_SPOOL_MAX_BYTES', 2 * 1024 * 1024 * 1024))  # declared size of all unfinished uploads
+    
     # App Settings
     NOTES_MAX_LENGTH = 50000
-    NOTES_MIN_LENGTH = 10
\ No newline at end of file
+    NOTES_MIN_LENGTH = 10
+    SECTION_SUMMARY_PARALLELISM = int(os.getenv('SECTION_SUMMARY_PARALLELISM', 4))  # batches of section summaries requested concurrently on an edit
\ No newline at end of file
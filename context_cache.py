@@ -0,0 +1,275 @@
+"""
+Provider-side caching of each note's chat context.
+
+Every chat turn on a note starts with the same instructions, original
+notes and summary. The first turn registers that prefix with Gemini's
+cached-content API (or the stub's equivalent), and later turns send only
+the history and question against the cache handle, so the model does not
+reprocess the note each time.
+
+Handles live for CONTEXT_CACHE_TTL seconds and are extended while a note
+keeps being chatted about. A note edit or delete evicts its handle when
+the session commits, and the least recently used handles are deleted
+beyond CONTEXT_CACHE_MAX_ENTRIES. Handles are per process: a handle
+evicted in another worker expires on its own TTL.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from workspaces import workspace_key
+
+
+class GeminiContextBackend:
+    """google.generativeai cached contents"""
+
+    def create(self, model_name, prefix, ttl):
+        from google.generativeai import caching
+
+        return caching.CachedContent.create(
+            model=model_name, contents=[prefix], ttl=timedelta(seconds=ttl), display_name='notemaster-chat'
+        )
+
+    def bind(self, handle, model):
+        import google.generativeai as genai
+
+        return genai.GenerativeModel.from_cached_content(cached_content=handle)
+
+    def extend(self, handle, ttl):
+        handle.update(ttl=timedelta(seconds=ttl))
+
+    def delete(self, handle):
+        handle.delete()
+
+
+class StubContextBackend:
+    """llm_stub's in-process stand-in for cached contents"""
+
+    def create(self, model_name, prefix, ttl):
+        import llm_stub
+        return llm_stub.create_cached_content(prefix, ttl)
+
+    def bind(self, handle, model):
+        return model.with_cached_content(handle)
+
+    def extend(self, handle, ttl):
+        import llm_stub
+        llm_stub.extend_cached_content(handle, ttl)
+
+    def delete(self, handle):
+        import llm_stub
+        llm_stub.delete_cached_content(handle)
+
+
+class CachedPrefix:
+    """A model bound to a cached prompt prefix"""
+
+    def __init__(self, key, model, tokens):
+        self.key = key
+        self.model = model
+        self.tokens = tokens
+
+
+class ContextCache:
+    """Cache handles for chat prompt prefixes, keyed by note (see note_key)"""
+
+    # Renew a handle once less than this share of its TTL is left
+    EXTEND_BELOW = 0.5
+    # Registrations are serialized per key through a fixed set of locks, so
+    # the lock table does not grow with every note ever chatted about
+    KEY_LOCK_STRIPES = 64
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.backend = None
+        self.logger = None
+        self._entries = OrderedDict()  # key: {'handle', 'fingerprint', 'expires_at', 'tokens'}
+        self._key_locks = [threading.Lock() for _ in range(self.KEY_LOCK_STRIPES)]
+        self._lock = threading.Lock()
+        self._deleter = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failures = 0
+        self.cached_tokens = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CONTEXT_CACHE_ENABLED', True)
+        self.ttl = app.config.get('CONTEXT_CACHE_TTL', 600)
+        self.min_tokens = app.config.get('CONTEXT_CACHE_MIN_TOKENS', 1024)
+        self.max_entries = app.config.get('CONTEXT_CACHE_MAX_ENTRIES', 200)
+        self.backend = StubContextBackend() if app.config.get('LLM_BACKEND') == 'stub' else GeminiContextBackend()
+        self.logger = app.logger
+        if self._deleter is None:
+            # Provider deletes are network calls; keep them off the request path
+            self._deleter = ThreadPoolExecutor(max_workers=1, thread_name_prefix='context-cache')
+        app.extensions['context_cache'] = self
+
+    @staticmethod
+    def note_key(note_id):
+        return workspace_key(f'note:{note_id}')
+
+    def _key_lock(self, key):
+        return self._key_locks[hash(key) % self.KEY_LOCK_STRIPES]
+
+    def bind(self, key, prefix, model_name, model, tokens):
+        """The model bound to a cached copy of `prefix`, or None to send the whole prompt
+
+        Prefixes under CONTEXT_CACHE_MIN_TOKENS (the provider's minimum) are
+        never cached. A failed registration is remembered until the TTL
+        passes, so a rejected prefix is not retried on every turn.
+        """
+        if not self.enabled or key is None or tokens < self.min_tokens:
+            return None
+
+        fingerprint = hashlib.sha256(f'{model_name}\0{prefix}'.encode('utf-8')).hexdigest()
+        with self._key_lock(key):
+            now = time.time()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and (entry['fingerprint'] != fingerprint or entry['expires_at'] <= now):
+                    self._drop(key, delete=entry['fingerprint'] != fingerprint)
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+
+            if entry is None:
+                entry = self._create(key, fingerprint, model_name, prefix, tokens, now)
+            elif entry['handle'] is not None:
+                with self._lock:
+                    self.hits += 1
+                if entry['expires_at'] - now < self.ttl * self.EXTEND_BELOW:
+                    try:
+                        self.backend.extend(entry['handle'], self.ttl)
+                        entry['expires_at'] = now + self.ttl
+                    except Exception as e:
+                        self.logger.warning(f"Could not extend context cache for {key}: {e}")
+
+        if entry['handle'] is None:
+            return None
+        return CachedPrefix(key, self.backend.bind(entry['handle'], model), entry['tokens'])
+
+    async def bind_async(self, key, prefix, model_name, model, tokens):
+        """bind() for the event loop
+
+        Registering and renewing a handle are blocking provider calls made
+        under a per-note lock, so they run on the loop's default executor.
+        """
+        if not self.enabled or key is None or tokens < self.min_tokens:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.bind, key, prefix, model_name, model, tokens
+        )
+
+    def _create(self, key, fingerprint, model_name, prefix, tokens, now):
+        try:
+            handle = self.backend.create(model_name, prefix, self.ttl)
+        except Exception as e:
+            self.logger.warning(f"Context cache registration failed for {key}: {e}")
+            handle = None
+
+        entry = {'handle': handle, 'fingerprint': fingerprint, 'expires_at': now + self.ttl, 'tokens': tokens}
+        with self._lock:
+            if handle is None:
+                self.failures += 1
+            else:
+                self.misses += 1
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)), delete=True)
+                self.evictions += 1
+        return entry
+
+    def _drop(self, key, delete):
+        """Remove an entry; caller holds self._lock"""
+        entry = self._entries.pop(key, None)
+        if delete and entry is not None and entry['handle'] is not None:
+            self._deleter.submit(self._delete, entry['handle'])
+
+    def _delete(self, handle):
+        try:
+            self.backend.delete(handle)
+        except Exception as e:
+            # It still expires on its TTL
+            self.logger.warning(f"Could not delete context cache: {e}")
+
+    def record_cached_tokens(self, tokens):
+        with self._lock:
+            self.cached_tokens += tokens
+
+    def forget(self, key):
+        """Drop a handle the provider no longer recognises"""
+        with self._lock:
+            self._drop(key, delete=False)
+
+    def evict(self, keys):
+        """Delete the handles of notes that were edited or deleted"""
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._drop(key, delete=True)
+                    self.evictions += 1
+
+    @staticmethod
+    def is_missing(error):
+        """Whether an error means the cache handle expired or was deleted provider-side"""
+        message = str(error).lower()
+        return 'cachedcontent' in message.replace(' ', '') and ('not found' in message or 'expired' in message
+                                                                or '403' in message or '404' in message)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'failures': self.failures,
+                'evictions': self.evictions,
+                'cached_prompt_tokens': self.cached_tokens
+            }
+
+
+context_cache = ContextCache()
+
+_PENDING_KEY = 'context_cache_evictions'
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_evictions(session, flush_context):
+    """Notes whose chat prefix changed: content or summary edited, or the note deleted"""
+    from models import Note
+
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    for obj in session.deleted:
+        if isinstance(obj, Note):
+            pending.add(ContextCache.note_key(obj.id))
+    for obj in session.dirty:
+        if isinstance(obj, Note):
+            state = inspect(obj)
+            if state.attrs.original_content.history.has_changes() or state.attrs.summary.history.has_changes():
+                pending.add(ContextCache.note_key(obj.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_evictions(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        context_cache.evict(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_evictions(session):
+    session.info.pop(_PENDING_KEY, None)
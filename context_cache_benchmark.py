@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Context Cache Benchmark for NoteMaster AI
+Runs the same multi-turn chat on one note with the context cache on and
+off, and reports per-turn latency and the prompt tokens actually sent
+(total minus those served from the cache).
+
+    python context_cache_benchmark.py                 # local stub (LLM_BACKEND=stub)
+    python context_cache_benchmark.py --gemini        # real API; needs GEMINI_API_KEY
+    python context_cache_benchmark.py --words 8000 --turns 8
+
+The calls are not streamed, so latency is time to the complete reply; with
+the stub that is its fixed latency plus LLM_STUB_PREFILL_PER_1K seconds per
+thousand uncached prompt words (set with --prefill).
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+WORDS = ('cell membrane protein enzyme photosynthesis mitochondria respiration glucose energy '
+         'chloroplast nucleus ribosome transcription translation gene allele mutation evolution '
+         'selection population ecosystem cycle carbon nitrogen water osmosis diffusion gradient').split()
+
+QUESTIONS = [
+    'What is the main idea of these notes?',
+    'How does photosynthesis relate to respiration?',
+    'Which terms should I memorise first?',
+    'Give me one exam-style question on this.',
+    'What is the role of the ribosome?',
+    'Summarise the part about mutation.',
+]
+
+
+def run(args, cache_enabled):
+    from config import Config
+    from app import create_app
+    from models import db, Note
+    from utils import generate_chat_response
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        TESTING = True
+        LLM_BACKEND = 'gemini' if args.gemini else 'stub'
+        LLM_STUB_LATENCY = args.latency
+        LLM_STUB_PREFILL_PER_1K = args.prefill
+        LLM_HEDGE_ENABLED = False
+        CONTEXT_CACHE_ENABLED = cache_enabled
+
+    app = create_app(BenchConfig)
+    random.seed(11)
+    content = ' '.join(random.choices(WORDS, k=args.words)).capitalize() + '.'
+
+    turns = []
+    with app.app_context():
+        note = Note(title='Benchmark note', original_content=content, summary='<h3>Summary</h3>\n• ' + content[:2000])
+        db.session.add(note)
+        db.session.commit()
+
+        history = []
+        for turn in range(args.turns):
+            question = QUESTIONS[turn % len(QUESTIONS)]
+            usage = {}
+            started = time.perf_counter()
+            reply = generate_chat_response(note.original_content, note.summary, history, question, usage,
+                                           note_id=note.id)
+            elapsed = time.perf_counter() - started
+            history += [{'role': 'user', 'content': question}, {'role': 'assistant', 'content': reply}]
+            turns.append((elapsed, usage['prompt_tokens'], usage.get('cached_tokens', 0)))
+    return turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-turn latency and input tokens with context caching')
+    parser.add_argument('--gemini', action='store_true', help='use the real Gemini API instead of the stub')
+    parser.add_argument('--words', type=int, default=6000, help='words in the benchmark note')
+    parser.add_argument('--turns', type=int, default=6)
+    parser.add_argument('--latency', type=float, default=0.3, help='stub base latency, seconds')
+    parser.add_argument('--prefill', type=float, default=0.1, help='stub seconds per 1k uncached prompt words')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    results = {label: run(args, enabled) for label, enabled in (('no cache', False), ('cache', True))}
+
+    print(f"{'turn':>4} | {'no cache ms':>11} {'sent tok':>9} | {'cache ms':>9} {'sent tok':>9} {'cached tok':>10}")
+    print('-' * 64)
+    for turn, (plain, cached) in enumerate(zip(results['no cache'], results['cache']), start=1):
+        print(f"{turn:>4} | {plain[0] * 1000:>11.0f} {plain[1] - plain[2]:>9,} | "
+              f"{cached[0] * 1000:>9.0f} {cached[1] - cached[2]:>9,} {cached[2]:>10,}")
+
+    def mean(rows, pick):
+        return sum(pick(row) for row in rows) / len(rows)
+
+    # The first cached turn registers the prefix; later turns are the steady state
+    for label, rows in (('no cache', results['no cache'][1:]), ('cache', results['cache'][1:])):
+        print(f"turns 2-{args.turns} {label:<8}: {mean(rows, lambda r: r[0]) * 1000:7.0f} ms, "
+              f"{mean(rows, lambda r: r[1] - r[2]):8,.0f} tokens sent per turn")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,11 +2,17 @@
 """
 Quick Fix Script for NoteMaster AI
 This script will diagnose and attempt to fix common issues
+Run with --perf for a performance self-test against latency budgets
 """
 
 import os
 import sys
 
+# --perf: seed a temporary database and time it against latency budgets instead (perf_check.py)
+if '--perf' in sys.argv[1:]:
+    from perf_check import main as perf_main
+    sys.exit(perf_main(sys.argv[1:]))
+
 print("=" * 70)
 print("🔧 NoteMaster AI - Diagnostic & Fix Tool")
 print("=" * 70)
@@ -0,0 +1,124 @@
+"""
+Per-tag study guides built from existing note summaries.
+
+A tag's notes are grouped into batches, each batch's summaries are merged
+by one LLM call (batches run in parallel), and the batch results are merged
+again until one digest remains. Batch boundaries are content-defined on
+note ids, so adding, removing or editing a note only changes the batch it
+falls in; unchanged batches are reused from TagDigest.batches.
+
+While the circuit breaker is open build_digest raises CircuitOpenError and
+callers serve fallback_digest, which is never stored: the next build after
+the breaker closes goes to the LLM.
+"""
+
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Note, TagDigest, note_tags
+from utils import generate_digest, digest_fallback
+
+BATCH_BOUNDARY_MODULUS = 6
+BATCH_MAX_NOTES = 12
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def member_notes(tag_id):
+    """(id, title, summary, updated_at) of the tag's notes, by id; original content is never loaded"""
+    return db.session.execute(
+        select(Note.id, Note.title, Note.summary, Note.updated_at)
+        .join(note_tags, note_tags.c.note_id == Note.id)
+        .where(note_tags.c.tag_id == tag_id)
+        .order_by(Note.id)
+    ).all()
+
+
+def split_batches(notes):
+    """Group notes into (fingerprint, notes) batches whose boundaries depend only on note ids"""
+    batches, current = [], []
+
+    def close():
+        if current:
+            fingerprint = _hash('|'.join(f'{n.id}:{n.updated_at.isoformat()}' for n in current))
+            batches.append((fingerprint, list(current)))
+            current.clear()
+
+    for note in notes:
+        current.append(note)
+        if hashlib.sha1(str(note.id).encode()).digest()[0] % BATCH_BOUNDARY_MODULUS == 0 \
+                or len(current) >= BATCH_MAX_NOTES:
+            close()
+    close()
+
+    return batches
+
+
+def _merge_all(app, topic, groups, workers):
+    """Run generate_digest over each group of (title, text) pairs in parallel"""
+    def merge(parts):
+        with app.app_context():
+            return generate_digest(topic, parts)
+
+    if len(groups) == 1:
+        return [merge(groups[0])]
+    with ThreadPoolExecutor(max_workers=min(workers, len(groups))) as pool:
+        return list(pool.map(merge, groups))
+
+
+def build_digest(tag):
+    """Return (TagDigest, batches_total, batches_regenerated), reusing whatever is unchanged"""
+    notes = member_notes(tag.id)
+    if not notes:
+        raise ValueError(f'Tag "{tag.name}" has no notes')
+    batches = split_batches(notes)
+    fingerprint = _hash(','.join(batch_fingerprint for batch_fingerprint, _ in batches))
+
+    digest = tag.digest
+    if digest is not None and digest.fingerprint == fingerprint:
+        return digest, len(batches), 0
+
+    app = current_app._get_current_object()
+    workers = app.config.get('DIGEST_PARALLELISM', 4)
+    known = json.loads(digest.batches) if digest is not None else {}
+
+    missing = [(batch_fingerprint, members) for batch_fingerprint, members in batches
+               if batch_fingerprint not in known]
+    if missing:
+        results = _merge_all(app, tag.name, [[(n.title, n.summary) for n in members] for _, members in missing],
+                             workers)
+        known.update({batch_fingerprint: result for (batch_fingerprint, _), result in zip(missing, results)})
+
+    # Merge batch results level by level until a single digest remains
+    parts = [(f'Part {i + 1}', known[batch_fingerprint]) for i, (batch_fingerprint, _) in enumerate(batches)]
+    while len(parts) > 1:
+        groups = [parts[i:i + BATCH_MAX_NOTES] for i in range(0, len(parts), BATCH_MAX_NOTES)]
+        parts = [(f'Part {i + 1}', text) for i, text in enumerate(_merge_all(app, tag.name, groups, workers))]
+
+    if digest is None:
+        digest = TagDigest(tag_id=tag.id)
+        db.session.add(digest)
+    digest.fingerprint = fingerprint
+    digest.content = parts[0][1]
+    digest.batches = json.dumps({batch_fingerprint: known[batch_fingerprint] for batch_fingerprint, _ in batches})
+    digest.note_count = len(notes)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request built this tag's first digest at the same time: keep theirs
+        db.session.rollback()
+        digest = db.session.get(TagDigest, tag.id)
+
+    return digest, len(batches), len(missing)
+
+
+def fallback_digest(tag, error):
+    """Extractive study guide for the tag's notes, for when the LLM is unavailable; not stored"""
+    return digest_fallback([(note.title, note.summary) for note in member_notes(tag.id)], error)
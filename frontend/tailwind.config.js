@@ -0,0 +1,13 @@
+// Used by build_assets.py. The theme lives in theme.json so the CDN
+// fallback in templates/index.html renders exactly the same config.
+const path = require('path');
+
+module.exports = {
+    ...require('./theme.json'),
+    content: [
+        path.join(__dirname, '../templates/**/*.html'),
+        path.join(__dirname, '../static/js/**/*.js'),
+        // Summary markup is rendered server-side
+        path.join(__dirname, '../rendering.py'),
+    ],
+};
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Front-end Benchmark for NoteMaster AI
+Loads the page in headless Chromium with the CDN assets (the Tailwind
+runtime compiler, lucide@latest and Google Fonts) and with the build from
+build_assets.py, and reports first contentful paint and time to
+interactive for each, cold cache, median of --runs loads.
+
+    pip install playwright && python -m playwright install chromium
+    python build_assets.py
+    python frontend_benchmark.py
+    python frontend_benchmark.py --runs 10 --network slow-4g
+
+Time to interactive is approximated as the latest of DOMContentLoaded,
+the icons being rendered and the end of the last long task (>50 ms main
+thread work) once the network is idle. The CDN run needs internet access.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+
+# Chrome DevTools network profiles: (latency ms, download/upload bytes per second)
+NETWORKS = {
+    'none': None,
+    'fast-4g': (60, 9 * 1024 * 1024 // 8, 1.5 * 1024 * 1024 // 8),
+    'slow-4g': (150, 1.6 * 1024 * 1024 // 8, 750 * 1024 // 8),
+    '3g': (300, 700 * 1024 // 8, 700 * 1024 // 8),
+}
+
+# Registered before any page script runs: long tasks are only reported to
+# observers that already exist, and icons may render before the first poll
+LONGTASK_OBSERVER = """
+window.__longtasks = [];
+new PerformanceObserver(function (list) {
+  list.getEntries().forEach(function (entry) { window.__longtasks.push(entry.startTime + entry.duration); });
+}).observe({type: 'longtask', buffered: true});
+new MutationObserver(function (_, observer) {
+  if (document.querySelector('svg.lucide')) {
+    window.__iconsReady = performance.now();
+    observer.disconnect();
+  }
+}).observe(document, {childList: true, subtree: true});
+"""
+
+MEASURE = """() => {
+  const nav = performance.getEntriesByType('navigation')[0];
+  const fcp = performance.getEntriesByName('first-contentful-paint')[0];
+  const lastLongTask = Math.max(0, ...window.__longtasks);
+  return {
+    fcp: fcp ? fcp.startTime : null,
+    dcl: nav.domContentLoadedEventEnd,
+    load: nav.loadEventEnd,
+    icons: window.__iconsReady,
+    tti: Math.max(nav.domContentLoadedEventEnd, window.__iconsReady, lastLongTask),
+    bytes: performance.getEntriesByType('resource').reduce((sum, r) => sum + (r.transferSize || 0), nav.transferSize || 0),
+    hosts: new Set(performance.getEntriesByType('resource').map(r => new URL(r.name).host)).size
+  };
+}"""
+
+
+def serve(use_build):
+    """Start the app on a free local port in a background thread; returns its URL"""
+    from werkzeug.serving import make_server
+    from config import Config
+    from app import create_app
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        ASSETS_USE_BUILD = use_build
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = make_server('127.0.0.1', port, create_app(BenchConfig), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{port}/', server
+
+
+def measure(browser, url, network, runs):
+    results = []
+    for _ in range(runs):
+        context = browser.new_context()  # fresh context: nothing cached
+        page = context.new_page()
+        page.add_init_script(LONGTASK_OBSERVER)
+        if network:
+            latency, download, upload = network
+            cdp = context.new_cdp_session(page)
+            cdp.send('Network.enable')
+            cdp.send('Network.emulateNetworkConditions', {
+                'offline': False, 'latency': latency,
+                'downloadThroughput': download, 'uploadThroughput': upload
+            })
+        page.goto(url, wait_until='domcontentloaded')
+        page.wait_for_function("document.querySelector('svg.lucide') !== null", timeout=60000)
+        page.wait_for_load_state('networkidle')
+        page.wait_for_timeout(500)  # let trailing long tasks report
+        results.append(page.evaluate(MEASURE))
+        context.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare first paint and time to interactive, CDN vs built assets')
+    parser.add_argument('--runs', type=int, default=5, help='cold-cache page loads per variant')
+    parser.add_argument('--network', choices=sorted(NETWORKS), default='none', help='emulated network profile')
+    parser.add_argument('--only', choices=('cdn', 'build'), help='measure a single variant')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, root)
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        sys.exit('playwright not found: run `pip install playwright && python -m playwright install chromium`')
+
+    variants = [('cdn', False), ('build', True)]
+    if args.only:
+        variants = [variant for variant in variants if variant[0] == args.only]
+    if any(use_build for _, use_build in variants) and \
+            not os.path.exists(os.path.join(root, 'static', 'dist', 'manifest.json')):
+        sys.exit('No build found: run `python build_assets.py` first')
+
+    summary = {}
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch()
+        for label, use_build in variants:
+            url, server = serve(use_build)
+            rows = measure(browser, url, NETWORKS[args.network], args.runs)
+            server.shutdown()
+            summary[label] = {key: statistics.median(row[key] for row in rows if row[key] is not None)
+                              for key in ('fcp', 'dcl', 'tti', 'bytes', 'hosts')}
+        browser.close()
+
+    print(f"Median of {args.runs} cold loads, network: {args.network}")
+    print(f"{'variant':<8} {'FCP ms':>8} {'DCL ms':>8} {'TTI ms':>8} {'KB moved':>9} {'hosts':>6}")
+    for label, row in summary.items():
+        print(f"{label:<8} {row['fcp']:>8.0f} {row['dcl']:>8.0f} {row['tti']:>8.0f} "
+              f"{row['bytes'] / 1024:>9.0f} {row['hosts']:>6.0f}")
+    if len(summary) == 2:
+        before, after = summary['cdn']['tti'], summary['build']['tti']
+        print(f"TTI: {before:.0f} ms -> {after:.0f} ms ({(1 - after / before) * 100:.0f}% lower)")
+
+
+if __name__ == '__main__':
+    main()
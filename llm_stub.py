@@ -0,0 +1,119 @@
+"""
+Local stand-in for the Gemini model, selected with LLM_BACKEND=stub.
+Used by the benchmarks and for running the app without an API key: it
+sleeps for a configurable latency and returns a canned, prompt-derived reply.
+
+It also mirrors Gemini's cached-content facility closely enough for
+context_cache.py: a prefix registered with create_cached_content() is
+prepended to every prompt sent through with_cached_content(), and only the
+uncached words add prefill latency.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+import uuid
+
+# Marker lines of a batched section prompt (utils.build_sections_prompt)
+_SECTION_MARKER = re.compile(r'^\[\[SECTION (\d+)\]\]$', re.MULTILINE)
+
+# name: (prefix, expires_at)
+_cached_contents = {}
+_cached_lock = threading.Lock()
+
+
+def create_cached_content(prefix, ttl):
+    name = f'cachedContents/stub-{uuid.uuid4().hex}'
+    with _cached_lock:
+        _cached_contents[name] = (prefix, time.time() + ttl)
+    return name
+
+
+def extend_cached_content(name, ttl):
+    with _cached_lock:
+        if name in _cached_contents:
+            _cached_contents[name] = (_cached_contents[name][0], time.time() + ttl)
+
+
+def delete_cached_content(name):
+    with _cached_lock:
+        _cached_contents.pop(name, None)
+
+
+def _cached_prefix(name):
+    with _cached_lock:
+        prefix, expires_at = _cached_contents.get(name, (None, 0))
+    if expires_at <= time.time():
+        raise Exception(f"404 CachedContent not found: {name}")
+    return prefix
+
+
+class StubResponse:
+    """Mimics the `.text` attribute of a Gemini response"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Drop-in replacement for genai.GenerativeModel"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, slow_rate=0.0, slow_factor=10.0, prefill_per_1k=0.0,
+                 cached_content=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.prefill_per_1k = prefill_per_1k
+        self.cached_content = cached_content
+
+    def with_cached_content(self, name):
+        """Same model, with the prefix registered under `name` in front of every prompt"""
+        return StubModel(self.latency, self.error_rate, self.slow_rate, self.slow_factor, self.prefill_per_1k, name)
+
+    def _delay(self, prompt):
+        """Latency for one call; a `slow_rate` share of calls are `slow_factor` times slower
+
+        Uncached prompt words add `prefill_per_1k` seconds per thousand.
+        """
+        latency = self.latency + self.prefill_per_1k * len(prompt.split()) / 1000
+        if random.random() < self.slow_rate:
+            return latency * self.slow_factor
+        return latency
+
+    def _full_prompt(self, prompt):
+        if self.cached_content is None:
+            return prompt
+        return _cached_prefix(self.cached_content) + prompt
+
+    def _maybe_fail(self):
+        if random.random() < self.error_rate:
+            raise Exception("500 Stub upstream error")
+
+    @staticmethod
+    def _reply(prompt):
+        sections = _SECTION_MARKER.findall(prompt)
+        if sections:
+            return StubResponse('\n'.join(
+                f"[[SECTION {number}]]\n<h3>Section {number}</h3>\n• Stub summary of section {number}."
+                for number in sections
+            ))
+        words = prompt.split()
+        return StubResponse(
+            f"<h3>Summary</h3>\n• Stub reply to a {len(words)}-word prompt.\n"
+            f"• Last words: {' '.join(words[-8:])}"
+        )
+
+    def generate_content(self, prompt):
+        full_prompt = self._full_prompt(prompt)
+        time.sleep(self._delay(prompt))
+        self._maybe_fail()
+        return self._reply(full_prompt)
+
+    async def generate_content_async(self, prompt):
+        full_prompt = self._full_prompt(prompt)
+        await asyncio.sleep(self._delay(prompt))
+        self._maybe_fail()
+        return self._reply(full_prompt)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Load Test for NoteMaster AI
+Hammers a running server with concurrent GET requests and reports
+throughput and latency. With --compare it boots the Flask dev server and
+the gunicorn production server (serve.py) on a scratch database and runs
+the same load against both.
+
+    python load_test.py --url http://127.0.0.1:8000 --concurrency 32
+    python load_test.py --compare --duration 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PATHS = ['/api/notes', '/api/tags', '/api/notes/1']
+
+
+def run_load(base_url, paths, concurrency, duration):
+    """Issue requests from `concurrency` threads for `duration` seconds"""
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        latencies, errors = [], 0
+        i = index
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base_url + path, timeout=30) as response:
+                    response.read()
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    errors = sum(err for _, err in results)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / duration,
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+    }
+
+
+def print_result(label, result):
+    print(f"  {label:<12} {result['rps']:>9.1f} req/s   "
+          f"p50 {result['p50_ms']:>7.1f} ms   p95 {result['p95_ms']:>7.1f} ms   "
+          f"p99 {result['p99_ms']:>7.1f} ms   errors {result['errors']}")
+
+
+def wait_for(url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def seed_database(env, notes=50):
+    """Create a handful of notes so the read endpoints have work to do"""
+    script = (
+        "from app import create_app\n"
+        "from models import db, Note, Tag\n"
+        "app = create_app()\n"
+        "with app.app_context():\n"
+        "    tag = Tag(name='Load test')\n"
+        "    db.session.add(tag)\n"
+        f"    for i in range({notes}):\n"
+        "        note = Note(title=f'Note {i}', original_content='lorem ipsum ' * 400, summary='• point ' * 100)\n"
+        "        note.tags.append(tag)\n"
+        "        db.session.add(note)\n"
+        "    db.session.commit()\n"
+    )
+    subprocess.run([sys.executable, '-c', script], env=env, check=True)
+
+
+def compare(args):
+    workdir = tempfile.mkdtemp(prefix='notemaster-load-')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'load.db')}")
+    seed_database(env)
+
+    servers = {
+        'dev server': [sys.executable, '-c',
+                       "from app import create_app; create_app().run(host='127.0.0.1', port=5055)"],
+        'gunicorn': [sys.executable, 'serve.py', '--bind', '127.0.0.1:5056'],
+    }
+    ports = {'dev server': 5055, 'gunicorn': 5056}
+
+    print(f"\nConcurrency {args.concurrency}, {args.duration}s per server\n")
+    for label, command in servers.items():
+        base_url = f"http://127.0.0.1:{ports[label]}"
+        process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for(base_url + '/api/tags'):
+                print(f"  {label:<12} failed to start")
+                continue
+            print_result(label, run_load(base_url, DEFAULT_PATHS, args.concurrency, args.duration))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test NoteMaster AI read endpoints')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='server to test')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--compare', action='store_true', help='benchmark dev server vs gunicorn')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📈 NoteMaster AI - Load Test")
+    print("=" * 60)
+
+    if args.compare:
+        compare(args)
+    else:
+        print(f"\n{args.url} - concurrency {args.concurrency}, {args.duration}s\n")
+        print_result('server', run_load(args.url, DEFAULT_PATHS, args.concurrency, args.duration))
+
+    print("\n" + "=" * 60)
+
+
+if __name__ == '__main__':
+    main()
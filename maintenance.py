@@ -0,0 +1,299 @@
+"""
+Database maintenance jobs: online backup, compaction and chat retention.
+
+Run them on demand with `python maintenance.py backup|vacuum|retention|all`,
+or set MAINTENANCE_INTERVAL_HOURS to run all three periodically in the
+background (once per interval across all worker processes, guarded by a
+lock file and the recorded time of the last run). Every job
+returns a report with its runtime and the bytes it reclaimed or wrote.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, select, text
+
+from models import db, ChatArchive, ChatMessage
+from workspaces import workspaces, activate, current_engine, current_workspace
+
+
+def _sqlite_path():
+    """Path of the current workspace's SQLite file, or None for other engines and in-memory databases"""
+    url = current_engine().url
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    return url.database
+
+
+def _report(job, started, **fields):
+    return {'job': job, 'runtime_seconds': round(time.monotonic() - started, 3), **fields}
+
+
+def backup(app, dest_dir=None, keep=None, pages=None):
+    """Copy the live database with SQLite's backup API, a few pages per step
+
+    Each step holds the read lock only briefly, so writers keep going while the
+    copy runs. The copy is written under a temporary name and renamed when
+    complete; the oldest backups beyond `keep` are removed.
+    """
+    started = time.monotonic()
+    source_path = _sqlite_path()
+    if source_path is None:
+        return _report('backup', started, skipped='not a SQLite file database')
+
+    dest_dir = dest_dir or app.config.get('MAINTENANCE_BACKUP_DIR') or os.path.join(app.instance_path, 'backups')
+    if current_workspace():
+        # Each workspace keeps its own `keep` newest copies
+        dest_dir = os.path.join(dest_dir, 'workspaces', current_workspace())
+    keep = keep if keep is not None else app.config.get('MAINTENANCE_BACKUP_KEEP', 7)
+    pages = pages or app.config.get('MAINTENANCE_BACKUP_PAGES', 256)
+    os.makedirs(dest_dir, exist_ok=True)
+
+    name = f"notemaster-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.db"
+    target = os.path.join(dest_dir, name)
+    partial = target + '.partial'
+
+    source = sqlite3.connect(source_path)
+    destination = sqlite3.connect(partial)
+    try:
+        source.backup(destination, pages=pages, sleep=0.005)
+    finally:
+        destination.close()
+        source.close()
+    os.replace(partial, target)
+
+    backups = sorted(f for f in os.listdir(dest_dir) if f.startswith('notemaster-') and f.endswith('.db'))
+    removed = backups[:-keep] if keep > 0 else []
+    for old in removed:
+        os.remove(os.path.join(dest_dir, old))
+
+    return _report('backup', started, path=target, bytes_written=os.path.getsize(target),
+                   reclaimed_bytes=0, removed_backups=removed)
+
+
+def vacuum(app, max_pages=None):
+    """Return free pages to the filesystem
+
+    Databases created before this job existed use auto_vacuum=NONE; the first
+    run switches them to INCREMENTAL, which needs one full VACUUM. After that
+    each run is a cheap `PRAGMA incremental_vacuum` of at most max_pages pages
+    (0 means all free pages).
+    """
+    started = time.monotonic()
+    path = _sqlite_path()
+    if path is None:
+        return _report('vacuum', started, skipped='not a SQLite file database')
+
+    max_pages = max_pages if max_pages is not None else app.config.get('MAINTENANCE_VACUUM_PAGES', 0)
+    size_before = os.path.getsize(path)
+
+    with current_engine().connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        page_size = conn.execute(text('PRAGMA page_size')).scalar()
+        free_before = conn.execute(text('PRAGMA freelist_count')).scalar()
+
+        if conn.execute(text('PRAGMA auto_vacuum')).scalar() != 2:
+            mode = 'full'
+            conn.execute(text('PRAGMA auto_vacuum = INCREMENTAL'))
+            conn.execute(text('VACUUM'))
+        else:
+            mode = 'incremental'
+            conn.execute(text(f'PRAGMA incremental_vacuum({int(max_pages)})'))
+
+        free_after = conn.execute(text('PRAGMA freelist_count')).scalar()
+        conn.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+
+    return _report('vacuum', started, mode=mode, free_pages_before=free_before, free_pages_after=free_after,
+                   reclaimed_bytes=max(size_before - os.path.getsize(path), (free_before - free_after) * page_size))
+
+
+def archive_chat(app, days=None, batch_notes=100):
+    """Move chat messages older than `days` into ChatArchive, compressed per note
+
+    Disabled when CHAT_RETENTION_DAYS is 0. reclaimed_bytes is the size of the
+    archived message text minus the size of the compressed archive rows.
+    """
+    from cache import cache, mark_for_invalidation
+
+    started = time.monotonic()
+    days = days if days is not None else app.config.get('CHAT_RETENTION_DAYS', 0)
+    if not days:
+        return _report('retention', started, skipped='CHAT_RETENTION_DAYS is 0')
+
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    note_ids = db.session.scalars(
+        select(ChatMessage.note_id).where(ChatMessage.created_at < cutoff).group_by(ChatMessage.note_id)
+    ).all()
+
+    archived = raw_bytes = stored_bytes = 0
+    for offset in range(0, len(note_ids), batch_notes):
+        batch = note_ids[offset:offset + batch_notes]
+        for note_id in batch:
+            messages = (ChatMessage.query
+                        .filter(ChatMessage.note_id == note_id, ChatMessage.created_at < cutoff)
+                        .order_by(ChatMessage.created_at, ChatMessage.id).all())
+            raw = json.dumps([msg.to_dict() for msg in messages]).encode()
+            payload = zlib.compress(raw, 9)
+            db.session.add(ChatArchive(
+                note_id=note_id,
+                message_count=len(messages),
+                first_message_at=messages[0].created_at,
+                last_message_at=messages[-1].created_at,
+                payload=payload
+            ))
+            db.session.execute(delete(ChatMessage).where(ChatMessage.id.in_([msg.id for msg in messages])))
+            archived += len(messages)
+            raw_bytes += sum(len(msg.content.encode()) for msg in messages)
+            stored_bytes += len(payload)
+
+        mark_for_invalidation(db.session, [cache.note_key(note_id) for note_id in batch])
+        db.session.commit()
+        db.session.expunge_all()
+
+    return _report('retention', started, cutoff=cutoff.isoformat(), notes=len(note_ids),
+                   archived_messages=archived, reclaimed_bytes=max(raw_bytes - stored_bytes, 0))
+
+
+JOBS = {'retention': archive_chat, 'vacuum': vacuum, 'backup': backup}
+
+
+def run_jobs(app, names=('retention', 'vacuum', 'backup'), workspace_names=None):
+    """Run the named jobs in order (retention first so vacuum can reclaim what it freed)
+
+    Jobs run on the default database and then on every workspace database,
+    or only on `workspace_names` when given (None in it is the default database).
+    """
+    if workspace_names is None:
+        workspace_names = [None] + (workspaces.names() if workspaces.enabled else [])
+
+    reports = []
+    for workspace in workspace_names:
+        with app.app_context(), activate(workspace):
+            for name in names:
+                try:
+                    report = JOBS[name](app)
+                except Exception as e:
+                    app.logger.error(f"Maintenance job {name} failed: {e}")
+                    db.session.rollback()
+                    report = {'job': name, 'error': str(e)}
+                if workspace:
+                    report['workspace'] = workspace
+                reports.append(report)
+    return reports
+
+
+class MaintenanceScheduler:
+    """Runs every job once per interval, in whichever serving process gets there first
+
+    The thread starts with the first request a process handles, so it runs in
+    gunicorn workers and never in a preloading master. Workers share a lock
+    file and the last run's time and reports (maintenance.json), so a
+    recycled or newly started worker neither skips nor repeats a run.
+    """
+
+    CHECK_SECONDS = 600  # how often each worker looks at the last run time
+
+    def __init__(self):
+        self.last_run = None
+        self.reports = []
+        self.interval = 0
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['maintenance'] = self
+        self.interval = app.config.get('MAINTENANCE_INTERVAL_HOURS', 0) * 3600
+        self.lock_path = os.path.join(app.instance_path, 'maintenance.lock')
+        self.state_path = os.path.join(app.instance_path, 'maintenance.json')
+        if self.interval and not app.testing:
+            app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # A forked child inherits _pid but not the thread
+                app = current_app._get_current_object()
+                self._thread = threading.Thread(target=self._loop, args=(app,), daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _loop(self, app):
+        os.makedirs(app.instance_path, exist_ok=True)
+        while True:
+            try:
+                self._run_if_due(app)
+            except Exception as e:
+                app.logger.error(f"Maintenance scheduler failed: {e}")
+            time.sleep(min(self.interval, self.CHECK_SECONDS))
+
+    def _read_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _run_if_due(self, app):
+        with open(self.lock_path, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # another worker is running the jobs
+            last_run = self._read_state().get('last_run')
+            if last_run is not None and time.time() - last_run < self.interval:
+                return
+
+            self.reports = run_jobs(app)
+            self.last_run = time.time()
+            for report in self.reports:
+                app.logger.info(f"Maintenance: {report}")
+
+            temporary = self.state_path + '.tmp'
+            with open(temporary, 'w') as f:
+                json.dump({'last_run': self.last_run, 'reports': self.reports}, f, default=str)
+            os.replace(temporary, self.state_path)
+
+    def stats(self):
+        state = self._read_state() if self.interval else {}
+        return {'last_run': state.get('last_run', self.last_run), 'reports': state.get('reports', self.reports)}
+
+
+maintenance = MaintenanceScheduler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run NoteMaster AI database maintenance')
+    parser.add_argument('job', choices=sorted(JOBS) + ['all'])
+    parser.add_argument('--days', type=int, help='retention: archive chat older than this many days')
+    parser.add_argument('--dest', help='backup: directory to write the backup to')
+    parser.add_argument('--workspace', action='append', help='only this workspace (repeatable; "default" is the shared database)')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    if args.days is not None:
+        app.config['CHAT_RETENTION_DAYS'] = args.days
+    if args.dest:
+        app.config['MAINTENANCE_BACKUP_DIR'] = args.dest
+
+    names = ('retention', 'vacuum', 'backup') if args.job == 'all' else (args.job,)
+    workspace_names = None
+    if args.workspace:
+        workspace_names = [None if name == 'default' else name for name in args.workspace]
+    for report in run_jobs(app, names, workspace_names):
+        print(json.dumps(report, default=str))
+
+
+if __name__ == '__main__':
+    main()
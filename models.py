@@ -1,12 +1,29 @@
+import fcntl
+import json
+import os
+import zlib
 from datetime import datetime
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import validates
 
-db = SQLAlchemy()
+from rendering import render_summary, summary_preview
+from workspaces import WorkspaceSession
+
+# Sessions bind to the current workspace's database (workspaces.py)
+db = SQLAlchemy(session_options={'class_': WorkspaceSession})
+
+# Bump whenever a model gains a table or column so existing databases are
+# brought up to date on the next boot (see ensure_schema).
+SCHEMA_VERSION = 10
 
 # Association table for many-to-many relationship between notes and tags
 note_tags = db.Table('note_tags',
     db.Column('note_id', db.Integer, db.ForeignKey('note.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    # The primary key leads with note_id; tag-scoped lookups (digests, cross-note chat) need this one
+    db.Index('ix_note_tags_tag_id', 'tag_id', 'note_id')
 )
 
 
@@ -16,17 +33,34 @@ class Note(db.Model):
     title = db.Column(db.String(200), nullable=False)
     original_content = db.Column(db.Text, nullable=False)
     summary = db.Column(db.Text, nullable=False)
+    summary_html = db.Column(db.Text)  # sanitized rendering of summary, set whenever summary is
+    summary_preview = db.Column(db.String(200))  # plain-text opening for note cards
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    keywords = db.Column(db.Text)  # JSON {term: tf-idf weight} of top terms, set by autotag
+    llm_model = db.Column(db.String(64))  # model that last summarized the note
+    prompt_tokens = db.Column(db.Integer)  # summed over every summarization of the note
+    response_tokens = db.Column(db.Integer)
     
     # Relationships
     tags = db.relationship('Tag', secondary=note_tags, lazy='subquery',
                           backref=db.backref('notes', lazy=True))
     chat_messages = db.relationship('ChatMessage', backref='note', lazy=True, cascade='all, delete-orphan')
+    chat_archives = db.relationship('ChatArchive', lazy=True, cascade='all, delete-orphan')
+    sections = db.relationship('NoteSection', backref='note', lazy=True, cascade='all, delete-orphan',
+                               order_by='NoteSection.position')
+    passages = db.relationship('Passage', lazy=True, cascade='all, delete-orphan', order_by='Passage.position')
     
     def __repr__(self):
         return f'<Note {self.id}: {self.title}>'
     
+    @validates('summary')
+    def _render_summary(self, key, summary):
+        """Render the summary once here so reads serve the stored HTML and preview"""
+        self.summary_html = render_summary(summary)
+        self.summary_preview = summary_preview(self.summary_html)
+        return summary
+    
     def to_dict(self):
         """Convert note to dictionary for JSON serialization"""
         return {
@@ -34,6 +68,8 @@ class Note(db.Model):
             'title': self.title,
             'original_content': self.original_content,
             'summary': self.summary,
+            'summary_html': self.summary_html,
+            'summary_preview': self.summary_preview,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'tags': [tag.to_dict() for tag in self.tags]
@@ -47,6 +83,8 @@ class Tag(db.Model):
     color = db.Column(db.String(7), default='#667eea')  # Hex color code
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
+    digest = db.relationship('TagDigest', uselist=False, lazy=True, cascade='all, delete-orphan')
+    
     def __repr__(self):
         return f'<Tag {self.name}>'
     
@@ -59,13 +97,42 @@ class Tag(db.Model):
         }
 
 
+class TagDigest(db.Model):
+    """Cached study guide for a tag, rebuilt only when its notes change"""
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # hash of member note ids and updated_at
+    content = db.Column(db.Text, nullable=False)
+    batches = db.Column(db.Text, nullable=False)  # JSON {batch fingerprint: batch summary}
+    note_count = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<TagDigest {self.tag_id}>'
+    
+    def to_dict(self):
+        return {
+            'tag_id': self.tag_id,
+            'digest': self.content,
+            'note_count': self.note_count,
+            'updated_at': self.updated_at.isoformat()
+        }
+
+
 class ChatMessage(db.Model):
     """Model for storing chat conversations about notes"""
+    __table_args__ = (
+        # Serves history pages: WHERE note_id = ? ORDER BY created_at, id
+        db.Index('ix_chat_message_note_created', 'note_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    llm_model = db.Column(db.String(64))  # set on assistant messages
+    prompt_tokens = db.Column(db.Integer)
+    response_tokens = db.Column(db.Integer)
     
     def __repr__(self):
         return f'<ChatMessage {self.id}: {self.role}>'
@@ -79,3 +146,196 @@ class ChatMessage(db.Model):
             'content': self.content,
             'created_at': self.created_at.isoformat()
         }
+
+
+class ChatArchive(db.Model):
+    """Cold storage for expired chat messages: one compressed JSON batch per note per run"""
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False, index=True)
+    message_count = db.Column(db.Integer, nullable=False)
+    first_message_at = db.Column(db.DateTime, nullable=False)
+    last_message_at = db.Column(db.DateTime, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON list of ChatMessage.to_dict()
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ChatArchive {self.note_id}: {self.message_count} messages>'
+    
+    def messages(self):
+        """The archived messages as dictionaries, oldest first"""
+        return json.loads(zlib.decompress(self.payload))
+
+
+class Passage(db.Model):
+    """A few paragraphs of a note, the unit cross-note chat retrieves (see retrieval.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    
+    def __repr__(self):
+        return f'<Passage {self.note_id}#{self.position}>'
+
+
+class NoteSection(db.Model):
+    """One section of a note and its summary, reused when an edit leaves the section unchanged
+
+    summary stays empty until the note's first edit: new notes are summarized
+    whole, in one call.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    summary = db.Column(db.Text, nullable=False, default='')
+    
+    def __repr__(self):
+        return f'<NoteSection {self.note_id}#{self.position}>'
+
+
+class TermStat(db.Model):
+    """Corpus document frequency of a term, kept up to date as notes are saved"""
+    term = db.Column(db.String(64), primary_key=True)
+    doc_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TermStat {self.term}: {self.doc_count}>'
+
+
+def _add_missing_columns(engine):
+    """Add columns that exist on the models but not yet in the database"""
+    inspector = inspect(engine)
+    
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def _add_missing_indexes(engine):
+    """Create indexes declared on tables that already existed (create_all skips them)"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+# SQLite full-text index over passage.content, kept in sync by triggers so
+# every insert, update and cascade delete of a Passage row is reflected.
+PASSAGE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS passage_fts
+       USING fts5(content, content='passage', content_rowid='id', tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS passage_ai AFTER INSERT ON passage BEGIN
+       INSERT INTO passage_fts(rowid, content) VALUES (new.id, new.content); END""",
+    """CREATE TRIGGER IF NOT EXISTS passage_ad AFTER DELETE ON passage BEGIN
+       INSERT INTO passage_fts(passage_fts, rowid, content) VALUES ('delete', old.id, old.content); END""",
+    """CREATE TRIGGER IF NOT EXISTS passage_au AFTER UPDATE ON passage BEGIN
+       INSERT INTO passage_fts(passage_fts, rowid, content) VALUES ('delete', old.id, old.content);
+       INSERT INTO passage_fts(rowid, content) VALUES (new.id, new.content); END""",
+]
+
+
+def _render_missing_summaries(engine, batch_size=500):
+    """Fill summary_html/summary_preview for notes saved before they existed"""
+    note = Note.__table__
+    with engine.begin() as conn:
+        while True:
+            rows = conn.execute(
+                db.select(note.c.id, note.c.summary).where(note.c.summary_html.is_(None)).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            updates = []
+            for note_id, summary in rows:
+                rendered = render_summary(summary)
+                updates.append({'note_id': note_id, 'html': rendered, 'preview': summary_preview(rendered)})
+            conn.execute(
+                note.update().where(note.c.id == db.bindparam('note_id'))
+                # A backfill is not an edit: keep updated_at from firing its onupdate
+                .values(summary_html=db.bindparam('html'), summary_preview=db.bindparam('preview'),
+                        updated_at=note.c.updated_at),
+                updates
+            )
+
+
+def _index_missing_passages(engine, batch_size=500):
+    """Build passages for notes saved before cross-note chat existed"""
+    from retrieval import passage_source, split_passages
+    
+    note, passage = Note.__table__, Passage.__table__
+    last_id = 0
+    with engine.begin() as conn:
+        while True:
+            rows = conn.execute(
+                db.select(note.c.id, note.c.title, note.c.original_content)
+                .where(note.c.id > last_id, ~db.exists().where(passage.c.note_id == note.c.id))
+                .order_by(note.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            passages = [
+                {'note_id': note_id, 'position': position, 'content': content}
+                for note_id, title, original_content in rows
+                for position, content in enumerate(split_passages(passage_source(title, original_content)))
+            ]
+            if passages:
+                conn.execute(passage.insert(), passages)
+
+
+def _schema_lock_path(engine):
+    """Lock file that serializes upgrades of one database across processes"""
+    database = engine.url.database
+    if engine.dialect.name == 'sqlite' and database and database != ':memory:':
+        return f'{database}.schema.lock'
+    os.makedirs(current_app.instance_path, exist_ok=True)
+    return os.path.join(current_app.instance_path, 'schema.lock')
+
+
+def _schema_is_current(engine):
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.connect() as conn:
+        return conn.execute(text('PRAGMA user_version')).scalar() == SCHEMA_VERSION
+
+
+def ensure_schema(engine=None):
+    """Create or upgrade tables, skipping all work when the stored version is current
+
+    Runs against the default database unless another engine (a workspace's) is given.
+    Workers booting together upgrade one at a time: the first takes the lock
+    and migrates, the others wait and then find the version current.
+    """
+    engine = engine or db.engine
+    if _schema_is_current(engine):
+        return
+    
+    with open(_schema_lock_path(engine), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if _schema_is_current(engine):
+            return
+        _upgrade_schema(engine)
+
+
+def _upgrade_schema(engine):
+    is_sqlite = engine.dialect.name == 'sqlite'
+    
+    db.metadata.create_all(engine)
+    _add_missing_columns(engine)
+    _add_missing_indexes(engine)
+    _render_missing_summaries(engine)
+    
+    if is_sqlite:
+        with engine.begin() as conn:
+            for statement in PASSAGE_FTS_DDL:
+                conn.execute(text(statement))
+    
+    # After the FTS triggers exist, so the new passages are indexed too
+    _index_missing_passages(engine)
+    
+    if is_sqlite:
+        with engine.begin() as conn:
+            conn.execute(text(f'PRAGMA user_version = {SCHEMA_VERSION}'))
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Performance self-test for NoteMaster AI, run by `diagnose.py --perf` and
+`verify_setup.py --perf` (or directly).
+
+Seeds a temporary database with a synthetic corpus, then times the core
+requests through the app (note list, search, tag filter, chat history
+page), PDF text extraction on a generated PDF, and one LLM round trip
+(Gemini when GEMINI_API_KEY is set, otherwise the local stub). Prints a
+pass/fail report against latency budgets and exits non-zero on any
+failure, so it can gate a deploy.
+
+    python diagnose.py --perf
+    python verify_setup.py --perf --notes 5000 --budget list=800 --budget search=400
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Latency budgets in milliseconds (p95 for queries, per page for PDF extraction)
+PERF_BUDGETS = {
+    'list': 500,
+    'search': 300,
+    'tag_filter': 300,
+    'chat_load': 50,
+    'pdf_page': 50,
+    'llm': 10000,
+}
+
+WORDS = ('cell membrane protein enzyme photosynthesis mitochondria respiration glucose energy '
+         'chloroplast nucleus ribosome transcription translation gene allele mutation evolution '
+         'selection population ecosystem cycle carbon nitrogen water osmosis diffusion gradient '
+         'market demand supply elasticity inflation interest capital labour contract tort statute').split()
+
+
+def synthetic_text(words):
+    sentences = []
+    while words > 0:
+        length = min(words, random.randint(8, 20))
+        sentences.append(' '.join(random.choices(WORDS, k=length)).capitalize() + '.')
+        words -= length
+    return ' '.join(sentences)
+
+
+def seed_corpus(notes, tags, chat_notes, messages):
+    """Insert the synthetic notes, tags and chat history; returns (tag ids, chat note ids)"""
+    from models import db, Note, Tag, ChatMessage
+
+    tag_rows = [Tag(name=f'Perf tag {i}', color='#667eea') for i in range(tags)]
+    db.session.add_all(tag_rows)
+    db.session.flush()
+
+    started = datetime.utcnow() - timedelta(days=notes)
+    for i in range(notes):
+        content = synthetic_text(random.randint(150, 600))
+        note = Note(
+            title=content[:50],
+            original_content=content,
+            summary='<h3>Key Points</h3>\n' + '\n'.join(f'• {synthetic_text(15)}' for _ in range(5)),
+            created_at=started + timedelta(days=i)
+        )
+        note.tags = random.sample(tag_rows, k=min(len(tag_rows), random.randint(1, 3)))
+        db.session.add(note)
+        if i % 500 == 499:
+            db.session.flush()
+    db.session.commit()
+
+    note_ids = [row[0] for row in db.session.query(Note.id).order_by(Note.id).limit(chat_notes)]
+    rows = []
+    for note_id in note_ids:
+        for j in range(messages):
+            rows.append({'note_id': note_id, 'role': 'user' if j % 2 == 0 else 'assistant',
+                         'content': synthetic_text(40), 'created_at': started + timedelta(minutes=j)})
+    if rows:
+        db.session.execute(ChatMessage.__table__.insert(), rows)
+    db.session.commit()
+    return [tag.id for tag in tag_rows], note_ids
+
+
+def build_pdf(pages, words_per_page=350):
+    """A minimal text PDF with the given number of pages, written by hand"""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    pages_id = len(objects) + 1
+    objects.append(None)  # Pages, filled in once the kids are known
+    kids = []
+    for _ in range(pages):
+        text = synthetic_text(words_per_page).split()
+        lines = [' '.join(text[i:i + 12]) for i in range(0, len(text), 12)]
+        stream = 'BT /F1 10 Tf 50 780 Td 12 TL\n' + '\n'.join(f'({line}) Tj T*' for line in lines) + '\nET'
+        content = add(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream.encode('latin-1')))
+        kids.append(add(b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R '
+                        b'/Resources << /Font << /F1 %d 0 R >> >> >>' % (pages_id, content, font)))
+    objects[pages_id - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids))
+    catalog = add(b'<< /Type /Catalog /Pages %d 0 R >>' % pages_id)
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def time_request(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    elapsed = (time.perf_counter() - started) * 1000
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {url} returned {response.status_code}')
+    return elapsed
+
+
+def parse_budgets(overrides):
+    budgets = dict(PERF_BUDGETS)
+    for override in overrides:
+        name, _, value = override.partition('=')
+        if name not in budgets or not value:
+            raise SystemExit(f"Unknown budget '{override}'; use one of: {', '.join(budgets)} as name=ms")
+        budgets[name] = float(value)
+    return budgets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time core queries, PDF extraction and the LLM against budgets')
+    parser.add_argument('--perf', action='store_true', help=argparse.SUPPRESS)  # passed through by the wrappers
+    parser.add_argument('--notes', type=int, default=1000, help='synthetic notes to seed')
+    parser.add_argument('--tags', type=int, default=12)
+    parser.add_argument('--chat-notes', type=int, default=20, help='notes that get chat history')
+    parser.add_argument('--messages', type=int, default=200, help='chat messages per chat note')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per query')
+    parser.add_argument('--pdf-pages', type=int, default=20)
+    parser.add_argument('--stub', action='store_true', help='use the local LLM stub even when a key is set')
+    parser.add_argument('--budget', action='append', default=[], metavar='NAME=MS',
+                        help=f"override a budget ({', '.join(f'{k}={v:g}' for k, v in PERF_BUDGETS.items())})")
+    args = parser.parse_args(argv)
+    budgets = parse_budgets(args.budget)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from config import Config
+    from app import create_app
+    from utils import extract_text_from_pdf, _require_model
+
+    workdir = tempfile.mkdtemp(prefix='notemaster-perf-')
+    use_gemini = bool(Config.GEMINI_API_KEY) and not args.stub
+
+    class PerfConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'perf.db')
+        TESTING = True
+        CACHE_ENABLED = False  # time the queries, not the response cache
+        COMPRESS_ENABLED = False
+        AUTOTAG_ENABLED = False
+        LLM_BACKEND = 'gemini' if use_gemini else 'stub'
+
+    print("=" * 60)
+    print("⏱️  NoteMaster AI - Performance Self-Test")
+    print("=" * 60)
+
+    random.seed(42)
+    app = create_app(PerfConfig)
+    results = []  # (name, measured ms, detail)
+
+    with app.app_context():
+        started = time.perf_counter()
+        tag_ids, chat_note_ids = seed_corpus(args.notes, args.tags, args.chat_notes, args.messages)
+        print(f"\n🌱 Seeded {args.notes:,} notes, {args.tags} tags and "
+              f"{len(chat_note_ids) * args.messages:,} chat messages in {time.perf_counter() - started:.1f} s")
+
+        client = app.test_client()
+        queries = {
+            'list': lambda: '/api/notes',
+            'search': lambda: f'/api/notes?search={random.choice(WORDS)}',
+            'tag_filter': lambda: f'/api/notes?tag_id={random.choice(tag_ids)}',
+            'chat_load': lambda: f'/api/notes/{random.choice(chat_note_ids)}/chat',
+        }
+        print(f"\n🔎 Queries ({args.repeat} runs each, ms):")
+        for name, url in queries.items():
+            client.get(url())  # warm up
+            timings = [time_request(client, url()) for _ in range(args.repeat)]
+            p50, p95 = percentile(timings, 0.5), percentile(timings, 0.95)
+            print(f"  {name:<12} p50 {p50:>8.1f}   p95 {p95:>8.1f}")
+            results.append((name, p95, 'p95'))
+
+        pdf_path = os.path.join(workdir, 'perf.pdf')
+        with open(pdf_path, 'wb') as f:
+            f.write(build_pdf(args.pdf_pages))
+        started = time.perf_counter()
+        text = extract_text_from_pdf(pdf_path)
+        elapsed = time.perf_counter() - started
+        size_mb = os.path.getsize(pdf_path) / (1024 * 1024)
+        print(f"\n📄 PDF extraction: {args.pdf_pages} pages, {len(text):,} characters in {elapsed * 1000:.0f} ms "
+              f"({args.pdf_pages / elapsed:.1f} pages/s, {size_mb / elapsed:.2f} MB/s)")
+        results.append(('pdf_page', elapsed * 1000 / args.pdf_pages, 'per page'))
+
+        backend = 'Gemini' if use_gemini else 'local stub'
+        try:
+            model = _require_model()
+            started = time.perf_counter()
+            model.generate_content('Reply with the single word OK.')
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"\n🤖 LLM round trip via {backend}: {elapsed:.0f} ms")
+            results.append(('llm', elapsed, backend))
+        except Exception as e:
+            print(f"\n🤖 LLM round trip via {backend} failed: {e}")
+            results.append(('llm', float('inf'), 'failed'))
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    failures = []
+    print("\n" + "=" * 60)
+    print(f"{'check':<12} {'measured ms':>12} {'budget ms':>10}")
+    for name, measured, detail in results:
+        ok = measured <= budgets[name]
+        print(f"{'✅' if ok else '❌'} {name:<10} {measured:>12.1f} {budgets[name]:>10g}   {detail}")
+        if not ok:
+            failures.append(name)
+    print("=" * 60)
+
+    if failures:
+        print(f"❌ Over budget: {', '.join(failures)}")
+        return 1
+    print("✅ All checks within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Opt-in per-request profiling.
+
+Disabled by default; with PROFILING_ENABLED off no hooks are registered,
+so requests pay nothing. When enabled, a request is profiled if it sends
+an `X-Profile: 1` header together with the PROFILING_ADMIN_TOKEN as
+`X-Admin-Token`, or is picked by PROFILING_SAMPLE_RATE. Results
+are kept in a per-process ring buffer and served from /admin/profiles,
+including collapsed stacks that flamegraph.pl and speedscope read directly.
+Without a PROFILING_ADMIN_TOKEN, both the header and the admin endpoints
+are refused.
+"""
+
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from flask import Blueprint, current_app, g, jsonify, request, abort
+
+admin = Blueprint('profiling_admin', __name__, url_prefix='/admin/profiles')
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _label(frame):
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+class RequestProfiler:
+    """Wraps selected requests in a sampling or cProfile profiler"""
+
+    def __init__(self, app=None):
+        self.profiles = deque(maxlen=50)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('PROFILING_ENABLED', False):
+            return
+
+        self.mode = app.config.get('PROFILING_MODE', 'sample')
+        self.sample_rate = app.config.get('PROFILING_SAMPLE_RATE', 0.0)
+        self.interval = app.config.get('PROFILING_INTERVAL', 0.005)
+        self.profiles = deque(maxlen=app.config.get('PROFILING_MAX_PROFILES', 50))
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.register_blueprint(admin)
+        app.extensions['request_profiler'] = self
+
+    def _wanted(self):
+        if request.path.startswith(admin.url_prefix):
+            return False
+        if request.headers.get('X-Profile') == '1' and _has_admin_token():
+            # Never by address: behind a reverse proxy every client looks local
+            return True
+        return random.random() < self.sample_rate
+
+    def _start(self):
+        if not self._wanted():
+            return
+        g.profile_started = time.perf_counter()
+        if self.mode == 'cprofile':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+        else:
+            g.profiler = StackSampler(threading.get_ident(), self.interval)
+            g.profiler.start()
+
+    def _finish(self, response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+
+        duration_ms = (time.perf_counter() - g.pop('profile_started')) * 1000
+        record = {
+            'id': next(self._ids),
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'mode': self.mode,
+            'recorded_at': time.time()
+        }
+
+        if self.mode == 'cprofile':
+            profiler.disable()
+            output = io.StringIO()
+            stats = pstats.Stats(profiler, stream=output)
+            stats.sort_stats('cumulative').print_stats(40)
+            record['stats'] = output.getvalue()
+            record['collapsed'] = _collapse_cprofile(stats)
+        else:
+            record['collapsed'] = dict(profiler.stop())
+
+        with self._lock:
+            self.profiles.append(record)
+
+        response.headers['X-Profile-Id'] = str(record['id'])
+        return response
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((p for p in self.profiles if p['id'] == profile_id), None)
+
+
+def _collapse_cprofile(stats):
+    """Approximate collapsed stacks from cProfile's caller graph (one level of callers)"""
+    collapsed = {}
+    for (filename, line, name), (_, _, self_time, _, callers) in stats.stats.items():
+        label = f'{name} ({os.path.basename(filename)}:{line})'
+        if not callers:
+            collapsed[label] = collapsed.get(label, 0) + int(self_time * 1e6)
+        for (c_file, c_line, c_name), caller_stats in callers.items():
+            stack = f'{c_name} ({os.path.basename(c_file)}:{c_line});{label}'
+            collapsed[stack] = collapsed.get(stack, 0) + int(caller_stats[2] * 1e6)
+    return {stack: micros for stack, micros in collapsed.items() if micros}
+
+
+def _has_admin_token():
+    """Whether the request carries the configured PROFILING_ADMIN_TOKEN"""
+    token = current_app.config.get('PROFILING_ADMIN_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode())
+
+
+@admin.before_request
+def _require_admin():
+    # No token, no access: behind a reverse proxy every request looks local
+    if not _has_admin_token():
+        abort(403)
+
+
+@admin.route('', methods=['GET'])
+def list_profiles():
+    """Recorded profiles, newest first, without their stack data"""
+    profiler = current_app.extensions['request_profiler']
+    with profiler._lock:
+        records = list(profiler.profiles)
+    return jsonify({
+        'profiles': [
+            {key: value for key, value in record.items() if key not in ('collapsed', 'stats')}
+            for record in reversed(records)
+        ]
+    }), 200
+
+
+@admin.route('/<int:profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    record = current_app.extensions['request_profiler'].get(profile_id)
+    if record is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify(record), 200
+
+
+@admin.route('/<int:profile_id>/flamegraph', methods=['GET'])
+def profile_flamegraph(profile_id):
+    """Collapsed stacks ("frame;frame;frame count" per line) for flamegraph tools"""
+    record = current_app.extensions['request_profiler'].get(profile_id)
+    if record is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    lines = [f'{stack} {count}' for stack, count in sorted(record['collapsed'].items())]
+    return current_app.response_class('\n'.join(lines) + '\n', mimetype='text/plain'), 200
+
+
+profiler = RequestProfiler()
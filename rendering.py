@@ -0,0 +1,96 @@
+"""
+Summary rendering, done once when a summary is written.
+
+Gemini returns a mix of the HTML the prompt asks for (<h3>, <strong>,
+• bullets) and markdown it falls back to (#, **, *, - bullets).
+render_summary() makes one pass over each line, emitting whitelisted
+markup and escaping everything else, so the stored HTML is safe to insert
+as-is and underscores or asterisks that are just text survive intact.
+"""
+
+import html
+import re
+
+PREVIEW_CHARS = 100
+
+_HEADING_TAG = re.compile(r'^<h([1-6])[^>]*>(.*?)</h\1>$', re.I)
+_HEADING_MD = re.compile(r'^(#{1,6})\s+(.*)$')
+_LIST_ITEM = re.compile(r'^<li[^>]*>(.*?)(?:</li>)?$', re.I)
+_BULLET = re.compile(r'^(?:•|[-*](?=\s))\s*(.*)$')
+_WRAPPER = re.compile(r'^</?(?:ul|ol|p|div)[^>]*>|</?(?:ul|ol|p|div)>$', re.I)
+
+_INLINE = re.compile(r"""
+      (?P<tag></?(?:strong|em|b|i|u|code)\s*>)
+    | (?P<br><br\s*/?>)
+    | (?P<entity>&(?:\#\d{1,7}|\#x[0-9a-f]{1,6}|[a-z][a-z0-9]{1,31});)
+    | \*\*(?P<bold>[^*\n]+?)\*\*
+    | (?<![\w*])\*(?P<em>[^*\s](?:[^*\n]*?[^*\s])?)\*(?![\w*])
+""", re.X | re.I)
+
+_TAG_NAMES = {'b': 'strong', 'i': 'em'}
+
+
+def render_inline(text):
+    """Escape a line of text, keeping allowed inline tags, entities and markdown emphasis"""
+    out, open_tags, position = [], [], 0
+
+    for match in _INLINE.finditer(text):
+        out.append(html.escape(text[position:match.start()], quote=False))
+        position = match.end()
+
+        if match.group('tag'):
+            raw = match.group('tag').lower()
+            name = re.sub(r'[</>\s]', '', raw)
+            name = _TAG_NAMES.get(name, name)
+            if raw.startswith('</'):
+                if name in open_tags:
+                    # Close anything opened inside it too, so the markup stays balanced
+                    while open_tags:
+                        inner = open_tags.pop()
+                        out.append(f'</{inner}>')
+                        if inner == name:
+                            break
+            else:
+                open_tags.append(name)
+                out.append(f'<{name}>')
+        elif match.group('br'):
+            out.append('<br>')
+        elif match.group('entity'):
+            out.append(match.group('entity'))
+        elif match.group('bold') is not None:
+            out.append(f"<strong>{render_inline(match.group('bold'))}</strong>")
+        else:
+            out.append(f"<em>{render_inline(match.group('em'))}</em>")
+
+    out.append(html.escape(text[position:], quote=False))
+    out.extend(f'</{name}>' for name in reversed(open_tags))
+    return ''.join(out)
+
+
+def render_summary(text):
+    """Sanitized HTML for a summary, with the classes the note views expect"""
+    blocks = []
+    for line in (text or '').splitlines():
+        line = _WRAPPER.sub('', line.strip()).strip()
+        if not line:
+            continue
+
+        heading = _HEADING_TAG.match(line) or _HEADING_MD.match(line)
+        item = _LIST_ITEM.match(line) or _BULLET.match(line)
+        if heading:
+            level = int(heading.group(1)) if heading.group(1).isdigit() else len(heading.group(1))
+            blocks.append(f'<h{level} class="font-bold mt-4 mb-2">{render_inline(heading.group(2))}</h{level}>')
+        elif item:
+            blocks.append(f'<p class="ml-4 mb-2">• {render_inline(item.group(1).strip())}</p>')
+        else:
+            blocks.append(f'<p class="mb-2">{render_inline(line)}</p>')
+
+    return ''.join(blocks)
+
+
+def summary_preview(rendered, limit=PREVIEW_CHARS):
+    """Plain-text opening of a rendered summary for note cards"""
+    text = ' '.join(html.unescape(re.sub(r'<[^>]+>', ' ', rendered)).split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + '...'
@@ -0,0 +1,288 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from scheduler import LLMBusyError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(LLMBusyError):
+    """Raised without calling the model while the circuit breaker is open"""
+
+    status = 503
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after, 'The AI service is temporarily unavailable')
+
+
+class CircuitBreaker:
+    """Opens after a burst of upstream failures and probes again after a cooldown"""
+
+    def __init__(self, window, error_rate, min_calls, cooldown):
+        self.outcomes = deque(maxlen=window)
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go upstream
+
+        Returns True when this call is the half-open probe; the caller must
+        then reach record(), or release() the probe if it gives up first.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(max(1, round(remaining)))
+            # Cooldown over: let a single probe through
+            if self._probing:
+                raise CircuitOpenError(1)
+            self.state = HALF_OPEN
+            self._probing = True
+            return True
+
+    def release(self):
+        """Give up a probe that never reached the upstream call, so the next call can probe"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def record(self, success):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if success:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self.outcomes.append(success)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def stats(self):
+        with self._lock:
+            total = len(self.outcomes)
+            return {
+                'state': self.state,
+                'times_opened': self.times_opened,
+                'recent_error_rate': round(self.outcomes.count(False) / total, 3) if total else 0.0
+            }
+
+
+class HedgePolicy:
+    """Tracks latency for one endpoint and decides when a duplicate call is worth it"""
+
+    def __init__(self, min_delay, budget, min_samples):
+        self.latencies = deque(maxlen=200)
+        self.min_delay = min_delay
+        self.budget = budget
+        self.min_samples = min_samples
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """Seconds to wait before hedging: the observed p95, never below min_delay"""
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+            return max(self.min_delay, ordered[int(len(ordered) * 0.95) - 1])
+
+    def allow_hedge(self):
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def record(self, latency, hedge_won):
+        with self._lock:
+            self.calls += 1
+            self.latencies.append(latency)
+            if hedge_won:
+                self.hedge_wins += 1
+
+    def stats(self):
+        delay = self.delay()
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'hedge_delay_seconds': round(delay, 3) if delay else None
+            }
+
+
+class ResilientCaller:
+    """Wraps upstream LLM calls with hedging and a shared circuit breaker"""
+
+    def __init__(self, app=None):
+        self.policies = {}
+        self.breaker = CircuitBreaker(window=20, error_rate=0.5, min_calls=5, cooldown=30)
+        self.hedging = False
+        self.fallback_summaries = 0
+        self._pool = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.hedging = app.config.get('LLM_HEDGE_ENABLED', True)
+        self.hedge_min_delay = app.config.get('LLM_HEDGE_MIN_DELAY', 2.0)
+        self.hedge_budget = app.config.get('LLM_HEDGE_BUDGET', 0.1)
+        self.hedge_min_samples = app.config.get('LLM_HEDGE_MIN_SAMPLES', 20)
+        self.breaker = CircuitBreaker(
+            window=app.config.get('LLM_BREAKER_WINDOW', 20),
+            error_rate=app.config.get('LLM_BREAKER_ERROR_RATE', 0.5),
+            min_calls=app.config.get('LLM_BREAKER_MIN_CALLS', 5),
+            cooldown=app.config.get('LLM_BREAKER_COOLDOWN', 30)
+        )
+        self.policies = {}
+        if self.hedging and self._pool is None:
+            hedge_threads = app.config.get('LLM_HEDGE_THREADS', 32)
+            self._pool = ThreadPoolExecutor(max_workers=hedge_threads, thread_name_prefix='notemaster-llm-hedge')
+            # A hedge that would have to queue for a pool thread is skipped instead
+            self._hedge_slots = threading.BoundedSemaphore(hedge_threads)
+        app.extensions['llm_resilience'] = self
+
+    def policy(self, endpoint):
+        if endpoint not in self.policies:
+            self.policies[endpoint] = HedgePolicy(self.hedge_min_delay, self.hedge_budget, self.hedge_min_samples)
+        return self.policies[endpoint]
+
+    def _finish(self, policy, started, error, hedge_won):
+        self.breaker.record(error is None)
+        if error is None:
+            policy.record(time.monotonic() - started, hedge_won)
+
+    @staticmethod
+    def _start_primary(send):
+        """Run send() on a thread of its own, so the caller can return a hedge that wins
+
+        The primary never waits for a pool thread: the hedge delay is measured
+        from when it is actually sent, and concurrent calls are not capped here.
+        """
+        future = Future()
+
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(send())
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name='notemaster-llm', daemon=True).start()
+        return future
+
+    def _start_hedge(self, send, may_hedge):
+        """Submit a hedge to the pool, or None if every hedge thread is busy or may_hedge() refuses"""
+        if not self._hedge_slots.acquire(blocking=False):
+            return None
+        if not may_hedge():
+            self._hedge_slots.release()
+            return None
+        future = self._pool.submit(send)
+        future.add_done_callback(lambda _: self._hedge_slots.release())
+        return future
+
+    def call(self, endpoint, send, may_hedge):
+        """Run send(), hedging with a second send() if the first is slow
+
+        may_hedge() is asked just before duplicating; it returns False when the
+        hedge would exceed quota. Callers check the breaker before queueing.
+        Without a hedge delay send() runs on the calling thread; otherwise the
+        primary gets its own thread and only hedges use the LLM_HEDGE_THREADS pool.
+        """
+        policy = self.policy(endpoint)
+        delay = policy.delay() if self.hedging else None
+        started = time.monotonic()
+
+        if delay is None:
+            try:
+                result = send()
+            except Exception as e:
+                self._finish(policy, started, e, False)
+                raise
+            self._finish(policy, started, None, False)
+            return result
+
+        primary = self._start_primary(send)
+        done, _ = wait([primary], timeout=delay)
+        pending = {primary}
+        if not done and policy.allow_hedge():
+            hedge = self._start_hedge(send, may_hedge)
+            if hedge is not None:
+                pending.add(hedge)
+
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    self._finish(policy, started, None, future is not primary)
+                    return future.result()
+                error = future.exception()
+
+        self._finish(policy, started, error, False)
+        raise error
+
+    async def call_async(self, endpoint, send, may_hedge):
+        """Coroutine version of call; send() returns an awaitable"""
+        policy = self.policy(endpoint)
+        delay = policy.delay() if self.hedging else None
+        started = time.monotonic()
+
+        primary = asyncio.ensure_future(send())
+        pending = {primary}
+        if delay is not None:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and policy.allow_hedge() and may_hedge():
+                pending.add(asyncio.ensure_future(send()))
+
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    self._finish(policy, started, None, task is not primary)
+                    return task.result()
+                error = task.exception()
+
+        self._finish(policy, started, error, False)
+        raise error
+
+    def stats(self):
+        return {
+            'circuit_breaker': self.breaker.stats(),
+            'fallback_summaries': self.fallback_summaries,
+            'endpoints': {name: policy.stats() for name, policy in self.policies.items()}
+        }
+
+
+resilience = ResilientCaller()
@@ -0,0 +1,168 @@
+"""
+Passage retrieval for chat across many notes.
+
+Notes are split into passages when they are saved; on SQLite the
+passage_fts index (see models.PASSAGE_FTS_DDL) ranks them with BM25, so a
+query touches only the posting lists of its terms however many notes
+exist. A search scope is chosen through the same index, so chat never
+scans note text. Other databases fall back to LIKE scans.
+
+Notes saved before passages existed are indexed by ensure_schema on the
+next boot (and when a workspace is first opened); `python retrieval.py
+reindex` does the same by hand.
+"""
+
+import re
+
+from sqlalchemy import and_, column, or_, select, table, text
+
+from autotag import tokenize
+from models import db, Note, Passage
+
+PASSAGE_CHARS = 800
+MAX_QUERY_TERMS = 12
+
+_passage_fts = table('passage_fts', column('rowid'))
+
+
+def split_passages(text_content, max_chars=PASSAGE_CHARS):
+    """Pack paragraphs into passages of about max_chars, cutting oversized paragraphs at sentences"""
+    passages, current = [], ''
+
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text_content.strip()):
+        paragraph = ' '.join(paragraph.split())
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(re.split(r'(?<=[.!?])\s+', paragraph))
+
+    for piece in pieces:
+        if not piece:
+            continue
+        if current and len(current) + len(piece) + 1 > max_chars:
+            passages.append(current)
+            current = ''
+        current = f'{current}\n{piece}' if current else piece
+        while len(current) > max_chars:
+            passages.append(current[:max_chars])
+            current = current[max_chars:]
+    if current:
+        passages.append(current)
+
+    return passages
+
+
+def passage_source(title, content):
+    """Text a note's passages are cut from: its content, led by the title unless the content already starts with it
+
+    Generated titles are the content's first line (cut short with "..."), so
+    only an edited title is added; otherwise it would be indexed twice.
+    """
+    if content.lstrip().startswith(title.removesuffix('...')):
+        return content
+    return f'{title}\n\n{content}'
+
+
+def index_passages(note):
+    """Replace a note's passages with ones cut from its current content"""
+    note.passages = [
+        Passage(position=position, content=content)
+        for position, content in enumerate(split_passages(passage_source(note.title, note.original_content)))
+    ]
+
+
+def _fts_query(terms):
+    return ' OR '.join(f'"{term}"' for term in terms)
+
+
+def notes_matching(search):
+    """Ids of notes with a passage containing every term of search, or None if it has no terms"""
+    terms = list(dict.fromkeys(tokenize(search)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return (
+            select(Passage.note_id)
+            .select_from(_passage_fts)
+            .join(Passage, Passage.id == _passage_fts.c.rowid)
+            .where(text('passage_fts MATCH :scope_query').bindparams(scope_query=' AND '.join(f'"{term}"' for term in terms)))
+            .distinct()
+        )
+
+    return select(Passage.note_id).where(and_(*[Passage.content.ilike(f'%{term}%') for term in terms])).distinct()
+
+
+def search_passages(question, scope, limit=20):
+    """Best-matching passages for question among notes selected by `scope`
+
+    scope is a selectable of note ids. Returns (passage_id, note_id, title,
+    content) rows, best first.
+    """
+    terms = list(dict.fromkeys(tokenize(question)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return db.session.execute(
+            select(Passage.id, Passage.note_id, Note.title, Passage.content)
+            .select_from(_passage_fts)
+            .join(Passage, Passage.id == _passage_fts.c.rowid)
+            .join(Note, Note.id == Passage.note_id)
+            .where(text('passage_fts MATCH :query').bindparams(query=_fts_query(terms)),
+                   Passage.note_id.in_(scope))
+            .order_by(text('bm25(passage_fts)'))
+            .limit(limit)
+        ).all()
+
+    rows = db.session.execute(
+        select(Passage.id, Passage.note_id, Note.title, Passage.content)
+        .join(Note, Note.id == Passage.note_id)
+        .where(Passage.note_id.in_(scope), or_(*[Passage.content.ilike(f'%{term}%') for term in terms]))
+        .limit(limit * 20)
+    ).all()
+    return sorted(rows, key=lambda row: -sum(row.content.lower().count(term) for term in terms))[:limit]
+
+
+def select_context(rows, max_chars):
+    """Take passages in rank order until the prompt budget is spent"""
+    chosen, used = [], 0
+    for row in rows:
+        if used + len(row.content) > max_chars:
+            continue
+        chosen.append(row)
+        used += len(row.content)
+    return chosen
+
+
+def reindex_missing(batch_size=500):
+    """Build passages for notes saved before the passage index existed
+
+    Runs through the ORM session, so it covers the database the current
+    request or app context is bound to; ensure_schema uses
+    models._index_missing_passages for the same job on any engine.
+    """
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = (Note.query.filter(Note.id > last_id, ~Note.passages.any())
+                 .order_by(Note.id).limit(batch_size).all())
+        if not batch:
+            return indexed
+        last_id = batch[-1].id
+        for note in batch:
+            index_passages(note)
+        db.session.commit()
+        db.session.expunge_all()
+        indexed += len(batch)
+
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+
+    if sys.argv[1:] != ['reindex']:
+        sys.exit('usage: python retrieval.py reindex')
+    with create_app().app_context():
+        print(f'Indexed {reindex_missing()} note(s)')
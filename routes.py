@@ -1,10 +1,251 @@
 from flask import Blueprint, render_template, request, jsonify, flash, current_app
-from models import db, Note, Tag, ChatMessage
-from utils import generate_summary, generate_chat_response, extract_text_from_pdf, generate_note_title, allowed_file
-from sqlalchemy import or_
+from models import db, Note, NoteSection, Tag, ChatMessage, note_tags as note_tags_table
+from cache import cache, mark_for_invalidation
+from autotag import index_note, unindex_note, suggest_tags, backfill_job
+from digest import build_digest, fallback_digest
+from retrieval import index_passages, notes_matching, search_passages, select_context
+from scheduler import scheduler, LLMBusyError
+from resilience import resilience, CircuitOpenError
+from maintenance import maintenance
+from compression import compressor
+from context_cache import context_cache
+from workspaces import workspaces
+from uploads import (UploadError, create_upload, upload_status, write_chunk, finish_upload,
+                     discard_upload)
+from utils import (generate_note_summary, summarize_sections, generate_chat_response, generate_corpus_chat_response,
+                   extract_text_from_pdf, generate_note_title, allowed_file, split_sections, merge_section_summaries,
+                   PromptTooLargeError)
+from sqlalchemy import or_, and_, func, select, literal
+from werkzeug.exceptions import RequestEntityTooLarge
 
 main = Blueprint('main', __name__)
 
+CHAT_PAGE_SIZE = 30
+CHAT_PAGE_MAX = 200
+
+
+def cached_json(key, build):
+    """Serve a JSON payload from the response cache, building it on a miss"""
+    payload = cache.get_or_build(key, lambda: current_app.json.dumps(build()))
+    return current_app.response_class(payload, mimetype='application/json')
+
+
+def search_filter(search):
+    """Match notes whose title, content or summary contain the search text"""
+    search_pattern = f"%{search}%"
+    return or_(
+        Note.title.ilike(search_pattern),
+        Note.original_content.ilike(search_pattern),
+        Note.summary.ilike(search_pattern)
+    )
+
+
+def tag_facets(search=None):
+    """All tags with their note counts, optionally counting only notes matching a search"""
+    note_join = Note.id == note_tags_table.c.note_id
+    if search:
+        note_join = and_(note_join, search_filter(search))
+    
+    rows = db.session.query(Tag, func.count(Note.id)) \
+        .outerjoin(note_tags_table, note_tags_table.c.tag_id == Tag.id) \
+        .outerjoin(Note, note_join) \
+        .group_by(Tag.id) \
+        .order_by(Tag.name) \
+        .all()
+    
+    return {'tags': [{**tag.to_dict(), 'note_count': count} for tag, count in rows]}
+
+
+def notes_length_error(notes_text):
+    """Return a user-facing error if the notes are too short or too long"""
+    if len(notes_text) < current_app.config['NOTES_MIN_LENGTH']:
+        return f'Notes are too short. Please enter at least {current_app.config["NOTES_MIN_LENGTH"]} characters.'
+    
+    if len(notes_text) > current_app.config['NOTES_MAX_LENGTH']:
+        return f'Notes are too long. Please limit to {current_app.config["NOTES_MAX_LENGTH"]:,} characters.'
+    
+    return None
+
+
+def text_field(data, field):
+    """data[field] stripped, or None when the JSON body is not an object or the field is not a string"""
+    if not isinstance(data, dict) or not isinstance(data.get(field), str):
+        return None
+    return data[field].strip()
+
+
+def body_too_large_error():
+    """User-facing error for a request body over MAX_CONTENT_LENGTH"""
+    return f'Request is too large. Please limit it to {current_app.config["MAX_CONTENT_LENGTH"]:,} bytes.'
+
+
+def describe_gemini_error(error):
+    """Map a Gemini failure to a user-friendly message and HTTP status"""
+    error_message = str(error)
+    
+    if isinstance(error, PromptTooLargeError):
+        return f'📏 {error_message}', error.status
+    elif 'API_KEY_INVALID' in error_message or 'API key not valid' in error_message:
+        return '🔑 Invalid API Key. Please check your Gemini API key in .env file', 401
+    elif 'quota' in error_message.lower():
+        return '⚠️ API quota exceeded. Please try again later or check your Gemini API usage.', 429
+    elif 'PERMISSION_DENIED' in error_message:
+        return '🚫 Permission denied. Please verify your API key has access to Gemini models.', 403
+    else:
+        return f'⚠️ An error occurred: {error_message}', 500
+
+
+def llm_busy_payload(error):
+    """User-facing payload and status for an LLM call that was turned away"""
+    if error.status == 503:
+        message = f'🚫 The AI service is temporarily unavailable. Please try again in {error.retry_after} seconds.'
+    else:
+        message = f'⏳ The AI service is busy. Please try again in {error.retry_after} seconds.'
+    return {'error': message, 'retry_after': error.retry_after}, error.status
+
+
+def llm_busy_response(error):
+    """429/503 with a Retry-After hint for calls the scheduler or circuit breaker turned away"""
+    payload, status = llm_busy_payload(error)
+    response = jsonify(payload)
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, status
+
+
+def record_note_usage(note, usage):
+    """Add the token counts of the LLM calls that summarized a note to its totals"""
+    if usage:
+        note.llm_model = usage['model']
+        note.prompt_tokens = (note.prompt_tokens or 0) + usage['prompt_tokens']
+        note.response_tokens = (note.response_tokens or 0) + usage['response_tokens']
+
+
+def save_note(notes_text, summary, usage=None, sections=()):
+    """Create and commit a note for freshly summarized text
+
+    sections are the section content hashes from generate_note_summary, kept
+    so the note's first edit can tell which sections it changed.
+    """
+    note = Note(
+        title=generate_note_title(notes_text),
+        original_content=notes_text,
+        summary=summary
+    )
+    record_note_usage(note, usage)
+    note.sections = [
+        NoteSection(position=position, content_hash=content_hash)
+        for position, content_hash in enumerate(sections)
+    ]
+    
+    if current_app.config['AUTOTAG_ENABLED']:
+        index_note(note)
+    index_passages(note)
+    
+    db.session.add(note)
+    db.session.commit()
+    return note
+
+
+def autotag_note(note):
+    """Suggest existing tags for a note, attaching them when AUTOTAG_APPLY is set"""
+    if not current_app.config['AUTOTAG_ENABLED']:
+        return []
+    
+    picks = suggest_tags(
+        note,
+        limit=current_app.config['AUTOTAG_MAX_SUGGESTIONS'],
+        min_score=current_app.config['AUTOTAG_MIN_SCORE']
+    )
+    
+    if picks and current_app.config['AUTOTAG_APPLY']:
+        note.tags.extend(tag for tag, _ in picks)
+        db.session.commit()
+    
+    return [{**tag.to_dict(), 'score': score} for tag, score in picks]
+
+
+def resummarize_note(note, new_text):
+    """Replace a note's content, summarizing only sections that are new, changed or not yet summarized
+
+    The section summaries are then merged into the note summary in one more
+    call. Returns the number of sections that went to the LLM.
+    """
+    known = {section.content_hash: section.summary for section in note.sections if section.summary}
+    sections = split_sections(new_text)
+    usage = {}
+    
+    missing = dict((content_hash, section_text) for content_hash, section_text in sections
+                   if content_hash not in known)
+    if missing:
+        known.update(zip(missing, summarize_sections(list(missing.values()), usage)))
+    summary = merge_section_summaries([known[content_hash] for content_hash, _ in sections], usage)
+    record_note_usage(note, usage)
+    
+    note.sections = [
+        NoteSection(position=position, content_hash=content_hash, summary=known[content_hash])
+        for position, (content_hash, _) in enumerate(sections)
+    ]
+    unindex_note(note)
+    note.original_content = new_text
+    note.summary = summary
+    if current_app.config['AUTOTAG_ENABLED']:
+        index_note(note)
+    index_passages(note)
+    return len(missing)
+
+
+def load_chat_history(note_id):
+    """Chat history for a note, oldest first, as dictionaries"""
+    chat_history = (ChatMessage.query.filter_by(note_id=note_id)
+                    .order_by(ChatMessage.created_at, ChatMessage.id).all())
+    return [msg.to_dict() for msg in chat_history]
+
+
+def chat_page(note_id, before=None, limit=CHAT_PAGE_SIZE):
+    """Up to `limit` messages older than message `before` (newest when None), oldest first
+
+    Keyset pagination on (created_at, id), so every page is a single range
+    scan of ix_chat_message_note_created however long the conversation is.
+    Returns (messages, has_more).
+    """
+    query = ChatMessage.query.filter_by(note_id=note_id)
+    if before is not None:
+        anchor = db.session.get(ChatMessage, before)
+        if anchor is None or anchor.note_id != note_id:
+            return [], False
+        query = query.filter(or_(
+            ChatMessage.created_at < anchor.created_at,
+            and_(ChatMessage.created_at == anchor.created_at, ChatMessage.id < anchor.id)
+        ))
+    
+    rows = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    return list(reversed(rows[:limit])), has_more
+
+
+def save_chat_turn(note_id, user_question, ai_response, usage=None):
+    """Persist one question/answer pair, with the call's token counts, and return both messages"""
+    user_msg = ChatMessage(
+        note_id=note_id,
+        role='user',
+        content=user_question
+    )
+    db.session.add(user_msg)
+    
+    ai_msg = ChatMessage(
+        note_id=note_id,
+        role='assistant',
+        content=ai_response
+    )
+    if usage:
+        ai_msg.llm_model = usage['model']
+        ai_msg.prompt_tokens = usage['prompt_tokens']
+        ai_msg.response_tokens = usage['response_tokens']
+    db.session.add(ai_msg)
+    
+    db.session.commit()
+    return user_msg, ai_msg
+
 
 @main.route('/')
 def index():
@@ -35,7 +276,7 @@ def summarize():
             # Extract text from PDF
             if file.filename.endswith('.pdf'):
                 try:
-                    notes_text = extract_text_from_pdf(file)
+                    notes_text = extract_text_from_pdf(file, current_app.config['NOTES_MAX_LENGTH'] + 1)
                 except Exception as e:
                     return jsonify({'error': str(e)}), 400
             else:
@@ -43,69 +284,161 @@ def summarize():
         
         # Check for JSON data
         elif request.is_json:
-            data = request.get_json()
-            if not data or 'notes' not in data:
+            notes_text = text_field(request.get_json(), 'notes')
+            if notes_text is None:
                 return jsonify({'error': 'No notes provided. Please enter some text to summarize.'}), 400
-            notes_text = data['notes'].strip()
         
         else:
             return jsonify({'error': 'Invalid request format'}), 400
         
-        # Validate input
-        if len(notes_text) < current_app.config['NOTES_MIN_LENGTH']:
-            return jsonify({
-                'error': f'Notes are too short. Please enter at least {current_app.config["NOTES_MIN_LENGTH"]} characters.'
-            }), 400
+        return summarize_notes(notes_text)
         
-        if len(notes_text) > current_app.config['NOTES_MAX_LENGTH']:
-            return jsonify({
-                'error': f'Notes are too long. Please limit to {current_app.config["NOTES_MAX_LENGTH"]:,} characters.'
-            }), 400
+    except RequestEntityTooLarge:
+        return jsonify({'error': body_too_large_error()}), 413
+    except Exception as e:
+        current_app.logger.error(f"Error in summarize endpoint: {e}")
+        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
+
+
+def summarize_notes(notes_text):
+    """Validate, summarize and save notes text; returns the summarize response"""
+    length_error = notes_length_error(notes_text)
+    if length_error:
+        return jsonify({'error': length_error}), 400
+    
+    # Generate summary
+    usage = {}
+    try:
+        summary, sections = generate_note_summary(notes_text, usage)
+    except LLMBusyError as e:
+        return llm_busy_response(e)
+    except Exception as e:
+        message, status = describe_gemini_error(e)
+        return jsonify({'error': message}), status
+    
+    # Generate title and save to database
+    note = save_note(notes_text, summary, usage, sections)
+    suggested_tags = autotag_note(note)
+    
+    return jsonify({
+        'summary': summary,
+        'summary_html': note.summary_html,
+        'note_id': note.id,
+        'title': note.title,
+        'suggested_tags': suggested_tags
+    }), 200
+
+
+def upload_error_response(error):
+    payload = {'error': str(error)}
+    if error.offset is not None:
+        payload['offset'] = error.offset
+    return jsonify(payload), error.status
+
+
+@main.route('/api/uploads', methods=['POST'])
+def start_upload():
+    """
+    Start a resumable upload
+    Accepts: JSON with 'filename', 'size' (bytes) and optionally 'sha256' of the whole file
+    Returns: JSON with upload_id, offset and the suggested chunk_size
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = (data.get('filename') or '').strip()
+        
+        if not filename:
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not allowed_file(filename):
+            return jsonify({'error': 'Invalid file type. Only PDF and TXT files are allowed.'}), 400
         
-        # Generate summary
         try:
-            summary = generate_summary(notes_text)
-        except Exception as e:
-            error_message = str(e)
-            
-            # Provide user-friendly error messages
-            if 'API_KEY_INVALID' in error_message or 'API key not valid' in error_message:
-                return jsonify({
-                    'error': '🔑 Invalid API Key. Please check your Gemini API key in .env file'
-                }), 401
-            elif 'quota' in error_message.lower():
-                return jsonify({
-                    'error': '⚠️ API quota exceeded. Please try again later or check your Gemini API usage.'
-                }), 429
-            elif 'PERMISSION_DENIED' in error_message:
-                return jsonify({
-                    'error': '🚫 Permission denied. Please verify your API key has access to Gemini models.'
-                }), 403
-            else:
-                return jsonify({
-                    'error': f'⚠️ An error occurred: {error_message}'
-                }), 500
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'File size is required'}), 400
         
-        # Generate title and save to database
-        title = generate_note_title(notes_text)
+        return jsonify(create_upload(filename, size, data.get('sha256'), request.remote_addr)), 201
         
-        note = Note(
-            title=title,
-            original_content=notes_text,
-            summary=summary
-        )
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        current_app.logger.error(f"Error starting upload: {e}")
+        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
+
+
+@main.route('/api/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def upload_detail(upload_id):
+    """
+    GET: how many bytes have arrived, to resume from
+    PUT: write the request body at the Upload-Offset header (Upload-Checksum: optional chunk SHA-256)
+    DELETE: cancel the upload
+    """
+    try:
+        if request.method == 'GET':
+            return jsonify(upload_status(upload_id)), 200
         
-        db.session.add(note)
-        db.session.commit()
+        if request.method == 'DELETE':
+            upload_status(upload_id)
+            discard_upload(upload_id)
+            return jsonify({'message': 'Upload cancelled'}), 200
         
-        return jsonify({
-            'summary': summary,
-            'note_id': note.id,
-            'title': title
-        }), 200
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'Upload-Offset header is required'}), 400
+        
+        new_offset = write_chunk(upload_id, offset, request.stream, request.content_length,
+                                 request.headers.get('Upload-Checksum'))
+        return jsonify({'upload_id': upload_id, 'offset': new_offset}), 200
         
+    except UploadError as e:
+        return upload_error_response(e)
     except Exception as e:
-        current_app.logger.error(f"Error in summarize endpoint: {e}")
+        current_app.logger.error(f"Error in upload {upload_id}: {e}")
+        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
+
+
+@main.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """
+    Finish a resumable upload: extract its text and summarize it like POST /api/summarize
+    Returns: JSON with summary and note_id
+    """
+    try:
+        filename, spool, _ = finish_upload(upload_id)
+        
+        if filename.lower().endswith('.pdf'):
+            try:
+                notes_text = extract_text_from_pdf(spool, current_app.config['NOTES_MAX_LENGTH'] + 1)
+            except Exception as e:
+                discard_upload(upload_id)
+                return jsonify({'error': str(e)}), 400
+        else:
+            # UTF-8 spends at most 4 bytes per character, so reading past this
+            # only confirms the notes are too long; the length check reports it
+            max_bytes = current_app.config['NOTES_MAX_LENGTH'] * 4
+            with open(spool, 'rb') as f:
+                data = f.read(max_bytes + 1)
+            try:
+                notes_text = data.decode('utf-8', errors='ignore' if len(data) > max_bytes else 'strict')
+            except UnicodeDecodeError:
+                discard_upload(upload_id)
+                return jsonify({'error': 'Text files must be UTF-8 encoded'}), 400
+        
+        response, status = summarize_notes(notes_text)
+        # Keep the spooled file only when the LLM was busy, over quota or down,
+        # so the client can retry /complete without uploading it again; it
+        # still counts against the client's uploads until it expires
+        if status not in (429, 503):
+            discard_upload(upload_id)
+        return response, status
+        
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        current_app.logger.error(f"Error completing upload {upload_id}: {e}")
+        discard_upload(upload_id)
         return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
 
 
@@ -126,14 +459,7 @@ def get_notes():
         
         # Search in title, content, or summary
         if search:
-            search_pattern = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Note.title.ilike(search_pattern),
-                    Note.original_content.ilike(search_pattern),
-                    Note.summary.ilike(search_pattern)
-                )
-            )
+            query = query.filter(search_filter(search))
         
         # Order by most recent
         notes = query.order_by(Note.created_at.desc()).all()
@@ -147,16 +473,74 @@ def get_notes():
         return jsonify({'error': str(e)}), 500
 
 
-@main.route('/api/notes/<int:note_id>', methods=['GET', 'DELETE'])
+@main.route('/api/notes/<int:note_id>', methods=['GET', 'PATCH', 'DELETE'])
 def note_detail(note_id):
-    """Get or delete a specific note"""
+    """Get, edit or delete a specific note"""
     try:
+        if request.method == 'GET':
+            return cached_json(
+                cache.note_key(note_id),
+                lambda: Note.query.get_or_404(note_id).to_dict()
+            ), 200
+        
         note = Note.query.get_or_404(note_id)
         
-        if request.method == 'GET':
-            return jsonify(note.to_dict()), 200
+        if request.method == 'PATCH':
+            data = request.get_json()
+            if not isinstance(data, dict) or not ('original_content' in data or 'title' in data):
+                return jsonify({'error': 'Nothing to update. Provide original_content and/or title.'}), 400
+            
+            regenerated = 0
+            reindex = False
+            
+            if 'title' in data:
+                title = text_field(data, 'title')
+                if title is None:
+                    return jsonify({'error': 'Title must be a string'}), 400
+                if not title:
+                    return jsonify({'error': 'Title cannot be empty'}), 400
+                if title[:200] != note.title:
+                    # The title is part of the indexed text: uncount it under the old one
+                    unindex_note(note)
+                    note.title = title[:200]
+                    reindex = True
+            
+            if 'original_content' in data:
+                new_text = text_field(data, 'original_content')
+                if new_text is None:
+                    return jsonify({'error': 'original_content must be a string'}), 400
+                
+                length_error = notes_length_error(new_text)
+                if length_error:
+                    return jsonify({'error': length_error}), 400
+                
+                if new_text != note.original_content:
+                    try:
+                        regenerated = resummarize_note(note, new_text)
+                        reindex = False  # resummarize_note re-indexes
+                    except LLMBusyError as e:
+                        db.session.rollback()
+                        return llm_busy_response(e)
+                    except Exception as e:
+                        db.session.rollback()
+                        message, status = describe_gemini_error(e)
+                        return jsonify({'error': message}), status
+            
+            if reindex:
+                if current_app.config['AUTOTAG_ENABLED']:
+                    index_note(note)
+                index_passages(note)
+            
+            db.session.commit()
+            
+            return jsonify({
+                **note.to_dict(),
+                'sections_total': len(note.sections),
+                'sections_resummarized': regenerated
+            }), 200
         
-        elif request.method == 'DELETE':
+        if request.method == 'DELETE':
+            unindex_note(note)
             db.session.delete(note)
             db.session.commit()
             return jsonify({'message': 'Note deleted successfully'}), 200
@@ -172,47 +556,36 @@ def chat_with_note(note_id):
     try:
         note = Note.query.get_or_404(note_id)
         
-        data = request.get_json()
-        if not data or 'question' not in data:
+        user_question = text_field(request.get_json(), 'question')
+        if user_question is None:
             return jsonify({'error': 'No question provided'}), 400
         
-        user_question = data['question'].strip()
-        
         if not user_question:
             return jsonify({'error': 'Question cannot be empty'}), 400
         
         # Get chat history for this note
-        chat_history = ChatMessage.query.filter_by(note_id=note_id).order_by(ChatMessage.created_at).all()
-        chat_history_dict = [msg.to_dict() for msg in chat_history]
+        chat_history_dict = load_chat_history(note_id)
         
         # Generate AI response
+        usage = {}
         try:
             ai_response = generate_chat_response(
                 note.original_content,
                 note.summary,
                 chat_history_dict,
-                user_question
+                user_question,
+                usage,
+                note_id=note_id
             )
+        except LLMBusyError as e:
+            return llm_busy_response(e)
+        except PromptTooLargeError as e:
+            return jsonify({'error': str(e)}), e.status
         except Exception as e:
             return jsonify({'error': f'Error generating response: {str(e)}'}), 500
         
-        # Save user question
-        user_msg = ChatMessage(
-            note_id=note_id,
-            role='user',
-            content=user_question
-        )
-        db.session.add(user_msg)
-        
-        # Save AI response
-        ai_msg = ChatMessage(
-            note_id=note_id,
-            role='assistant',
-            content=ai_response
-        )
-        db.session.add(ai_msg)
-        
-        db.session.commit()
+        # Save user question and AI response
+        user_msg, ai_msg = save_chat_turn(note_id, user_question, ai_response, usage)
         
         return jsonify({
             'response': ai_response,
@@ -220,20 +593,85 @@ def chat_with_note(note_id):
             'ai_message': ai_msg.to_dict()
         }), 200
         
+    except RequestEntityTooLarge:
+        return jsonify({'error': body_too_large_error()}), 413
     except Exception as e:
         current_app.logger.error(f"Error in chat: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@main.route('/api/chat', methods=['POST'])
+def chat_across_notes():
+    """Ask a question across every note with a tag or matching a search
+    Accepts: JSON with 'question' and either 'tag_id' or 'search'
+    Returns: JSON with the response and the passages it was drawn from
+    """
+    try:
+        data = request.get_json()
+        if not data or 'question' not in data:
+            return jsonify({'error': 'No question provided'}), 400
+        
+        user_question = str(data['question']).strip()
+        if not user_question:
+            return jsonify({'error': 'Question cannot be empty'}), 400
+        
+        if data.get('tag_id') is not None:
+            tag = Tag.query.get_or_404(data['tag_id'])
+            scope = select(note_tags_table.c.note_id).where(note_tags_table.c.tag_id == tag.id)
+            scope_label = f'"{tag.name}"'
+        elif str(data.get('search', '')).strip():
+            search = str(data['search']).strip()
+            scope = notes_matching(search)
+            if scope is None:
+                return jsonify({'error': 'Search text has no words to match'}), 400
+            scope_label = f'"{search}"'
+        else:
+            return jsonify({'error': 'Provide tag_id or search to choose which notes to ask'}), 400
+        
+        rows = search_passages(user_question, scope, current_app.config['CHAT_RETRIEVAL_PASSAGES'])
+        context = select_context(rows, current_app.config['CHAT_CONTEXT_MAX_CHARS'])
+        if not context:
+            return jsonify({'error': 'No notes in this scope mention that topic'}), 404
+        
+        try:
+            ai_response = generate_corpus_chat_response(
+                scope_label,
+                [(row.title, row.content) for row in context],
+                user_question
+            )
+        except LLMBusyError as e:
+            return llm_busy_response(e)
+        except PromptTooLargeError as e:
+            return jsonify({'error': str(e)}), e.status
+        except Exception as e:
+            return jsonify({'error': f'Error generating response: {str(e)}'}), 500
+        
+        return jsonify({
+            'response': ai_response,
+            'sources': [
+                {'note_id': row.note_id, 'title': row.title, 'passage_id': row.id, 'excerpt': row.content[:200]}
+                for row in context
+            ]
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in cross-note chat: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @main.route('/api/notes/<int:note_id>/chat', methods=['GET'])
 def get_chat_history(note_id):
-    """Get chat history for a note"""
+    """Get one page of chat history for a note: the newest messages, or those before ?before=<id>"""
     try:
         note = Note.query.get_or_404(note_id)
-        messages = ChatMessage.query.filter_by(note_id=note_id).order_by(ChatMessage.created_at).all()
+        before = request.args.get('before', type=int)
+        limit = min(max(request.args.get('limit', CHAT_PAGE_SIZE, type=int), 1), CHAT_PAGE_MAX)
+        messages, has_more = chat_page(note_id, before, limit)
         
         return jsonify({
-            'messages': [msg.to_dict() for msg in messages]
+            'messages': [msg.to_dict() for msg in messages],
+            'has_more': has_more,
+            'next_before': messages[0].id if has_more else None
         }), 200
         
     except Exception as e:
@@ -246,10 +684,12 @@ def tags():
     """Get all tags or create a new tag"""
     try:
         if request.method == 'GET':
-            all_tags = Tag.query.order_by(Tag.name).all()
-            return jsonify({
-                'tags': [tag.to_dict() for tag in all_tags]
-            }), 200
+            search = request.args.get('search', '').strip()
+            
+            # Search-scoped counts vary per query, so only the global facets are cached
+            if search:
+                return jsonify(tag_facets(search)), 200
+            return cached_json(cache.tags_key(), tag_facets), 200
         
         elif request.method == 'POST':
             data = request.get_json()
@@ -280,6 +720,147 @@ def tags():
         return jsonify({'error': str(e)}), 500
 
 
+@main.route('/api/tags/<int:tag_id>/notes', methods=['POST'])
+def bulk_tag_notes(tag_id):
+    """Attach or detach a tag on many notes at once
+    Accepts: JSON with 'note_ids' (list) or 'search', and 'action' ('attach' or 'detach')
+    Returns: JSON with the number of notes changed
+    """
+    try:
+        Tag.query.get_or_404(tag_id)
+        data = request.get_json()
+        
+        if not data or not ('note_ids' in data or 'search' in data):
+            return jsonify({'error': 'Provide note_ids or search to select notes'}), 400
+        
+        action = data.get('action', 'attach')
+        if action not in ('attach', 'detach'):
+            return jsonify({'error': "Action must be 'attach' or 'detach'"}), 400
+        
+        if 'note_ids' in data:
+            note_ids = data['note_ids']
+            if not isinstance(note_ids, list) or not all(isinstance(i, int) for i in note_ids):
+                return jsonify({'error': 'note_ids must be a list of integers'}), 400
+            selected = Note.id.in_(note_ids)
+        else:
+            search = str(data['search']).strip()
+            if not search:
+                return jsonify({'error': 'Search cannot be empty'}), 400
+            selected = search_filter(search)
+        
+        matching_ids = select(Note.id).where(selected)
+        tagged_ids = select(note_tags_table.c.note_id).where(note_tags_table.c.tag_id == tag_id)
+        
+        if action == 'attach':
+            statement = note_tags_table.insert().from_select(
+                ['note_id', 'tag_id'],
+                select(Note.id, literal(tag_id)).where(selected, Note.id.not_in(tagged_ids))
+            )
+            changed_ids = db.session.scalars(matching_ids.where(Note.id.not_in(tagged_ids))).all()
+        else:
+            statement = note_tags_table.delete().where(
+                note_tags_table.c.tag_id == tag_id,
+                note_tags_table.c.note_id.in_(matching_ids)
+            )
+            changed_ids = db.session.scalars(matching_ids.where(Note.id.in_(tagged_ids))).all()
+        
+        changed = db.session.execute(statement).rowcount
+        
+        # Core statements bypass the ORM flush, so queue cache invalidation by hand
+        mark_for_invalidation(db.session, [cache.tags_key()] + [cache.note_key(i) for i in changed_ids])
+        db.session.commit()
+        
+        return jsonify({
+            'message': f'Tag {action}ed {"to" if action == "attach" else "from"} {changed} note(s)',
+            'changed': changed
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error bulk tagging notes: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@main.route('/api/tags/<int:tag_id>/digest', methods=['POST'])
+def tag_digest(tag_id):
+    """Study guide for all notes with a tag, built from their existing summaries
+    Only batches whose notes changed since the last digest go back to the LLM.
+    """
+    try:
+        tag = Tag.query.get_or_404(tag_id)
+        
+        try:
+            digest, batches_total, batches_regenerated = build_digest(tag)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except CircuitOpenError as e:
+            db.session.rollback()
+            return jsonify({
+                'tag_id': tag.id,
+                'digest': fallback_digest(tag, e),
+                'cached': False,
+                'fallback': True
+            }), 200
+        except LLMBusyError as e:
+            db.session.rollback()
+            return llm_busy_response(e)
+        
+        return jsonify({
+            **digest.to_dict(),
+            'batches_total': batches_total,
+            'batches_regenerated': batches_regenerated,
+            'cached': batches_regenerated == 0
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error building digest for tag {tag_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@main.route('/api/notes/<int:note_id>/suggested-tags', methods=['GET'])
+def suggested_tags(note_id):
+    """Existing tags that fit a note, scored locally without an LLM call"""
+    try:
+        note = Note.query.get_or_404(note_id)
+        if note.keywords is None and current_app.config['AUTOTAG_ENABLED']:
+            index_note(note)
+            db.session.commit()
+        
+        picks = suggest_tags(
+            note,
+            limit=current_app.config['AUTOTAG_MAX_SUGGESTIONS'],
+            min_score=current_app.config['AUTOTAG_MIN_SCORE']
+        )
+        return jsonify({
+            'suggested_tags': [{**tag.to_dict(), 'score': score} for tag, score in picks]
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error suggesting tags for note {note_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@main.route('/api/tags/autotag', methods=['GET', 'POST'])
+def autotag_backfill():
+    """Start or check the background job that auto-tags the whole corpus
+    Accepts: JSON with optional 'apply' (attach suggestions instead of only reporting them)
+    """
+    if request.method == 'GET':
+        return jsonify(backfill_job.state), 200
+    
+    data = request.get_json(silent=True) or {}
+    started = backfill_job.start(
+        current_app._get_current_object(),
+        apply=bool(data.get('apply', False)),
+        batch_size=current_app.config['AUTOTAG_BATCH_SIZE']
+    )
+    
+    if not started:
+        return jsonify({'error': 'An auto-tag job is already running', 'job': backfill_job.state}), 409
+    return jsonify({'message': 'Auto-tag job started', 'job': backfill_job.state}), 202
+
+
 @main.route('/api/notes/<int:note_id>/tags', methods=['POST', 'DELETE'])
 def note_tags(note_id):
     """Add or remove tags from a note"""
@@ -313,6 +894,37 @@ def note_tags(note_id):
         return jsonify({'error': str(e)}), 500
 
 
+def token_usage():
+    """Recorded prompt/response tokens per model, for notes and chat"""
+    usage = {}
+    for kind, model in (('notes', Note), ('chat', ChatMessage)):
+        rows = db.session.execute(
+            select(model.llm_model, func.count(), func.sum(model.prompt_tokens), func.sum(model.response_tokens))
+            .where(model.llm_model.is_not(None))
+            .group_by(model.llm_model)
+        ).all()
+        usage[kind] = {
+            name: {'count': count, 'prompt_tokens': prompt or 0, 'response_tokens': response or 0}
+            for name, count, prompt, response in rows
+        }
+    return usage
+
+
+@main.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Runtime counters for capacity planning"""
+    return jsonify({
+        'cache': cache.stats(),
+        'llm_scheduler': scheduler.stats(),
+        'llm_resilience': resilience.stats(),
+        'maintenance': maintenance.stats(),
+        'compression': compressor.stats(),
+        'context_cache': context_cache.stats(),
+        'workspaces': workspaces.stats(),
+        'token_usage': token_usage()
+    }), 200
+
+
 @main.route('/health')
 def health():
     """Health check endpoint"""
@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+# Lower value is served first
+INTERACTIVE = 0
+BATCH = 1
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch'}
+
+
+class LLMBusyError(Exception):
+    """Raised when an LLM call is rejected instead of queued"""
+
+    status = 429
+
+    def __init__(self, retry_after, reason='LLM request queue is full'):
+        super().__init__(f'{reason}. Please retry in {retry_after} seconds.')
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to a burst of one minute's worth"""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (0 if available now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def drain(self):
+        self.level = 0.0
+
+
+class LLMScheduler:
+    """Admits LLM calls in priority order within request and token rate limits"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._waits = deque(maxlen=1000)
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.rejected = {name: 0 for name in PRIORITY_NAMES.values()}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LLM_SCHEDULER_ENABLED', True)
+        # Every process has its own buckets, so each admits its share of the account quota
+        self.workers = max(1, app.config.get('LLM_QUOTA_WORKERS', 1))
+        self.requests = TokenBucket(app.config.get('LLM_REQUESTS_PER_MINUTE', 60) / self.workers)
+        self.tokens = TokenBucket(app.config.get('LLM_TOKENS_PER_MINUTE', 250000) / self.workers)
+        self.max_depth = app.config.get('LLM_QUEUE_MAX_DEPTH', 50)
+        self.max_wait = app.config.get('LLM_QUEUE_MAX_WAIT', 20)
+        app.extensions['llm_scheduler'] = self
+
+    def _enqueue(self, priority, tokens):
+        """Add a ticket or reject it straight away if the queue is hopeless"""
+        with self._lock:
+            ahead = sum(1 for ticket in self._queue if ticket[0] <= priority)
+            drain_time = ahead / self.requests.rate
+
+            if len(self._queue) >= self.max_depth or drain_time > self.max_wait:
+                self.rejected[PRIORITY_NAMES[priority]] += 1
+                raise LLMBusyError(max(1, round(drain_time)))
+
+            ticket = (priority, next(self._sequence), tokens, time.monotonic())
+            heapq.heappush(self._queue, ticket)
+            return ticket
+
+    def _try_admit(self, ticket):
+        """Admit the ticket if it is at the head and both buckets allow; else return the wait"""
+        now = time.monotonic()
+        if self._queue[0] is not ticket:
+            return None
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(ticket[2], now))
+        if wait:
+            return wait
+
+        heapq.heappop(self._queue)
+        self.requests.take(1)
+        self.tokens.take(ticket[2])
+        self.admitted[PRIORITY_NAMES[ticket[0]]] += 1
+        self._waits.append(now - ticket[3])
+        self._changed.notify_all()
+        return 0
+
+    def _give_up(self, ticket):
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+        self.rejected[PRIORITY_NAMES[ticket[0]]] += 1
+        self._changed.notify_all()
+        raise LLMBusyError(max(1, round(len(self._queue) / self.requests.rate)),
+                           'Timed out waiting for LLM capacity')
+
+    def acquire(self, priority, tokens):
+        """Block until the call may proceed, or raise LLMBusyError"""
+        if not self.enabled:
+            return
+        ticket = self._enqueue(priority, tokens)
+        deadline = ticket[3] + self.max_wait
+
+        with self._lock:
+            while True:
+                wait = self._try_admit(ticket)
+                if wait == 0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._give_up(ticket)
+                self._changed.wait(min(remaining, wait or remaining))
+
+    def try_acquire(self, priority, tokens):
+        """Admit immediately if nothing is queued and both buckets allow, without waiting"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self._queue or self.requests.wait_time(1, now) or self.tokens.wait_time(tokens, now):
+                return False
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.admitted[PRIORITY_NAMES[priority]] += 1
+            return True
+
+    async def acquire_async(self, priority, tokens):
+        """Coroutine version of acquire; polls instead of blocking the event loop"""
+        if not self.enabled:
+            return
+        ticket = self._enqueue(priority, tokens)
+        deadline = ticket[3] + self.max_wait
+
+        while True:
+            with self._lock:
+                wait = self._try_admit(ticket)
+                if wait == 0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._give_up(ticket)
+            await asyncio.sleep(min(remaining, wait or 0.05, 0.25))
+
+    def report_quota_exceeded(self):
+        """Upstream said 429: stop admitting until the buckets refill"""
+        with self._lock:
+            self.requests.drain()
+            self.tokens.drain()
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for ticket in self._queue:
+                depth[PRIORITY_NAMES[ticket[0]]] += 1
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 3) if waits else 0.0
+
+        return {
+            'enabled': self.enabled,
+            'quota_share': {
+                'workers': self.workers,
+                'requests_per_minute': round(self.requests.capacity, 2),
+                'tokens_per_minute': round(self.tokens.capacity)
+            },
+            'queue_depth': depth,
+            'admitted': dict(self.admitted),
+            'rejected': dict(self.rejected),
+            'wait_seconds': {'p50': pct(0.5), 'p95': pct(0.95), 'max': round(waits[-1], 3) if waits else 0.0}
+        }
+
+
+scheduler = LLMScheduler()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Production server for NoteMaster AI
+Runs create_app() under gunicorn with a pool of worker processes.
+
+    python serve.py                      # settings from config.py / .env
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:8000
+
+Deploying new code without dropping requests depends on preloading:
+
+- With --no-preload (SERVER_PRELOAD=false) every worker imports the app
+  itself, so SIGHUP to the master replaces the workers gracefully and they
+  run the new code.
+- With preloading (the default) workers are forked from the master's
+  already-imported app, so SIGHUP restarts them on the OLD code. Upgrade
+  the master instead: SIGUSR2 starts a new master from the new code next
+  to the old one (its pid goes to SERVER_PIDFILE + ".2"), then SIGWINCH
+  and SIGQUIT retire the old master, and the new one takes over the pidfile.
+"""
+
+import argparse
+import os
+
+from gunicorn.app.base import BaseApplication
+
+# The app itself is imported in load(), not here: without preloading, the
+# workers HUP starts must import the code they serve, not inherit the copy
+# this master imported when it booted
+from config import Config
+
+
+class NoteMasterServer(BaseApplication):
+    """Gunicorn application that serves the Flask app factory"""
+
+    def __init__(self, options):
+        self.options = options
+        self.application = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        if self.application is None:
+            from app import create_app
+
+            class ServeConfig(Config):
+                # Each worker's LLM scheduler admits its share of the one account quota
+                LLM_QUOTA_WORKERS = Config.LLM_QUOTA_WORKERS if 'LLM_QUOTA_WORKERS' in os.environ \
+                    else self.options['workers']
+
+            self.application = create_app(ServeConfig)
+        return self.application
+
+
+def post_fork(server, worker):
+    """Give each worker its own SQLite connections instead of the master's"""
+    app = server.app.application
+    if app is not None:
+        from models import db
+        from workspaces import workspaces
+
+        with app.app_context():
+            db.engine.dispose()
+            workspaces.dispose_all()
+
+
+def build_options(args):
+    """Merge command line overrides onto the configured server settings"""
+    return {
+        'bind': args.bind or Config.SERVER_BIND,
+        'workers': args.workers or Config.SERVER_WORKERS,
+        'threads': args.threads or Config.SERVER_THREADS,
+        'worker_class': 'gthread',
+        'keepalive': args.keepalive or Config.SERVER_KEEPALIVE,
+        'timeout': args.timeout or Config.SERVER_TIMEOUT,
+        'graceful_timeout': Config.SERVER_GRACEFUL_TIMEOUT,
+        'preload_app': Config.SERVER_PRELOAD if args.preload is None else args.preload,
+        'max_requests': Config.SERVER_MAX_REQUESTS,
+        'max_requests_jitter': Config.SERVER_MAX_REQUESTS // 10,
+        'pidfile': Config.SERVER_PIDFILE,
+        'post_fork': post_fork,
+        'accesslog': '-',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run NoteMaster AI under gunicorn')
+    parser.add_argument('--bind', help='host:port to listen on')
+    parser.add_argument('--workers', type=int, help='number of worker processes')
+    parser.add_argument('--threads', type=int, help='threads per worker')
+    parser.add_argument('--keepalive', type=int, help='seconds to hold idle keep-alive connections')
+    parser.add_argument('--timeout', type=int, help='seconds before a silent worker is restarted')
+    parser.add_argument('--preload', dest='preload', action='store_true', default=None,
+                        help='load the app before forking workers')
+    parser.add_argument('--no-preload', dest='preload', action='store_false')
+    args = parser.parse_args()
+
+    options = build_options(args)
+
+    print("=" * 60)
+    print(" NoteMaster AI-V1 (production) is starting...")
+    print(f" Listening on {options['bind']} with {options['workers']} workers x {options['threads']} threads")
+    print("=" * 60)
+
+    NoteMasterServer(options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark for NoteMaster AI
+Measures cold-start cost in fresh interpreters: import time per module
+(from `python -X importtime`) and time from process start to the first
+served request. Exits non-zero when a budget is exceeded so it can gate CI.
+
+    python startup_benchmark.py
+    python startup_benchmark.py --runs 5 --budget-first-request 1200
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Regression budgets (milliseconds, median of --runs cold starts)
+IMPORT_BUDGET_MS = 800
+FIRST_REQUEST_BUDGET_MS = 1500
+
+# Modules that must stay out of a cold start; they load on first use
+LAZY_MODULES = ['google.generativeai', 'PyPDF2']
+
+PROJECT_MODULES = ['app', 'config', 'models', 'routes', 'utils', 'cache']
+
+FIRST_REQUEST_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get('/api/tags')
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - started) * 1000,
+    'status': response.status_code,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def module_import_times(env):
+    """Cumulative import time (ms) per module from one cold `import app`"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        try:
+            times[name.strip()] = int(cumulative) / 1000
+        except ValueError:
+            continue  # header line
+    return times
+
+
+def cold_start(env):
+    script = FIRST_REQUEST_SCRIPT % (LAZY_MODULES,)
+    result = subprocess.run([sys.executable, '-c', script], env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure NoteMaster AI cold-start time')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--budget-import', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--budget-first-request', type=float, default=FIRST_REQUEST_BUDGET_MS)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='notemaster-startup-')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'startup.db')}")
+
+    print("=" * 60)
+    print("⏱️  NoteMaster AI - Startup Benchmark")
+    print("=" * 60)
+
+    times = module_import_times(env)
+    print("\n📦 Import time (cumulative, ms):")
+    for name in PROJECT_MODULES:
+        if name in times:
+            print(f"  {name:<24} {times[name]:>8.1f}")
+    heaviest = sorted((t, n) for n, t in times.items() if '.' not in n and n not in PROJECT_MODULES)
+    for t, name in reversed(heaviest[-5:]):
+        print(f"  {name:<24} {t:>8.1f}  (third-party)")
+
+    # The first run creates the schema; later runs measure the steady state
+    runs = [cold_start(env) for _ in range(args.runs + 1)]
+    first_boot, runs = runs[0], runs[1:]
+
+    import_ms = median(r['import_ms'] for r in runs)
+    create_ms = median(r['create_app_ms'] for r in runs)
+    first_request_ms = median(r['first_request_ms'] for r in runs)
+
+    print(f"\n🚀 Cold start (median of {args.runs}):")
+    print(f"  import app               {import_ms:>8.1f}")
+    print(f"  create_app()             {create_ms:>8.1f}   (first boot with schema creation: "
+          f"{first_boot['create_app_ms']:.1f})")
+    print(f"  time to first request    {first_request_ms:>8.1f}")
+
+    failures = []
+    if import_ms > args.budget_import:
+        failures.append(f"import {import_ms:.0f} ms > budget {args.budget_import:.0f} ms")
+    if first_request_ms > args.budget_first_request:
+        failures.append(f"first request {first_request_ms:.0f} ms > budget {args.budget_first_request:.0f} ms")
+    for name in sorted({name for r in runs for name in r['loaded']}):
+        failures.append(f"{name} was imported during startup")
+    if any(r['status'] != 200 for r in runs):
+        failures.append("first request did not return 200")
+
+    print("\n" + "=" * 60)
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        print("=" * 60)
+        sys.exit(1)
+
+    print("✅ Startup within budget")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,19 @@
 let currentNoteId = null;
 let allNotes = [];
 let allTags = [];
+let chatOlderBefore = null;  // id to fetch the next older chat page from, null when none left
+let chatLoadingOlder = false;
+
+// Pages served under /w/<name>/ talk to that workspace's API
+const workspacePrefix = (location.pathname.match(/^\/w\/[^/]+/) || [''])[0];
+
+function apiUrl(path) {
+    return workspacePrefix + path;
+}
+
+function apiFetch(path, options) {
+    return fetch(apiUrl(path), options);
+}
 
 // DOM Elements
 const elements = {
@@ -147,6 +160,9 @@ function setupEventListeners() {
     elements.chatInput.addEventListener('keypress', (e) => {
         if (e.key === 'Enter') sendChatMessage();
     });
+    elements.chatMessages.addEventListener('scroll', () => {
+        if (elements.chatMessages.scrollTop < 50) loadOlderChatMessages();
+    });
     
     // Close modal on background click
     elements.noteModal.addEventListener('click', (e) => {
@@ -225,13 +241,7 @@ async function summarizeNotes() {
         
         // Check if using file upload
         if (!elements.fileInput.classList.contains('hidden') && elements.fileUpload.files.length > 0) {
-            const formData = new FormData();
-            formData.append('file', elements.fileUpload.files[0]);
-            
-            response = await fetch('/api/summarize', {
-                method: 'POST',
-                body: formData
-            });
+            response = await uploadFileResumable(elements.fileUpload.files[0]);
         } else {
             // Use text input
             const notes = elements.notesInput.value.trim();
@@ -241,7 +251,7 @@ async function summarizeNotes() {
                 return;
             }
             
-            response = await fetch('/api/summarize', {
+            response = await apiFetch('/api/summarize', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -257,8 +267,8 @@ async function summarizeNotes() {
             return;
         }
         
-        // Display summary
-        elements.summaryOutput.innerHTML = formatSummary(data.summary);
+        // Display summary (rendered and sanitized by the server when the note was saved)
+        elements.summaryOutput.innerHTML = data.summary_html;
         elements.outputSection.classList.remove('hidden');
         currentNoteId = data.note_id;
         
@@ -274,25 +284,52 @@ async function summarizeNotes() {
     }
 }
 
-// Format summary with better styling
-function formatSummary(text) {
-    // Convert markdown-style bullets to HTML
-    return text
-        .split('\n')
-        .map(line => {
-            line = line.trim();
-            if (line.startsWith('•') || line.startsWith('-') || line.startsWith('*')) {
-                return `<p class="ml-4 mb-2">• ${line.substring(1).trim()}</p>`;
-            } else if (line.startsWith('#')) {
-                const level = line.match(/^#+/)[0].length;
-                const content = line.replace(/^#+\s*/, '');
-                return `<h${level} class="font-bold mt-4 mb-2">${content}</h${level}>`;
-            } else if (line) {
-                return `<p class="mb-2">${line}</p>`;
+// Upload a file in chunks, resuming from the server's offset after a dropped chunk,
+// then complete it; resolves to the summarize response
+async function uploadFileResumable(file) {
+    const start = await apiFetch('/api/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    if (!start.ok) {
+        return start;
+    }
+    
+    const upload = await start.json();
+    let offset = upload.offset;
+    let failures = 0;
+    
+    while (offset < file.size) {
+        try {
+            const chunk = await apiFetch(`/api/uploads/${upload.upload_id}`, {
+                method: 'PUT',
+                headers: { 'Upload-Offset': String(offset) },
+                body: file.slice(offset, offset + upload.chunk_size)
+            });
+            const data = await chunk.json();
+            if (chunk.ok || data.offset !== undefined) {
+                // On a 409 the server says where to carry on from
+                offset = data.offset;
+                failures = chunk.ok ? 0 : failures + 1;
+            } else {
+                return new Response(JSON.stringify(data), { status: chunk.status });
+            }
+        } catch (error) {
+            // Network drop: ask how far the server got and resend only the rest
+            failures += 1;
+            await new Promise(resolve => setTimeout(resolve, Math.min(1000 * 2 ** failures, 15000)));
+            const status = await apiFetch(`/api/uploads/${upload.upload_id}`).catch(() => null);
+            if (status && status.ok) {
+                offset = (await status.json()).offset;
             }
-            return '';
-        })
-        .join('');
+        }
+        if (failures > 5) {
+            throw new Error('Upload failed');
+        }
+    }
+    
+    return apiFetch(`/api/uploads/${upload.upload_id}/complete`, { method: 'POST' });
 }
 
 // Copy summary
@@ -333,24 +370,47 @@ async function saveNote() {
 // Tags
 async function loadTags() {
     try {
-        const response = await fetch('/api/tags');
+        const response = await apiFetch('/api/tags');
         const data = await response.json();
         allTags = data.tags;
         
         // Update tag select
         elements.tagSelect.innerHTML = '<option value="">Select a tag...</option>';
-        elements.tagFilter.innerHTML = '<option value="">All Tags</option>';
         
         allTags.forEach(tag => {
-            const option = new Option(tag.name, tag.id);
-            elements.tagSelect.add(option.cloneNode(true));
-            elements.tagFilter.add(option);
+            elements.tagSelect.add(new Option(tag.name, tag.id));
         });
+        
+        renderTagFilter(allTags);
     } catch (error) {
         console.error('Error loading tags:', error);
     }
 }
 
+// Tag filter with note counts, keeping the current selection
+function renderTagFilter(tags) {
+    const selected = elements.tagFilter.value;
+    elements.tagFilter.innerHTML = '<option value="">All Tags</option>';
+    
+    tags.forEach(tag => {
+        elements.tagFilter.add(new Option(`${tag.name} (${tag.note_count})`, tag.id));
+    });
+    
+    elements.tagFilter.value = selected;
+}
+
+// Refresh facet counts for the current search
+async function loadTagCounts(searchTerm) {
+    try {
+        const url = searchTerm ? `/api/tags?search=${encodeURIComponent(searchTerm)}` : '/api/tags';
+        const response = await apiFetch(url);
+        const data = await response.json();
+        renderTagFilter(data.tags);
+    } catch (error) {
+        console.error('Error loading tag counts:', error);
+    }
+}
+
 async function createNewTag() {
     const name = elements.newTagName.value.trim();
     const color = elements.newTagColorHex.value;
@@ -361,7 +421,7 @@ async function createNewTag() {
     }
     
     try {
-        const response = await fetch('/api/tags', {
+        const response = await apiFetch('/api/tags', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -395,7 +455,7 @@ async function addTagToNote() {
     }
     
     try {
-        const response = await fetch(`/api/notes/${currentNoteId}/tags`, {
+        const response = await apiFetch(`/api/notes/${currentNoteId}/tags`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -410,7 +470,7 @@ async function addTagToNote() {
         }
         
         // Refresh note to show new tag
-        const noteResponse = await fetch(`/api/notes/${currentNoteId}`);
+        const noteResponse = await apiFetch(`/api/notes/${currentNoteId}`);
         const noteData = await noteResponse.json();
         displayNoteTags(noteData.tags);
         
@@ -441,7 +501,7 @@ async function removeTag(tagId) {
     if (!currentNoteId) return;
     
     try {
-        await fetch(`/api/notes/${currentNoteId}/tags`, {
+        await apiFetch(`/api/notes/${currentNoteId}/tags`, {
             method: 'DELETE',
             headers: {
                 'Content-Type': 'application/json'
@@ -449,7 +509,7 @@ async function removeTag(tagId) {
             body: JSON.stringify({ tag_id: tagId })
         });
         
-        const noteResponse = await fetch(`/api/notes/${currentNoteId}`);
+        const noteResponse = await apiFetch(`/api/notes/${currentNoteId}`);
         const noteData = await noteResponse.json();
         displayNoteTags(noteData.tags);
         
@@ -468,7 +528,7 @@ async function loadNotes() {
         if (searchTerm) url += `search=${encodeURIComponent(searchTerm)}&`;
         if (tagId) url += `tag_id=${tagId}&`;
         
-        const response = await fetch(url);
+        const response = await apiFetch(url);
         const data = await response.json();
         allNotes = data.notes;
         
@@ -500,8 +560,6 @@ function displayNotes(notes) {
 function createNoteCard(note) {
     const card = document.createElement('div');
     
-    // Truncate summary for preview (remove HTML tags)
-    const preview = note.summary.replace(/<[^>]*>?/gm, '').substring(0, 100) + '...';
     const date = new Date(note.created_at).toLocaleDateString();
     
     card.className = "group glass rounded-2xl p-6 hover:bg-white/5 transition-all cursor-pointer border border-white/5 hover:border-primary-500/30 hover:-translate-y-1 relative overflow-hidden";
@@ -516,7 +574,7 @@ function createNoteCard(note) {
                 <span class="text-xs text-slate-500 font-mono">${date}</span>
             </div>
             <h3 class="text-lg font-bold text-white mb-2 line-clamp-1">${note.title}</h3>
-            <p class="text-slate-400 text-sm mb-4 h-10 overflow-hidden">${preview}</p>
+            <p class="note-preview text-slate-400 text-sm mb-4 h-10 overflow-hidden"></p>
             <div class="flex gap-2 flex-wrap">
                 ${note.tags.map(tag => `
                     <span class="px-2 py-1 bg-dark-800 rounded-md text-xs text-slate-300 border border-white/5" style="background-color: ${tag.color}22; color: ${tag.color}">
@@ -527,6 +585,8 @@ function createNoteCard(note) {
         </div>
     `;
     
+    // Plain text from the server, so it goes in as text rather than markup
+    card.querySelector('.note-preview').textContent = note.summary_preview;
     card.onclick = () => openNoteModal(note.id);
     
     return card;
@@ -534,17 +594,18 @@ function createNoteCard(note) {
 
 function filterNotes() {
     loadNotes();
+    loadTagCounts(elements.searchInput.value.trim());
 }
 
 // Note Modal
 async function openNoteModal(noteId) {
     try {
-        const response = await fetch(`/api/notes/${noteId}`);
+        const response = await apiFetch(`/api/notes/${noteId}`);
         const note = await response.json();
         
         currentNoteId = noteId;
         elements.modalTitle.textContent = note.title;
-        elements.summaryContent.innerHTML = formatSummary(note.summary);
+        elements.summaryContent.innerHTML = note.summary_html;
         elements.originalText.textContent = note.original_content;
         
         // Display tags
@@ -601,8 +662,9 @@ function showModalTab(tab) {
 
 // Chat
 async function loadChatHistory(noteId) {
+    chatOlderBefore = null;
     try {
-        const response = await fetch(`/api/notes/${noteId}/chat`);
+        const response = await apiFetch(`/api/notes/${noteId}/chat`);
         const data = await response.json();
         
         elements.chatMessages.innerHTML = '';
@@ -615,6 +677,7 @@ async function loadChatHistory(noteId) {
         data.messages.forEach(msg => {
             addChatMessage(msg.role, msg.content);
         });
+        chatOlderBefore = data.next_before;
         
         elements.chatMessages.scrollTop = elements.chatMessages.scrollHeight;
         
@@ -623,6 +686,33 @@ async function loadChatHistory(noteId) {
     }
 }
 
+// Prepend the next older page, keeping the visible messages where they are
+async function loadOlderChatMessages() {
+    if (chatOlderBefore === null || chatLoadingOlder || !currentNoteId) return;
+    
+    chatLoadingOlder = true;
+    const noteId = currentNoteId;
+    try {
+        const response = await apiFetch(`/api/notes/${noteId}/chat?before=${chatOlderBefore}`);
+        const data = await response.json();
+        if (!response.ok || noteId !== currentNoteId) return;
+        
+        const container = elements.chatMessages;
+        const previousHeight = container.scrollHeight;
+        const firstMessage = container.firstChild;
+        data.messages.forEach(msg => {
+            container.insertBefore(createChatMessage(msg.role, msg.content), firstMessage);
+        });
+        container.scrollTop += container.scrollHeight - previousHeight;
+        chatOlderBefore = data.next_before;
+        
+    } catch (error) {
+        console.error('Error loading older chat messages:', error);
+    } finally {
+        chatLoadingOlder = false;
+    }
+}
+
 async function sendChatMessage() {
     const question = elements.chatInput.value.trim();
     
@@ -646,7 +736,7 @@ async function sendChatMessage() {
     elements.chatMessages.scrollTop = elements.chatMessages.scrollHeight;
     
     try {
-        const response = await fetch(`/api/notes/${currentNoteId}/chat`, {
+        const response = await apiFetch(`/api/notes/${currentNoteId}/chat`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -676,7 +766,7 @@ async function sendChatMessage() {
     }
 }
 
-function addChatMessage(role, content) {
+function createChatMessage(role, content) {
     const msgDiv = document.createElement('div');
     msgDiv.className = `flex ${role === 'user' ? 'justify-end' : 'justify-start'}`;
     
@@ -687,8 +777,11 @@ function addChatMessage(role, content) {
             <p class="text-sm whitespace-pre-wrap">${content}</p>
         </div>
     `;
-    
-    elements.chatMessages.appendChild(msgDiv);
+    return msgDiv;
+}
+
+function addChatMessage(role, content) {
+    elements.chatMessages.appendChild(createChatMessage(role, content));
     elements.chatMessages.scrollTop = elements.chatMessages.scrollHeight;
 }
 
@@ -699,7 +792,7 @@ async function deleteNote() {
     if (!confirm('Are you sure you want to delete this note?')) return;
     
     try {
-        const response = await fetch(`/api/notes/${currentNoteId}`, {
+        const response = await apiFetch(`/api/notes/${currentNoteId}`, {
             method: 'DELETE'
         });
         
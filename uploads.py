@@ -0,0 +1,247 @@
+"""
+Resumable chunked uploads, spooled to disk.
+
+A client creates an upload with the file name and size, PUTs the bytes in
+chunks at explicit offsets, and completes it once every byte has arrived.
+Each chunk is streamed from the request into the spool file in small
+blocks while it is hashed, so a worker never holds more than one block in
+memory. The spool file's length is the upload's offset: a chunk that fails
+its checksum or whose connection drops is truncated away, and the client
+asks for the offset and resends from there.
+
+Spool files live in UPLOAD_DIR (default instance/uploads) with a JSON
+sidecar, so any worker can take the next chunk of an upload. Each
+workspace has its own subdirectory, so an upload id only resolves in the
+workspace that created it. A client address may hold UPLOAD_MAX_PER_CLIENT
+unfinished uploads, and all of them together may declare at most
+UPLOAD_SPOOL_MAX_BYTES; unfinished uploads expire after UPLOAD_EXPIRY_HOURS.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from flask import current_app
+
+from workspaces import current_workspace
+
+BLOCK_SIZE = 64 * 1024
+
+# Whole-file SHA-256 state for uploads whose chunks this process has
+# received in order, so completing them needs no second read of the file.
+_hashers = {}
+
+
+class UploadError(Exception):
+    """Raised for upload requests that cannot be applied; carries the HTTP status"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def _root():
+    return current_app.config.get('UPLOAD_DIR') or os.path.join(current_app.instance_path, 'uploads')
+
+
+def upload_dir():
+    """Spool directory of the current workspace"""
+    name = current_workspace()
+    return os.path.join(_root(), 'workspaces', name) if name else _root()
+
+
+def _all_files():
+    """Paths of every spool and sidecar file, in every workspace"""
+    for directory, _, names in os.walk(_root()):
+        for name in names:
+            if name.endswith(('.part', '.json')):
+                yield os.path.join(directory, name)
+
+
+def _paths(upload_id):
+    # Ids are generated hex; anything else cannot name a spool file
+    if not upload_id or any(c not in '0123456789abcdef' for c in upload_id):
+        raise UploadError('Upload not found', 404)
+    base = os.path.join(upload_dir(), upload_id)
+    return base + '.part', base + '.json'
+
+
+def _read_meta(upload_id):
+    spool, meta_path = _paths(upload_id)
+    try:
+        with open(meta_path) as f:
+            return spool, json.load(f)
+    except FileNotFoundError:
+        raise UploadError('Upload not found', 404)
+
+
+def expire_uploads():
+    """Remove uploads that have not been completed within UPLOAD_EXPIRY_HOURS"""
+    cutoff = time.time() - current_app.config['UPLOAD_EXPIRY_HOURS'] * 3600
+    removed = 0
+    for path in _all_files():
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            continue  # removed by another worker
+        name = os.path.basename(path)
+        _hashers.pop(name.split('.')[0], None)
+        removed += name.endswith('.json')
+    return removed
+
+
+def _check_quota(size, client):
+    """Raise UploadError if a new upload of `size` bytes would exceed the client or spool limits"""
+    held, reserved = 0, 0
+    for path in _all_files():
+        if not path.endswith('.json'):
+            continue
+        try:
+            with open(path) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        reserved += meta['size']
+        held += meta.get('client') == client
+
+    if held >= current_app.config['UPLOAD_MAX_PER_CLIENT']:
+        raise UploadError('Too many unfinished uploads. Complete or cancel one first.', 429)
+    if reserved + size > current_app.config['UPLOAD_SPOOL_MAX_BYTES']:
+        raise UploadError('Upload storage is full. Please try again later.', 507)
+
+
+def create_upload(filename, size, sha256=None, client=None):
+    """Start an upload for `client` (its address) and return its status"""
+    if size <= 0:
+        raise UploadError('The file is empty')
+    if size > current_app.config['UPLOAD_MAX_SIZE']:
+        raise UploadError(f"Files are limited to {current_app.config['UPLOAD_MAX_SIZE'] // (1024 * 1024)} MB", 413)
+
+    expire_uploads()
+    os.makedirs(upload_dir(), exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    spool, meta_path = _paths(upload_id)
+    meta = {'filename': filename, 'size': size, 'sha256': sha256.lower() if sha256 else None,
+            'client': client, 'created_at': time.time()}
+
+    # One check-and-reserve at a time, across workers
+    with open(os.path.join(_root(), '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _check_quota(size, client)
+        open(spool, 'wb').close()
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+    _hashers[upload_id] = (0, hashlib.sha256())
+    return upload_status(upload_id)
+
+
+def upload_status(upload_id):
+    spool, meta = _read_meta(upload_id)
+    return {
+        'upload_id': upload_id,
+        'filename': meta['filename'],
+        'size': meta['size'],
+        'offset': os.path.getsize(spool),
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE']
+    }
+
+
+def write_chunk(upload_id, offset, stream, length, checksum=None):
+    """Append a chunk read from `stream` at `offset` and return the new offset
+
+    The chunk must start where the spool file ends; otherwise UploadError(409)
+    reports the offset to resume from. With `checksum` (hex SHA-256 of the
+    chunk) a corrupted chunk is rejected and dropped.
+    """
+    spool, meta = _read_meta(upload_id)
+    if length is None:
+        raise UploadError('Chunks need a Content-Length', 411)
+
+    with open(spool, 'r+b') as f:
+        # One writer per upload; a duplicate retry waits and then sees the new offset
+        fcntl.flock(f, fcntl.LOCK_EX)
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise UploadError(f'Expected a chunk at offset {current}', 409, offset=current)
+        if offset + length > meta['size']:
+            raise UploadError('Chunk runs past the declared file size', 416, offset=current)
+
+        chunk_hash = hashlib.sha256()
+        position, hasher = _hashers.get(upload_id, (None, None))
+        if position != offset:
+            hasher = None
+        if hasher is not None:
+            hasher = hasher.copy()  # only committed once the chunk is accepted
+
+        f.seek(offset)
+        received = 0
+        try:
+            while received < length:
+                block = stream.read(min(BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                f.write(block)
+                chunk_hash.update(block)
+                if hasher is not None:
+                    hasher.update(block)
+                received += len(block)
+
+            if received != length:
+                raise UploadError('Chunk ended early', 400, offset=offset)
+            if checksum and chunk_hash.hexdigest() != checksum.lower():
+                raise UploadError('Chunk checksum mismatch', 422, offset=offset)
+        except BaseException:
+            f.truncate(offset)
+            raise
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    if hasher is not None:
+        _hashers[upload_id] = (offset + length, hasher)
+    return offset + length
+
+
+def file_sha256(upload_id, spool):
+    """SHA-256 of the finished file, from the running hash when this process has it"""
+    position, hasher = _hashers.pop(upload_id, (None, None))
+    if hasher is not None and position == os.path.getsize(spool):
+        return hasher.hexdigest()
+
+    digest = hashlib.sha256()
+    with open(spool, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finish_upload(upload_id):
+    """Verify a fully received upload and return (filename, spool path, sha256)
+
+    The caller owns the spool file afterwards and removes it with discard_upload().
+    """
+    spool, meta = _read_meta(upload_id)
+    received = os.path.getsize(spool)
+    if received != meta['size']:
+        raise UploadError(f"Upload is incomplete: {received:,} of {meta['size']:,} bytes received",
+                          409, offset=received)
+
+    sha256 = file_sha256(upload_id, spool)
+    if meta['sha256'] and sha256 != meta['sha256']:
+        discard_upload(upload_id)
+        raise UploadError('File checksum mismatch; please upload the file again', 422)
+    return meta['filename'], spool, sha256
+
+
+def discard_upload(upload_id):
+    _hashers.pop(upload_id, None)
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
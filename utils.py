@@ -1,32 +1,219 @@
-import google.generativeai as genai
+import asyncio
+import hashlib
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
-import PyPDF2
+from markupsafe import escape
 from io import BytesIO
+from scheduler import scheduler, INTERACTIVE, BATCH
+from resilience import resilience, CircuitOpenError
+from context_cache import context_cache
 
+# google.generativeai and PyPDF2 are imported inside the functions that use
+# them: together they are most of the app's import time, and many processes
+# (cold starts, CLI tools, read-only requests) never call either.
 
-def configure_gemini():
-    """Configure Gemini AI with API key"""
+
+def configure_gemini(model_name=None):
+    """Configure Gemini AI with API key, for GEMINI_MODEL unless another model is named"""
     try:
+        if current_app.config.get('LLM_BACKEND') == 'stub':
+            from llm_stub import StubModel
+            return StubModel(
+                current_app.config['LLM_STUB_LATENCY'],
+                error_rate=current_app.config.get('LLM_STUB_ERROR_RATE', 0),
+                slow_rate=current_app.config.get('LLM_STUB_SLOW_RATE', 0),
+                prefill_per_1k=current_app.config.get('LLM_STUB_PREFILL_PER_1K', 0)
+            )
+        
+        import google.generativeai as genai
+        
         api_key = current_app.config['GEMINI_API_KEY']
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in configuration")
         
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(current_app.config['GEMINI_MODEL'])
+        model = genai.GenerativeModel(model_name or current_app.config['GEMINI_MODEL'])
         return model
     except Exception as e:
         current_app.logger.error(f"Error configuring Gemini AI: {e}")
         return None
 
 
-def generate_summary(notes_text):
-    """Generate a summary of the provided notes using Gemini AI"""
-    model = configure_gemini()
+def _require_model(model_name=None):
+    model = configure_gemini(model_name)
     
     if not model:
         raise Exception("Gemini AI is not properly configured. Please check your API key.")
     
-    prompt = f"""You are an expert study assistant. Analyze the following study notes and create a comprehensive, well-organized summary.
+    return model
+
+
+class PromptTooLargeError(Exception):
+    """Raised before any network I/O when a prompt exceeds every configured model's budget"""
+    
+    status = 413
+    
+    def __init__(self, tokens, limit):
+        super().__init__(f"This request is about {tokens:,} tokens, over the {limit:,}-token limit. "
+                         "Please shorten it and try again.")
+        self.tokens = tokens
+        self.limit = limit
+
+
+# Words cost about one token per four letters; digits and symbols (and
+# non-Latin characters) are mostly one token each.
+_TOKEN_PIECES = re.compile(r'[A-Za-z]+|\S')
+
+
+def estimate_tokens(prompt):
+    """Local token estimate, used for routing, budgets and rate limiting"""
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_PIECES.findall(prompt)) + 1
+
+
+def model_routes():
+    """(max_input_tokens, model) rules in order, ending with GEMINI_MODEL at LLM_MAX_INPUT_TOKENS"""
+    return list(current_app.config.get('LLM_MODEL_ROUTES', [])) + [
+        (current_app.config.get('LLM_MAX_INPUT_TOKENS', 1_000_000), current_app.config['GEMINI_MODEL'])
+    ]
+
+
+def select_model(tokens):
+    """Name of the first routed model whose input budget fits, or PromptTooLargeError"""
+    routes = model_routes()
+    for max_tokens, model_name in routes:
+        if tokens <= max_tokens:
+            return model_name
+    raise PromptTooLargeError(tokens, max(limit for limit, _ in routes))
+
+
+def record_usage(usage, model_name, prompt_tokens, response, cached_tokens=0):
+    """Add one call's token counts to a caller's usage dict (Gemini's counts when reported)
+
+    prompt_tokens includes any tokens served from a context cache; cached_tokens is that share.
+    """
+    if cached_tokens:
+        metadata = getattr(response, 'usage_metadata', None)
+        cached_tokens = getattr(metadata, 'cached_content_token_count', None) or cached_tokens
+        context_cache.record_cached_tokens(cached_tokens)
+    if usage is None:
+        return
+    metadata = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(metadata, 'prompt_token_count', None) or prompt_tokens
+    response_tokens = getattr(metadata, 'candidates_token_count', None) or estimate_tokens(response.text or '')
+    usage['model'] = model_name
+    usage['prompt_tokens'] = usage.get('prompt_tokens', 0) + prompt_tokens
+    usage['response_tokens'] = usage.get('response_tokens', 0) + response_tokens
+    usage['cached_tokens'] = usage.get('cached_tokens', 0) + cached_tokens
+
+
+def _is_quota_error(error):
+    return 'quota' in str(error).lower() or '429' in str(error)
+
+
+def _cached_prefix(prompt, prefix, cache_key, model_name, model):
+    """Bind the model to a context cache for `prefix` when the prompt starts with it"""
+    if cache_key is None or not prefix or not prompt.startswith(prefix):
+        return None
+    return context_cache.bind(cache_key, prefix, model_name, model, estimate_tokens(prefix))
+
+
+async def _cached_prefix_async(prompt, prefix, cache_key, model_name, model):
+    if cache_key is None or not prefix or not prompt.startswith(prefix):
+        return None
+    return await context_cache.bind_async(cache_key, prefix, model_name, model, estimate_tokens(prefix))
+
+
+def _generate(prompt, priority, endpoint, usage=None, cache_key=None, prefix=None):
+    """Route a prompt to a model by size, then send it through the breaker, scheduler and hedging
+
+    With a cache_key, a leading `prefix` of the prompt is served from the
+    context cache (context_cache.py) and only the remainder is sent.
+    """
+    tokens = estimate_tokens(prompt)
+    model_name = select_model(tokens)
+    model = _require_model(model_name)
+    probe = resilience.breaker.check()
+    try:
+        return _send(prompt, priority, endpoint, usage, cache_key, prefix, tokens, model_name, model)
+    except BaseException:
+        # Queueing or cache registration failed before the breaker saw an outcome
+        if probe:
+            resilience.breaker.release()
+        raise
+
+
+def _send(prompt, priority, endpoint, usage, cache_key, prefix, tokens, model_name, model):
+    scheduler.acquire(priority, tokens)
+    cached = _cached_prefix(prompt, prefix, cache_key, model_name, model)
+    served_from_cache = []
+    
+    def send():
+        try:
+            if cached is not None:
+                try:
+                    response = cached.model.generate_content(prompt[len(prefix):])
+                    served_from_cache.append(True)
+                    return response
+                except Exception as e:
+                    if not context_cache.is_missing(e):
+                        raise
+                    context_cache.forget(cached.key)
+            return model.generate_content(prompt)
+        except Exception as e:
+            if _is_quota_error(e):
+                scheduler.report_quota_exceeded()
+            raise
+    
+    response = resilience.call(endpoint, send, lambda: scheduler.try_acquire(priority, tokens))
+    record_usage(usage, model_name, tokens, response, cached.tokens if served_from_cache else 0)
+    return response
+
+
+async def _generate_async(prompt, priority, endpoint, usage=None, cache_key=None, prefix=None):
+    tokens = estimate_tokens(prompt)
+    model_name = select_model(tokens)
+    model = _require_model(model_name)
+    probe = resilience.breaker.check()
+    try:
+        return await _send_async(prompt, priority, endpoint, usage, cache_key, prefix, tokens, model_name, model)
+    except BaseException:
+        if probe:
+            resilience.breaker.release()
+        raise
+
+
+async def _send_async(prompt, priority, endpoint, usage, cache_key, prefix, tokens, model_name, model):
+    await scheduler.acquire_async(priority, tokens)
+    cached = await _cached_prefix_async(prompt, prefix, cache_key, model_name, model)
+    served_from_cache = []
+    
+    async def send():
+        try:
+            if cached is not None:
+                try:
+                    response = await cached.model.generate_content_async(prompt[len(prefix):])
+                    served_from_cache.append(True)
+                    return response
+                except Exception as e:
+                    if not context_cache.is_missing(e):
+                        raise
+                    context_cache.forget(cached.key)
+            return await model.generate_content_async(prompt)
+        except Exception as e:
+            if _is_quota_error(e):
+                scheduler.report_quota_exceeded()
+            raise
+    
+    response = await resilience.call_async(endpoint, send, lambda: scheduler.try_acquire(priority, tokens))
+    record_usage(usage, model_name, tokens, response, cached.tokens if served_from_cache else 0)
+    return response
+
+
+def build_summary_prompt(notes_text):
+    """Build the summarization prompt for a set of notes"""
+    return f"""You are an expert study assistant. Analyze the following study notes and create a comprehensive, well-organized summary.
 
 FORMATTING RULES (VERY IMPORTANT):
 - Use bullet points with the • symbol (NOT asterisks *)
@@ -49,34 +236,254 @@ STUDY NOTES:
 {notes_text}
 
 SUMMARY:"""
-    
-    response = model.generate_content(prompt)
-    
+
+
+def clean_summary(response):
+    """Text of a summary response; rendering.render_summary turns it into HTML when the note is saved"""
     if response and response.text:
-        # Clean up any remaining asterisks or markdown
-        summary = response.text.strip()
-        
-        # Replace common markdown with HTML
-        summary = summary.replace('**', '')  # Remove bold asterisks
-        summary = summary.replace('*', '•')  # Replace any remaining * with bullet
-        summary = summary.replace('___', '')  # Remove underscores
-        summary = summary.replace('__', '')
-        summary = summary.replace('_', '')
-        
-        return summary
+        return response.text.strip()
     else:
         raise Exception("No response received from Gemini AI")
 
 
-def generate_chat_response(note_content, summary, chat_history, user_question):
-    """Generate a chat response based on the note content and chat history"""
-    model = configure_gemini()
+def extractive_summary(notes_text, max_points=8):
+    """Offline fallback summary: the highest-scoring sentences, in their original order"""
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+|\n+', notes_text) if len(s.strip()) > 20]
+    frequencies = Counter(word for word in re.findall(r'[a-z]{4,}', notes_text.lower()))
     
-    if not model:
-        raise Exception("Gemini AI is not properly configured. Please check your API key.")
+    def score(sentence):
+        words = re.findall(r'[a-z]{4,}', sentence.lower())
+        return sum(frequencies[word] for word in words) / (len(words) or 1)
+    
+    best = sorted(sorted(range(len(sentences)), key=lambda i: score(sentences[i]), reverse=True)[:max_points])
+    points = '\n'.join(f'• {escape(sentences[i])}' for i in best) or f'• {escape(notes_text[:300])}'
+    
+    return f'<h3>Key Points (offline summary)</h3>\n{points}'
+
+
+def _summary_fallback(notes_text, error):
+    current_app.logger.warning(f"Serving extractive summary: {error}")
+    resilience.fallback_summaries += 1
+    return extractive_summary(notes_text)
+
+
+def generate_summary(notes_text, usage=None):
+    """Generate a summary of the provided notes using Gemini AI"""
+    try:
+        response = _generate(build_summary_prompt(notes_text), BATCH, 'summary', usage)
+    except CircuitOpenError as e:
+        return _summary_fallback(notes_text, e)
+    return clean_summary(response)
+
+
+# Section boundaries are content-defined (a paragraph whose hash hits the
+# modulus ends its section) so editing one paragraph only changes the
+# section containing it instead of shifting every boundary after it.
+SECTION_BOUNDARY_MODULUS = 4
+SECTION_MAX_CHARS = 4000
+
+
+def split_sections(text):
+    """Split note text into (content_hash, section_text) pairs"""
+    sections, current = [], []
+    
+    def close():
+        if current:
+            section = '\n\n'.join(current)
+            sections.append((hashlib.sha256(section.encode('utf-8')).hexdigest(), section))
+            current.clear()
+    
+    for paragraph in re.split(r'\n\s*\n', text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        current.append(paragraph)
+        digest = hashlib.sha1(paragraph.encode('utf-8')).digest()
+        if digest[0] % SECTION_BOUNDARY_MODULUS == 0 or sum(len(p) for p in current) >= SECTION_MAX_CHARS:
+            close()
+    close()
+    
+    return sections
+
+
+# Sections waiting for a summary are sent several to a call, up to this
+# many characters, so the first edit of a long note costs a few calls
+# instead of one per section.
+SECTION_BATCH_CHARS = 12000
+_SECTION_MARKER = re.compile(r'^\s*\[\[SECTION (\d+)\]\]\s*$', re.MULTILINE)
+
+
+def batch_sections(section_texts, max_chars=SECTION_BATCH_CHARS):
+    """Group consecutive sections into batches of at most max_chars (a larger section goes alone)"""
+    batches, current, size = [], [], 0
+    for section_text in section_texts:
+        if current and size + len(section_text) > max_chars:
+            batches.append(current)
+            current, size = [], 0
+        current.append(section_text)
+        size += len(section_text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_sections_prompt(section_texts):
+    """Prompt that summarizes several numbered sections of a note in one call"""
+    numbered = '\n\n'.join(f'[[SECTION {number}]]\n{section_text}'
+                            for number, section_text in enumerate(section_texts, 1))
+    return f"""You are an expert study assistant. The following study notes are split into {len(section_texts)} numbered sections. Summarize each section on its own.
+
+FORMATTING RULES (VERY IMPORTANT):
+- Use bullet points with the • symbol (NOT asterisks *)
+- Use <strong> tags for emphasis (NOT **bold**)
+- Main headings as <h3> tags
+- No markdown syntax (no *, **, _, __)
+
+OUTPUT FORMAT:
+For every section, in order, write its marker line exactly as given (for example [[SECTION 1]]) and then that section's summary.
+
+STUDY NOTES:
+{numbered}
+
+SECTION SUMMARIES:"""
+
+
+def parse_section_summaries(text, count):
+    """Split a build_sections_prompt response into count summaries; ValueError if any is missing"""
+    parts = _SECTION_MARKER.split(text)
+    found = {int(number): body.strip() for number, body in zip(parts[1::2], parts[2::2])}
+    if sorted(found) != list(range(1, count + 1)) or not all(found.values()):
+        raise ValueError(f'Expected {count} section summaries, got {len(found)}')
+    return [found[number] for number in range(1, count + 1)]
+
+
+def build_merge_prompt(summaries):
+    """Prompt that merges a note's section summaries into one summary"""
+    material = '\n\n'.join(f'--- Part {number} ---\n{summary}' for number, summary in enumerate(summaries, 1))
+    return f"""You are an expert study assistant. The following are summaries of consecutive parts of one set of study notes. Combine them into a single summary of the notes: merge overlapping points, keep every distinct fact, and group related material under shared headings.
+
+FORMATTING RULES (VERY IMPORTANT):
+- Use bullet points with the • symbol (NOT asterisks *)
+- Main headings as <h3> tags
+- Use <strong> tags for emphasis (NOT **bold**)
+- No markdown syntax (no *, **, _, __)
+
+PART SUMMARIES:
+{material}
+
+SUMMARY:"""
+
+
+def _merge_usage(usage, parts):
+    """Add the usage dicts of parallel calls into a caller's usage dict"""
+    if usage is None:
+        return
+    for part in parts:
+        if part:
+            usage['model'] = part['model']
+            for key in ('prompt_tokens', 'response_tokens', 'cached_tokens'):
+                usage[key] = usage.get(key, 0) + part.get(key, 0)
+
+
+def _summarize_batch(batch, usage):
+    """Summaries for one batch of sections, one call per section if the batched reply can't be split"""
+    if len(batch) == 1:
+        return [clean_summary(_generate(build_summary_prompt(batch[0]), BATCH, 'summary', usage))]
+    reply = clean_summary(_generate(build_sections_prompt(batch), BATCH, 'summary', usage))
+    try:
+        return parse_section_summaries(reply, len(batch))
+    except ValueError as e:
+        current_app.logger.warning(f"Summarizing sections one by one: {e}")
+        return [clean_summary(_generate(build_summary_prompt(section_text), BATCH, 'summary', usage))
+                for section_text in batch]
+
+
+def summarize_sections(section_texts, usage=None):
+    """Summarize sections in batches of SECTION_BATCH_CHARS, SECTION_SUMMARY_PARALLELISM batches at a time
+
+    Raises CircuitOpenError instead of falling back, so an extractive
+    summary is never stored as a section summary.
+    """
+    app = current_app._get_current_object()
+    
+    def summarize(batch):
+        with app.app_context():
+            part = {}
+            return _summarize_batch(batch, part), part
     
-    # Build conversation context
-    context = f"""You are a helpful AI study assistant. A student has taken notes and you've summarized them. Now they have a question about their notes.
+    batches = batch_sections(section_texts)
+    if len(batches) == 1:
+        results = [summarize(batches[0])]
+    else:
+        workers = min(app.config.get('SECTION_SUMMARY_PARALLELISM', 4), len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(summarize, batches))
+    _merge_usage(usage, [part for _, part in results])
+    return [summary for summaries, _ in results for summary in summaries]
+
+
+def merge_section_summaries(summaries, usage=None):
+    """Merge per-section summaries, in note order, into one note summary with a single LLM call"""
+    summaries = [summary.strip() for summary in summaries if summary.strip()]
+    if len(summaries) == 1:
+        return summaries[0]
+    return clean_summary(_generate(build_merge_prompt(summaries), BATCH, 'summary', usage))
+
+
+def generate_note_summary(notes_text, usage=None):
+    """Summarize a new note with one LLM call; returns (summary, section content hashes)
+
+    Only the section hashes are stored with the note. Section summaries are
+    made on its first edit, when they are needed to re-summarize part of it.
+    """
+    return generate_summary(notes_text, usage), [content_hash for content_hash, _ in split_sections(notes_text)]
+
+
+async def generate_note_summary_async(notes_text, usage=None):
+    """Async variant of generate_note_summary for the ASGI entry point"""
+    try:
+        response = await _generate_async(build_summary_prompt(notes_text), BATCH, 'summary', usage)
+    except CircuitOpenError as e:
+        summary = _summary_fallback(notes_text, e)
+    else:
+        summary = clean_summary(response)
+    return summary, [content_hash for content_hash, _ in split_sections(notes_text)]
+
+
+def build_digest_prompt(topic, parts):
+    """Prompt that merges note summaries (or partial digests) into one study guide"""
+    material = '\n\n'.join(f"--- {title} ---\n{re.sub(r'<[^>]+>', ' ', text).strip()}" for title, text in parts)
+    return f"""You are an expert study assistant. The following are summaries of a student's notes on "{topic}". Combine them into one study guide: merge overlapping points, keep every distinct fact, and group related material.
+
+FORMATTING RULES (VERY IMPORTANT):
+- Use bullet points with the • symbol (NOT asterisks *)
+- Main headings as <h3> tags
+- Use <strong> tags for emphasis (NOT **bold**)
+- No markdown syntax (no *, **, _, __)
+
+SUMMARIES:
+{material}
+
+STUDY GUIDE:"""
+
+
+def generate_digest(topic, parts):
+    """Merge (title, summary) pairs into one study guide with a single LLM call
+
+    Raises CircuitOpenError instead of falling back, so an extractive guide
+    is never stored as a digest (see digest_fallback).
+    """
+    return clean_summary(_generate(build_digest_prompt(topic, parts), BATCH, 'digest'))
+
+
+def digest_fallback(parts, error):
+    """Extractive study guide from (title, summary) pairs, served while the circuit breaker is open"""
+    return _summary_fallback('\n'.join(re.sub(r'<[^>]+>', ' ', text) for _, text in parts), error)
+
+
+def build_chat_context(note_content, summary):
+    """The part of a note's chat prompt that is identical on every turn"""
+    return f"""You are a helpful AI study assistant. A student has taken notes and you've summarized them. Now they have a question about their notes.
 
 FORMATTING RULES:
 - Do NOT use asterisks (*) for formatting
@@ -91,8 +498,12 @@ ORIGINAL NOTES:
 SUMMARY:
 {summary}
 
-CHAT HISTORY:
 """
+
+
+def build_chat_prompt(note_content, summary, chat_history, user_question):
+    """Build the chat prompt from a note, its summary and the conversation so far"""
+    context = build_chat_context(note_content, summary) + "CHAT HISTORY:\n"
     
     for msg in chat_history:
         role = "Student" if msg['role'] == 'user' else "Assistant"
@@ -100,8 +511,11 @@ CHAT HISTORY:
     
     context += f"\nStudent: {user_question}\n\nAssistant:"
     
-    response = model.generate_content(context)
-    
+    return context
+
+
+def clean_chat_reply(response):
+    """Strip markdown from a chat response"""
     if response and response.text:
         # Clean up formatting
         reply = response.text.strip()
@@ -117,14 +531,95 @@ CHAT HISTORY:
         raise Exception("No response received from Gemini AI")
 
 
-def extract_text_from_pdf(file_storage):
-    """Extract text content from a PDF file"""
+def fit_chat_prompt(note_content, summary, chat_history, user_question):
+    """Chat prompt within the largest model budget, dropping the oldest history first"""
+    limit = max(max_tokens for max_tokens, _ in model_routes())
+    history = list(chat_history)
+    prompt = build_chat_prompt(note_content, summary, history, user_question)
+    while history and estimate_tokens(prompt) > limit:
+        # Drop a whole question/answer pair at a time where possible
+        history = history[2:]
+        prompt = build_chat_prompt(note_content, summary, history, user_question)
+    return prompt
+
+
+def generate_chat_response(note_content, summary, chat_history, user_question, usage=None, note_id=None):
+    """Generate a chat response based on the note content and chat history
+
+    With note_id, the note's part of the prompt is kept in the context cache between turns.
+    """
+    response = _generate(
+        fit_chat_prompt(note_content, summary, chat_history, user_question), INTERACTIVE, 'chat', usage,
+        cache_key=context_cache.note_key(note_id) if note_id is not None else None,
+        prefix=build_chat_context(note_content, summary)
+    )
+    return clean_chat_reply(response)
+
+
+async def generate_chat_response_async(note_content, summary, chat_history, user_question, usage=None,
+                                       note_id=None):
+    """Async variant of generate_chat_response for the ASGI entry point"""
+    response = await _generate_async(
+        fit_chat_prompt(note_content, summary, chat_history, user_question), INTERACTIVE, 'chat', usage,
+        cache_key=context_cache.note_key(note_id) if note_id is not None else None,
+        prefix=build_chat_context(note_content, summary)
+    )
+    return clean_chat_reply(response)
+
+
+def build_corpus_chat_prompt(scope_label, passages, user_question):
+    """Build a chat prompt from passages retrieved across several notes"""
+    excerpts = '\n\n'.join(f"[{title}]\n{content}" for title, content in passages)
+    return f"""You are a helpful AI study assistant. A student is asking about their notes on {scope_label}. Answer using only the excerpts below, and say which notes (by the title in brackets) the answer comes from. If the excerpts do not cover the question, say so.
+
+FORMATTING RULES:
+- Do NOT use asterisks (*) for formatting
+- Use proper punctuation and grammar
+- Be conversational and friendly
+- Keep responses clear and concise
+- No markdown formatting
+
+NOTE EXCERPTS:
+{excerpts}
+
+Student: {user_question}
+
+Assistant:"""
+
+
+def generate_corpus_chat_response(scope_label, passages, user_question):
+    """Answer a question from (title, content) passages of many notes"""
+    response = _generate(build_corpus_chat_prompt(scope_label, passages, user_question), INTERACTIVE, 'chat')
+    return clean_chat_reply(response)
+
+
+def _pdf_text(pdf_reader, max_chars=None):
+    pages, length = [], 0
+    
+    for page in pdf_reader.pages:
+        pages.append(page.extract_text() + "\n")
+        length += len(pages[-1])
+        if max_chars is not None and length >= max_chars:
+            break  # already too long for a note: the length check rejects it
+    
+    return ''.join(pages)
+
+
+def extract_text_from_pdf(file_storage, max_chars=None):
+    """Extract text content from a PDF upload or the path of a spooled PDF
+
+    With max_chars, pages stop being extracted once that many characters are collected.
+    """
     try:
-        pdf_reader = PyPDF2.PdfReader(BytesIO(file_storage.read()))
-        text = ""
+        import PyPDF2
         
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
+        if isinstance(file_storage, str):
+            # Spooled uploads: given a path, PyPDF2 reads the whole file into memory,
+            # but given an open file it seeks and reads objects as pages need them
+            with open(file_storage, 'rb') as f:
+                text = _pdf_text(PyPDF2.PdfReader(f), max_chars)
+        else:
+            text = _pdf_text(PyPDF2.PdfReader(BytesIO(file_storage.read())), max_chars)
         
         if not text.strip():
             raise Exception("Could not extract text from PDF. The file may be empty or image-based.")
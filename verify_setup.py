@@ -2,11 +2,17 @@
 """
 File Structure Verification Script
 Run this to check if your NoteMaster AI setup is correct
+Run with --perf for a performance self-test against latency budgets
 """
 
 import os
 import sys
 
+# --perf: seed a temporary database and time it against latency budgets instead (perf_check.py)
+if '--perf' in sys.argv[1:]:
+    from perf_check import main as perf_main
+    sys.exit(perf_main(sys.argv[1:]))
+
 print("=" * 60)
 print("🔍 NoteMaster AI - File Structure Verification")
 print("=" * 60)
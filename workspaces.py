@@ -0,0 +1,256 @@
+"""
+Workspace-scoped storage: one SQLite file per workspace.
+
+With WORKSPACES_ENABLED, a request selects a workspace with the
+X-Workspace header or a /w/<name>/ URL prefix; without either it uses the
+default database (SQLALCHEMY_DATABASE_URI) as before. Each workspace is
+WORKSPACE_DIR/<name>.db, so writes in one workspace never wait on another
+workspace's file lock.
+
+Workspaces are created ahead of time with `python workspaces.py create
+<name>`; a request for one that does not exist gets a 404, so clients
+cannot create database files. Engines are opened on first use and brought
+up to date with ensure_schema, then kept in an LRU of at most
+WORKSPACE_MAX_ENGINES. An evicted engine is disposed once none of its
+connections is checked out, and each app context keeps the engine it
+started with. db.session binds to the current workspace's engine, so
+models and queries need no changes. Keys of in-process caches go through
+workspace_key() so workspaces never share entries.
+"""
+
+import argparse
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, jsonify, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+
+WORKSPACE_NAME = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+_PATH_PREFIX = re.compile(r'^/w/([^/]+)(/.*)?$')
+ENVIRON_KEY = 'notemaster.workspace'
+
+
+def current_workspace():
+    """Name of the workspace the current app context works in, or None for the default database"""
+    return g.get('workspace') if has_app_context() else None
+
+
+@contextmanager
+def activate(name):
+    """Work in a workspace for the rest of a fresh app context (None is the default database)"""
+    previous = g.get('workspace')
+    g.workspace = name
+    try:
+        yield
+    finally:
+        g.workspace = previous
+
+
+def workspace_key(key):
+    """Namespace a cache key by the current workspace"""
+    name = current_workspace()
+    return f'ws:{name}:{key}' if name else key
+
+
+def split_workspace_path(path):
+    """(workspace, remaining path) for /w/<name>/... paths, else (None, path)"""
+    match = _PATH_PREFIX.match(path)
+    if not match:
+        return None, path
+    return match.group(1), match.group(2) or '/'
+
+
+def current_engine():
+    """Engine of the current workspace, or of the default database"""
+    name = current_workspace()
+    if name is None:
+        from models import db
+        return db.engine
+    # Pinned for the app context, so a request keeps one engine even if the LRU evicts it meanwhile
+    pinned = g.setdefault('workspace_engines', {})
+    if name not in pinned:
+        pinned[name] = current_app.extensions['workspaces'].engine(name)
+    return pinned[name]
+
+
+def _checked_out(engine):
+    checkedout = getattr(engine.pool, 'checkedout', None)
+    return checkedout() if checkedout else 0
+
+
+class WorkspaceSession(Session):
+    """Flask-SQLAlchemy session that talks to the current workspace's database"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and current_workspace() is not None:
+            return current_engine()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class _PathPrefixMiddleware:
+    """Moves a /w/<name> path prefix into SCRIPT_NAME, so routes and url_for work unchanged"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        name, path = split_workspace_path(environ.get('PATH_INFO', ''))
+        if name is not None:
+            environ[ENVIRON_KEY] = name
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + f'/w/{name}'
+            environ['PATH_INFO'] = path
+        return self.wsgi_app(environ, start_response)
+
+
+class WorkspaceEngines:
+    """Lazily opened, LRU-bounded engines for the workspace databases"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._engines = OrderedDict()  # database path: Engine
+        self._retired = []  # evicted engines with connections still checked out
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self.opened = 0
+        self.evictions = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('WORKSPACES_ENABLED', False)
+        self.directory = app.config.get('WORKSPACE_DIR') or os.path.join(app.instance_path, 'workspaces')
+        self.header = app.config.get('WORKSPACE_HEADER', 'X-Workspace')
+        self.max_engines = app.config.get('WORKSPACE_MAX_ENGINES', 32)
+        self.engine_options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        app.extensions['workspaces'] = self
+
+        if self.enabled:
+            app.wsgi_app = _PathPrefixMiddleware(app.wsgi_app)
+            app.before_request(self._select_workspace)
+
+    @staticmethod
+    def valid_name(name):
+        return bool(name) and WORKSPACE_NAME.match(name) is not None
+
+    def requested_workspace(self, prefix_name, header_value):
+        """The workspace a request asks for (the URL prefix wins over the header), or None"""
+        name = prefix_name or header_value
+        return name.strip().lower() if name else None
+
+    def _select_workspace(self):
+        name = self.requested_workspace(request.environ.get(ENVIRON_KEY), request.headers.get(self.header))
+        if name is None:
+            return None
+        if not self.valid_name(name):
+            return jsonify({'error': 'Invalid workspace name. Use lowercase letters, digits, - and _.'}), 400
+        if not self.exists(name):
+            return jsonify({'error': f'Workspace "{name}" does not exist'}), 404
+        g.workspace = name
+
+    def _path(self, name):
+        return os.path.join(self.directory, f'{name}.db')
+
+    def exists(self, name):
+        return os.path.exists(self._path(name))
+
+    def names(self):
+        """Workspaces that have a database file"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory)
+                      if name.endswith('.db') and self.valid_name(name[:-3]))
+
+    def engine(self, name, create=False):
+        """Engine for a workspace, migrating its database on first use
+
+        Raises LookupError for a workspace without a database file unless `create` is set.
+        """
+        path = self._path(name)
+        with self._lock:
+            self._dispose_idle()
+            engine = self._engines.get(path)
+            if engine is not None:
+                self._engines.move_to_end(path)
+                return engine
+
+        if not create and not os.path.exists(path):
+            raise LookupError(f'Workspace "{name}" does not exist')
+
+        # One opener at a time, so a new workspace is migrated exactly once
+        with self._open_lock:
+            with self._lock:
+                engine = self._engines.get(path)
+            if engine is None:
+                engine = self._open(path)
+                with self._lock:
+                    self._engines[path] = engine
+                    self.opened += 1
+                    while len(self._engines) > self.max_engines:
+                        _, evicted = self._engines.popitem(last=False)
+                        self._retired.append(evicted)
+                        self.evictions += 1
+                    self._dispose_idle()
+        return engine
+
+    def _dispose_idle(self):
+        """Dispose evicted engines no request is using any more; caller holds self._lock"""
+        for engine in [engine for engine in self._retired if _checked_out(engine) == 0]:
+            self._retired.remove(engine)
+            engine.dispose()
+
+    def _open(self, path):
+        from models import ensure_schema
+
+        os.makedirs(self.directory, exist_ok=True)
+        engine = create_engine(f'sqlite:///{path}', **self.engine_options)
+        ensure_schema(engine)
+        return engine
+
+    def dispose_all(self):
+        with self._lock:
+            engines = list(self._engines.values()) + self._retired
+            self._engines, self._retired = OrderedDict(), []
+        for engine in engines:
+            engine.dispose()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'open_engines': len(self._engines),
+                'retired_engines': len(self._retired),
+                'max_engines': self.max_engines,
+                'opened': self.opened,
+                'evictions': self.evictions
+            }
+
+
+workspaces = WorkspaceEngines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage NoteMaster AI workspaces')
+    parser.add_argument('command', choices=['create', 'list'])
+    parser.add_argument('name', nargs='?', help='create: workspace name (lowercase letters, digits, - and _)')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    engines = app.extensions['workspaces']  # not this __main__ module's copy of the singleton
+    if args.command == 'list':
+        for name in engines.names():
+            print(name)
+        return
+    if not engines.valid_name(args.name):
+        parser.error('a valid workspace name is required')
+    engines.engine(args.name, create=True)
+    print(f'Workspace "{args.name}" is ready at {engines._path(args.name)}')
+
+
+if __name__ == '__main__':
+    main()